@@ -1,87 +1,109 @@
 // app/api/ask/route.ts
 import { NextResponse } from "next/server";
-import { spawn } from "node:child_process";
-import { promises as fs } from "node:fs";
-import os from "node:os";
-import path from "node:path";
+import { busyResponse, callWorker, callWorkerInfo, queueHeaders, WorkerBusyError } from "@/lib/pyWorker";
+import { getSessionId } from "@/lib/session";
 
 export const runtime = "nodejs";
 
-async function runPython(scriptPath: string, stdinText: string, extraArgs: string[] = []) {
-  const pyCmd = process.platform === "win32" ? "python" : "python3";
-  const py = spawn(pyCmd, [scriptPath, ...extraArgs], {
-    cwd: process.cwd(),
-    stdio: ["pipe", "pipe", "pipe"],
-  });
-
-  let out = "";
-  let err = "";
+// stream: true のとき、応答を NDJSON で逐次返す
+//   {"type":"text","index":0,"text":"..."}            … 文ができるたび
+//   {"type":"audio","index":0,"audioUrl":"/api/voice?..."}  … audio: "url" のとき。その文の音声の URL（バイナリのまま流れてくる）
+//   {"type":"audio","index":0,"audioBase64":"...","mime":"audio/ogg; codecs=opus"} … audio を指定しないとき。その文の音声
+//   {"type":"done","reply":"...","queueMs":12.3} / {"type":"error","error":"..."}
+//   ワーカーが混んでいて受け付けられなければ {"type":"error","error":"busy","busy":true,"retryAfter":秒}
+// stream でないときは、混んでいれば 503（Retry-After）。待ち時間は X-Queue-Wait-Ms ヘッダ
+// codec / bitrate で音声の形式を選ぶ（例: opus 24k。省略時は gTTS の MP3 のまま）
+type VoiceOpts = { codec?: string; bitrate?: string };
 
-  py.stdout.on("data", (d) => (out += d.toString()));
-  py.stderr.on("data", (d) => (err += d.toString()));
-
-  py.stdin.write(stdinText);
-  py.stdin.end();
+// 音声をバイナリで返す /api/voice の URL
+function voiceUrl(text: string, opts: VoiceOpts): string {
+  const q = new URLSearchParams({ text });
+  if (opts.codec) q.set("codec", opts.codec);
+  if (opts.bitrate) q.set("bitrate", opts.bitrate);
+  return `/api/voice?${q}`;
+}
 
-  const code: number = await new Promise((resolve) => {
-    py.on("close", (c) => resolve(c ?? 0));
+function streamReply(input: string, session: string, opts: VoiceOpts, audioUrl: boolean): Response {
+  const enc = new TextEncoder();
+  const body = new ReadableStream<Uint8Array>({
+    async start(controller) {
+      const send = (obj: unknown) => controller.enqueue(enc.encode(JSON.stringify(obj) + "\n"));
+      try {
+        // audioUrl なら、ワーカーでは音声を作らず文ごとの URL を返す（ブラウザが取りに来た時点で合成が始まる）
+        const { result: r, sched } = await callWorkerInfo<{ reply?: string }>(
+          "reply_stream",
+          { text: input, session, lang: "ja", tld: "co.jp", speed: 1.25, ...opts, audio: !audioUrl },
+          (ev) => {
+            if (ev?.type === "audio") {
+              send({ type: "audio", index: ev.index, audioBase64: ev.audio, mime: ev.mime || "audio/mpeg" });
+            } else if (ev?.type === "text") {
+              send({ type: "text", index: ev.index, text: ev.text });
+              const sentence = String(ev.text ?? "").trim();
+              if (audioUrl && sentence) send({ type: "audio", index: ev.index, audioUrl: voiceUrl(sentence, opts) });
+            }
+          },
+        );
+        send({ type: "done", reply: String(r.reply ?? ""), queueMs: sched?.waitMs });
+      } catch (e: any) {
+        if (e instanceof WorkerBusyError) {
+          send({ type: "error", error: "busy", busy: true, retryAfter: e.retryAfter });
+        } else {
+          send({ type: "error", error: e?.message || "agent failed" });
+        }
+      } finally {
+        controller.close();
+      }
+    },
+  });
+  return new Response(body, {
+    headers: { "Content-Type": "application/x-ndjson; charset=utf-8", "Cache-Control": "no-store" },
   });
-
-  return { code, out, err };
 }
 
 export async function POST(req: Request) {
   try {
-    const { text } = await req.json();
+    const { text, stream, codec, bitrate, audio } = await req.json();
     const input = String(text ?? "");
+    const session = getSessionId(req);
+    const opts: VoiceOpts = { codec: codec ? String(codec) : undefined, bitrate: bitrate ? String(bitrate) : undefined };
+    if (stream) return streamReply(input, session, opts, audio === "url");
 
-    // 1) 応答テキストを Python で生成
-    const replyProc = await runPython("python/agent.py", input);
-    if (replyProc.code !== 0) {
-      return NextResponse.json(
-        { error: replyProc.err || "agent.py failed" },
-        { status: 500 }
-      );
-    }
-
-    // agent.py は {"reply": "..."} を出力
+    // 1) 応答テキストを常駐ワーカーで生成
     let reply = "（応答解析に失敗しました）";
+    let headers: Record<string, string> = {};
     try {
-      const json = JSON.parse(replyProc.out);
-      reply = String(json.reply ?? reply);
-    } catch {
-      reply = replyProc.out?.trim() || reply;
+      const { result: r, sched } = await callWorkerInfo<{ reply?: string }>("reply", { text: input, session });
+      reply = String(r.reply ?? reply);
+      headers = queueHeaders(sched);
+    } catch (e: any) {
+      if (e instanceof WorkerBusyError) return busyResponse(e);
+      return NextResponse.json({ error: e?.message || "agent failed" }, { status: 500 });
     }
 
-    // 2) 応答テキストを Python で音声化 → 一時ファイルに保存
-    const tmpOut = path.join(os.tmpdir(), `voice-${Date.now()}.mp3`);
-    const voiceProc = await runPython("python/voice.py", reply, [
-      "--out",
-      tmpOut,
-      "--lang",
-      "ja",
-      "--tld",
-      "co.jp",
-      "--speed",
-      "1.25",
-    ]);
+    // 2a) audio: "url" なら音声は埋め込まず、/api/voice の URL を返す（バイナリのまま流れてくるので、すぐ再生を始められる）
+    if (audio === "url") {
+      return NextResponse.json({ reply, audioUrl: voiceUrl(reply, opts) }, { headers });
+    }
 
+    // 2b) 応答テキストを音声化（ワーカーがメモリ上で生成した音声を base64 で受け取る）
     let audioBase64: string | null = null;
-    if (voiceProc.code === 0) {
-      try {
-        const buf = await fs.readFile(tmpOut);
-        audioBase64 = buf.toString("base64");
-        await fs.unlink(tmpOut).catch(() => {});
-      } catch (e) {
-        // 読み込みに失敗したら無音で返す
-        audioBase64 = null;
-      }
-    } else {
-      // 音声化失敗（gTTS/FFmpegが無い or ネットワーク不通）→ テキストのみ返す
+    let mime = "audio/mpeg";
+    try {
+      const v = await callWorker<{ audio?: string; mime?: string }>("voice", {
+        text: reply,
+        lang: "ja",
+        tld: "co.jp",
+        speed: 1.25,
+        ...opts,
+      });
+      audioBase64 = v.audio ?? null;
+      mime = v.mime || mime;
+    } catch {
+      // 音声化失敗（gTTS/FFmpegが無い or ネットワーク不通、混んでいて受け付けられない）→ テキストのみ返す
       audioBase64 = null;
     }
 
-    return NextResponse.json({ reply, audioBase64, mime: "audio/mpeg" });
+    return NextResponse.json({ reply, audioBase64, mime }, { headers });
   } catch (e: any) {
     return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
   }
@@ -1,31 +1,14 @@
 // app/api/delete/route.ts
 import { NextResponse } from "next/server";
-import { spawn } from "node:child_process";
+import { callWorker } from "@/lib/pyWorker";
+import { getSessionId } from "@/lib/session";
 
 export const runtime = "nodejs";
 
-async function runPython(scriptPath: string) {
-  const pyCmd = process.platform === "win32" ? "python" : "python3";
-  const py = spawn(pyCmd, [scriptPath], {
-    cwd: process.cwd(),
-    stdio: ["pipe", "pipe", "pipe"],
-  });
-
-  let out = ""; let err = "";
-  py.stdout.on("data", d => (out += d.toString()));
-  py.stderr.on("data", d => (err += d.toString()));
-
-  const code: number = await new Promise((r) => py.on("close", (c) => r(c ?? 0)));
-  return { code, out, err };
-}
-
-export async function POST() {
+export async function POST(req: Request) {
   try {
-    // 保存は行わず、conversation.txt だけ初期化
-    const { code, err } = await runPython("python/delete_logs.py");
-    if (code !== 0) {
-      return NextResponse.json({ error: err || "delete_logs failed" }, { status: 500 });
-    }
+    // 保存は行わず、このセッションの会話ログだけ初期化
+    await callWorker("session_reset", { session: getSessionId(req) });
     return NextResponse.json({ ok: true });
   } catch (e: any) {
     return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
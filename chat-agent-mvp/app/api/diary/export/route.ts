@@ -0,0 +1,37 @@
+import { spawn } from "node:child_process";
+import { Readable } from "node:stream";
+
+export const runtime = "nodejs";
+
+const TYPES: Record<string, string> = {
+  jsonl: "application/x-ndjson; charset=utf-8",
+  tar: "application/x-tar",
+};
+
+// GET /api/diary/export?format=jsonl|tar&from=YYYY-MM-DD&to=YYYY-MM-DD
+// 常駐ワーカーは 1 操作ずつしか動かないので、長い書き出しは専用のプロセスで行い、
+// stdout をそのままレスポンスに流す（全件をメモリに載せない）
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+  const format = searchParams.get("format") === "tar" ? "tar" : "jsonl";
+  const args = ["python/diary_export.py", "--format", format];
+  const from = searchParams.get("from");
+  const to = searchParams.get("to");
+  if (from) args.push("--from", from);
+  if (to) args.push("--to", to);
+
+  const pyCmd = process.platform === "win32" ? "python" : "python3";
+  const py = spawn(pyCmd, args, { cwd: process.cwd(), stdio: ["ignore", "pipe", "pipe"] });
+  py.stderr.on("data", (d) => process.stderr.write(d));
+  // ダウンロードが中止されたら書き出しも止める
+  req.signal.addEventListener("abort", () => py.kill());
+
+  const body = Readable.toWeb(py.stdout) as ReadableStream<Uint8Array>;
+  return new Response(body, {
+    headers: {
+      "Content-Type": TYPES[format],
+      "Content-Disposition": `attachment; filename="diary-export.${format}"`,
+      "Cache-Control": "no-store",
+    },
+  });
+}
@@ -0,0 +1,38 @@
+import { NextResponse } from "next/server";
+import { spawn } from "node:child_process";
+import { Readable } from "node:stream";
+
+export const runtime = "nodejs";
+
+// POST /api/diary/import?format=jsonl|tar&skipExisting=1
+// 本文（diary_export の出力）をそのまま diary_import.py の stdin に流す（全体をメモリに載せない）
+export async function POST(req: Request) {
+  if (!req.body) return NextResponse.json({ error: "empty body" }, { status: 400 });
+  const { searchParams } = new URL(req.url);
+  const args = ["python/diary_import.py"];
+  const format = searchParams.get("format");
+  if (format === "jsonl" || format === "tar") args.push("--format", format);
+  if (searchParams.get("skipExisting") === "1") args.push("--skip-existing");
+
+  try {
+    const pyCmd = process.platform === "win32" ? "python" : "python3";
+    const py = spawn(pyCmd, args, { cwd: process.cwd(), stdio: ["pipe", "pipe", "pipe"] });
+    let out = ""; let err = "";
+    py.stdout.on("data", (d) => (out += d.toString()));
+    py.stderr.on("data", (d) => (err += d.toString()));
+    py.stdin.on("error", () => {}); // 途中で終了した場合は close の終了コードで扱う
+    Readable.fromWeb(req.body as any).pipe(py.stdin);
+    const code = await new Promise<number>((resolve) => py.on("close", (c) => resolve(c ?? 0)));
+
+    let summary: any = null;
+    try {
+      summary = JSON.parse(out.trim().split("\n").pop() || "");
+    } catch {
+      summary = null;
+    }
+    if (!summary) return NextResponse.json({ error: err || "diary_import failed" }, { status: 500 });
+    return NextResponse.json(summary, { status: code === 0 ? 200 : 500 });
+  } catch (e: any) {
+    return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
+  }
+}
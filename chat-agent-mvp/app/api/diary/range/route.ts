@@ -0,0 +1,32 @@
+import { callWorker } from "@/lib/pyWorker";
+
+export const runtime = "nodejs";
+
+// GET /api/diary/range?from=YYYY-MM-DD&to=YYYY-MM-DD
+// 日ごとのセルを NDJSON で逐次返し、最後に集計を返す（年表示・連続記録の表示用）
+//   {"type":"day","date":"...","hasLog":true,"preview":"...","chars":123}
+//   {"type":"summary","from":"...","to":"...","days":365,"daysLogged":200,"longestStreak":12,"totalChars":45678}
+//   {"type":"error","error":"..."}
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+  const from = searchParams.get("from") || "";
+  const to = searchParams.get("to") || "";
+
+  const enc = new TextEncoder();
+  const body = new ReadableStream<Uint8Array>({
+    async start(controller) {
+      const send = (obj: unknown) => controller.enqueue(enc.encode(JSON.stringify(obj) + "\n"));
+      try {
+        const summary = await callWorker("diary_range", { from, to }, (ev) => send(ev));
+        send(summary);
+      } catch (e: any) {
+        send({ type: "error", error: e?.message ?? "Unexpected error" });
+      } finally {
+        controller.close();
+      }
+    },
+  });
+  return new Response(body, {
+    headers: { "Content-Type": "application/x-ndjson; charset=utf-8", "Cache-Control": "no-store" },
+  });
+}
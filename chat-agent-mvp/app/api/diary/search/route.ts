@@ -0,0 +1,20 @@
+import { NextResponse } from "next/server";
+import { callWorker } from "@/lib/pyWorker";
+
+export const runtime = "nodejs";
+
+// GET /api/diary/search?q=...&from=YYYY-MM-DD&to=YYYY-MM-DD&limit=20
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+  const q = searchParams.get("q") || "";
+  const from = searchParams.get("from") || "";
+  const to = searchParams.get("to") || "";
+  const limit = searchParams.get("limit") || "20";
+
+  try {
+    const data = await callWorker("diary_search", { q, from, to, limit });
+    return NextResponse.json(data);
+  } catch (e: any) {
+    return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
+  }
+}
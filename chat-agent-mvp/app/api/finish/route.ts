@@ -1,24 +1,10 @@
 // app/api/finish/route.ts
 import { NextResponse } from "next/server";
-import { spawn } from "node:child_process";
+import { busyResponse, callWorkerInfo, queueHeaders, WorkerBusyError } from "@/lib/pyWorker";
+import { getSessionId } from "@/lib/session";
 
 export const runtime = "nodejs";
 
-function runPython(scriptPath: string, args: string[]) {
-  const pyCmd = process.platform === "win32" ? "python" : "python3";
-  const py = spawn(pyCmd, [scriptPath, ...args], {
-    cwd: process.cwd(),
-    stdio: ["ignore", "pipe", "pipe"],
-  });
-  let out = "";
-  let err = "";
-  py.stdout.on("data", (d) => (out += d.toString()));
-  py.stderr.on("data", (d) => (err += d.toString()));
-  return new Promise<{ code: number; out: string; err: string }>((resolve) => {
-    py.on("close", (c) => resolve({ code: c ?? 0, out, err }));
-  });
-}
-
 export async function POST(req: Request) {
   try {
     const url = new URL(req.url);
@@ -27,12 +13,11 @@ export async function POST(req: Request) {
       return NextResponse.json({ error: "date is required" }, { status: 400 });
     }
 
-    const { code, out, err } = await runPython("python/dump_logs.py", ["--date", date]);
-    if (code !== 0) {
-      return NextResponse.json({ error: err || "dump_logs failed" }, { status: 500 });
-    }
-    return NextResponse.json({ content: out }); // 結合済みテキスト
+    const { result, sched } = await callWorkerInfo<{ content: string }>("dump", { date, session: getSessionId(req) });
+    // 結合済みテキスト（X-Queue-Wait-Ms … ワーカーで順番を待った時間）
+    return NextResponse.json({ content: result.content }, { headers: queueHeaders(sched) });
   } catch (e: any) {
+    if (e instanceof WorkerBusyError) return busyResponse(e);
     return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
   }
 }
@@ -0,0 +1,92 @@
+// app/api/voice/route.ts
+import { NextResponse } from "next/server";
+import { busyResponse, callWorker, WorkerBusyError } from "@/lib/pyWorker";
+
+export const runtime = "nodejs";
+
+const TYPES: Record<string, string> = {
+  mp3: "audio/mpeg",
+  opus: "audio/ogg; codecs=opus",
+  wav: "audio/wav",
+};
+
+// 応答音声をバイナリのままチャンクで返す（JSON に base64 で埋め込まない）
+//   GET  /api/voice?text=...&codec=opus|mp3|wav&bitrate=24k&engine=gtts|pyttsx3  … <audio src> にそのまま渡せる
+//   POST /api/voice {"text","codec","bitrate","engine"}                          … 長い文用
+// 常駐ワーカーの voice_stream 操作が FFmpeg の出力ができた端から audio イベントで送ってくるので、それを流す
+// （リクエストごとに Python を起動しない。スケジューラの受け付け制御を通るので、混んでいれば 503 + Retry-After）
+// 最初のバイトが届く前に失敗した場合（FFmpeg が無く指定の形式にできない等）は 500 の JSON を返す
+function voiceResponse(req: Request, p: { text?: unknown; codec?: unknown; bitrate?: unknown; engine?: unknown }): Promise<Response> {
+  const text = String(p.text ?? "").trim();
+  if (!text) return Promise.resolve(NextResponse.json({ error: "empty text" }, { status: 400 }));
+  const codec = String(p.codec ?? "mp3");
+  if (!(codec in TYPES)) return Promise.resolve(NextResponse.json({ error: "invalid codec" }, { status: 400 }));
+  const args: Record<string, unknown> = { text, codec, lang: "ja", tld: "co.jp", speed: 1.25 };
+  const bitrate = String(p.bitrate ?? "");
+  if (bitrate) {
+    if (!/^\d{1,3}k$/.test(bitrate)) return Promise.resolve(NextResponse.json({ error: "invalid bitrate" }, { status: 400 }));
+    args.bitrate = bitrate;
+  }
+  const engine = String(p.engine ?? "");
+  if (engine === "gtts" || engine === "pyttsx3") args.engine = engine;
+
+  return new Promise<Response>((resolve) => {
+    let controller!: ReadableStreamDefaultController<Uint8Array>;
+    let closed = false;
+    let started = false;
+    const body = new ReadableStream<Uint8Array>({
+      start(c) {
+        controller = c;
+      },
+      cancel() {
+        closed = true;
+      },
+    });
+    // 再生が中止されたら、残りは捨てる（ワーカー側の合成はそのまま終わらせる）
+    req.signal.addEventListener("abort", () => {
+      closed = true;
+    });
+
+    callWorker<{ mime?: string }>("voice_stream", args, (ev) => {
+      if (ev?.type !== "audio" || closed) return;
+      controller.enqueue(Buffer.from(String(ev.data ?? ""), "base64"));
+      if (!started) {
+        started = true;
+        resolve(new Response(body, { headers: { "Content-Type": TYPES[codec], "Cache-Control": "no-store" } }));
+      }
+    })
+      .then(() => {
+        if (!started) resolve(NextResponse.json({ error: "voice failed" }, { status: 500 }));
+        else if (!closed) controller.close();
+      })
+      .catch((e: any) => {
+        if (!started) {
+          resolve(
+            e instanceof WorkerBusyError
+              ? busyResponse(e)
+              : NextResponse.json({ error: e?.message || "voice failed" }, { status: 500 }),
+          );
+        } else if (!closed) {
+          controller.error(e);
+        }
+      });
+  });
+}
+
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+  return voiceResponse(req, {
+    text: searchParams.get("text"),
+    codec: searchParams.get("codec"),
+    bitrate: searchParams.get("bitrate"),
+    engine: searchParams.get("engine"),
+  });
+}
+
+export async function POST(req: Request) {
+  try {
+    return await voiceResponse(req, await req.json());
+  } catch (e: any) {
+    return NextResponse.json({ error: e?.message ?? "Unexpected error" }, { status: 500 });
+  }
+}
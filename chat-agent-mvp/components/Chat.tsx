@@ -3,7 +3,32 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 
 type Msg = { role: "user" | "assistant"; content: string };
-type ApiResp = { reply?: string; audioBase64?: string | null; mime?: string; error?: string };
+type ApiResp = { reply?: string; audioBase64?: string | null; audioUrl?: string; mime?: string; error?: string };
+type StreamEvent =
+  | { type: "text"; index: number; text: string }
+  | { type: "audio"; index: number; audioUrl?: string; audioBase64?: string; mime?: string }
+  | { type: "done"; reply: string; queueMs?: number }
+  | { type: "error"; error: string; busy?: boolean; retryAfter?: number };
+
+const BUSY_MESSAGE = "ただいま混み合っています。少し待ってからもう一度送ってください。";
+
+// 応答音声の形式：Ogg Opus を再生できるブラウザは opus（24kbps）、できなければ低ビットレートの MP3
+function voiceFormat(): { codec: string; bitrate: string } {
+  try {
+    if (new Audio().canPlayType('audio/ogg; codecs="opus"')) return { codec: "opus", bitrate: "24k" };
+  } catch {}
+  return { codec: "mp3", bitrate: "32k" };
+}
+
+// 指定の形式で返せなかった（サーバーに FFmpeg が無い等）ときに試す、変換なしの MP3 の URL（もう無ければ null）
+function mp3FallbackUrl(url: string): string | null {
+  if (!url.includes("codec=")) return null;
+  const q = new URLSearchParams(url.split("?")[1]);
+  if (q.get("codec") === "mp3" && !q.get("bitrate")) return null;
+  q.set("codec", "mp3");
+  q.delete("bitrate");
+  return `/api/voice?${q}`;
+}
 
 /* ---- Web Speech API 型の最小宣言 ---- */
 type SpeechRecognitionEventLike = { results: SpeechRecognitionResultList };
@@ -44,6 +69,11 @@ export default function Chat({
   // 応答音声（毎回生成するBlob URLを管理）
   const replyAudioRef = useRef<HTMLAudioElement | null>(null);
   const replyUrlRef = useRef<string | null>(null);
+  // 文ごとに届く音声の再生待ち行列（停止時に世代を進めて古い再生を捨てる）
+  // URL で届いた音声は、届いた時点で読み込みを始めた Audio を並べておく（前の文の再生中に合成・受信が進む）
+  const audioQueueRef = useRef<({ base64: string; mime: string } | { audio: HTMLAudioElement })[]>([]);
+  const audioPlayingRef = useRef(false);
+  const playbackGenRef = useRef(0);
 
   // スクロール
   const chatRef = useRef<HTMLDivElement | null>(null);
@@ -62,6 +92,13 @@ export default function Chat({
 
   // 再生中のすべての音声/読み上げを停止
   function stopPlayback() {
+    // 再生待ちの音声を破棄（読み込み中の URL も止める）
+    for (const item of audioQueueRef.current) {
+      if ("audio" in item) item.audio.removeAttribute("src");
+    }
+    audioQueueRef.current = [];
+    audioPlayingRef.current = false;
+    playbackGenRef.current++;
     // 応答音声
     try {
       if (replyAudioRef.current) {
@@ -166,6 +203,124 @@ export default function Chat({
     }
   }
 
+  // /api/voice の URL をそのまま再生（届いた分から再生が始まる）。
+  // 指定の形式で返せなかった（サーバーに FFmpeg が無い等）ときは、変換なしの MP3 でもう一度だけ試す
+  async function playVoiceUrl(url: string) {
+    try {
+      stopPlayback(); // ★ 二重再生防止
+      const gen = playbackGenRef.current;
+      const a = new Audio(url);
+      replyAudioRef.current = a;
+      a.onerror = () => {
+        const fallback = mp3FallbackUrl(url);
+        if (gen === playbackGenRef.current && fallback) void playVoiceUrl(fallback);
+      };
+      await a.play();
+    } catch {
+      /* 自動再生できない場合は黙ってスキップ */
+    }
+  }
+
+  // ストリーミング応答の音声を順番に再生（前の文が終わったら次へ）
+  function enqueueVoice(base64: string, mime = "audio/mpeg") {
+    audioQueueRef.current.push({ base64, mime });
+    if (!audioPlayingRef.current) void playNextVoice(playbackGenRef.current);
+  }
+
+  function enqueueVoiceUrl(url: string) {
+    const a = new Audio(url);
+    a.preload = "auto";
+    audioQueueRef.current.push({ audio: a });
+    if (!audioPlayingRef.current) void playNextVoice(playbackGenRef.current);
+  }
+
+  async function playNextVoice(gen: number) {
+    if (gen !== playbackGenRef.current) return;
+    const next = audioQueueRef.current.shift();
+    if (!next) {
+      audioPlayingRef.current = false;
+      return;
+    }
+    audioPlayingRef.current = true;
+    if (replyUrlRef.current) URL.revokeObjectURL(replyUrlRef.current);
+    replyUrlRef.current = null;
+    let a: HTMLAudioElement;
+    if ("audio" in next) {
+      a = next.audio;
+    } else {
+      const bin = Uint8Array.from(atob(next.base64), (c) => c.charCodeAt(0));
+      const url = URL.createObjectURL(new Blob([bin], { type: next.mime }));
+      a = new Audio(url);
+      replyUrlRef.current = url;
+    }
+    replyAudioRef.current = a;
+    // 再生できなかったら次へ（error イベントと play() の失敗の両方が来ても 1 回だけ進む）
+    // URL の音声は、指定の形式で返せなかったときのために変換なしの MP3 でもう一度だけ試す
+    let attempt = 0;
+    let moved = false;
+    const fail = (n: number) => {
+      if (moved || n !== attempt || gen !== playbackGenRef.current) return;
+      const fallback = "audio" in next && attempt === 0 ? mp3FallbackUrl(a.src) : null;
+      if (fallback) {
+        attempt = 1;
+        a.src = fallback;
+        a.play().catch(() => fail(1));
+        return;
+      }
+      moved = true;
+      void playNextVoice(gen);
+    };
+    a.onended = () => {
+      moved = true;
+      void playNextVoice(gen);
+    };
+    a.onerror = () => fail(attempt);
+    try {
+      await a.play();
+    } catch {
+      /* 自動再生できない場合は次へ */
+      fail(0);
+    }
+  }
+
+  // /api/ask の NDJSON を読み、文が届くたびに表示・音声再生する
+  async function readReplyStream(body: ReadableStream<Uint8Array>) {
+    const reader = body.getReader();
+    const dec = new TextDecoder();
+    let buf = "";
+    let text = "";
+    let started = false;
+    const show = (content: string) => {
+      const replace = started;
+      started = true;
+      setMessages((p) =>
+        replace ? [...p.slice(0, -1), { role: "assistant", content }] : [...p, { role: "assistant", content }],
+      );
+    };
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (value) buf += dec.decode(value, { stream: true });
+      const lines = buf.split("\n");
+      buf = done ? "" : lines.pop() ?? "";
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const ev = JSON.parse(line) as StreamEvent;
+        if (ev.type === "text") {
+          text += ev.text;
+          show(text);
+        } else if (ev.type === "audio") {
+          if (ev.audioUrl) enqueueVoiceUrl(ev.audioUrl);
+          else if (ev.audioBase64) enqueueVoice(ev.audioBase64, ev.mime || "audio/mpeg");
+        } else if (ev.type === "done") {
+          show(ev.reply || text || "（応答の取得に失敗しました）");
+        } else if (ev.type === "error" && !text) {
+          show(ev.busy ? BUSY_MESSAGE : "（応答の取得に失敗しました）");
+        }
+      }
+      if (done) break;
+    }
+  }
+
   // 送信
   async function onSend(textArg?: string) {
     // ★ 送信時点で再生を停止
@@ -180,14 +335,24 @@ export default function Chat({
       const res = await fetch("/api/ask", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text }),
+        body: JSON.stringify({ text, stream: true, audio: "url", ...voiceFormat() }),
         cache: "no-store",
       });
+      const ctype = res.headers.get("Content-Type") || "";
+      if (res.body && ctype.includes("ndjson")) {
+        await readReplyStream(res.body);
+        return;
+      }
       const data: ApiResp = await res.json();
       const reply =
-        typeof data?.reply === "string" ? data.reply : "（応答の取得に失敗しました）";
+        typeof data?.reply === "string"
+          ? data.reply
+          : res.status === 503
+            ? BUSY_MESSAGE
+            : "（応答の取得に失敗しました）";
       setMessages((p) => [...p, { role: "assistant", content: reply }]);
-      if (data?.audioBase64) await playVoice(data.audioBase64, data.mime || "audio/mpeg");
+      if (data?.audioUrl) await playVoiceUrl(data.audioUrl);
+      else if (data?.audioBase64) await playVoice(data.audioBase64, data.mime || "audio/mpeg");
     } catch {
       setMessages((p) => [
         ...p,
@@ -250,8 +415,8 @@ export default function Chat({
         method: "POST",
         cache: "no-store",
       });
-      const { content } = (await r.json()) as { content?: string };
-      const text = content || "（会話ログはまだありません）";
+      const { content, busy } = (await r.json()) as { content?: string; busy?: boolean };
+      const text = content || (busy ? "日記の生成が混み合っています。少し待ってからもう一度お試しください。" : "（会話ログはまだありません）");
       onFinish?.(text);
     } catch {
       onFinish?.("会話ログの取得に失敗しました。");
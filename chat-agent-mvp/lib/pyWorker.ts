@@ -0,0 +1,144 @@
+// lib/pyWorker.ts
+// 常駐 Python ワーカー（python/worker.py）とのやり取り。
+// - ルートごとに python3 を起動せず、1 プロセスを使い回す
+// - JSON Lines で {"id","op","args"} を送り、同じ id の応答を待つ
+// - ワーカーが落ちたら次回呼び出し時に自動で起動し直す
+//   起動できない（python3 が無い等）・stdin に書けない（EPIPE）ときも、待っている要求を失敗させて起動し直せるようにする
+// - 応答もイベントも PY_WORKER_TIMEOUT_MS（既定 180000）ミリ秒届かなければ、その要求をタイムアウトで失敗させる
+// - ストリーミング操作は最終応答の前に {"id","event"} 行を返すので、onEvent に渡す
+// - モデル呼び出し等はワーカー内のスケジューラで順番待ちする。混んでいて受け付けられなかったときは
+//   WorkerBusyError（retryAfter 秒）を投げる。待ち時間は callWorkerInfo の sched.waitMs で分かる
+import { spawn, type ChildProcessWithoutNullStreams } from "node:child_process";
+import readline from "node:readline";
+
+export type SchedInfo = { class: string; waitMs?: number; runMs?: number; waiting?: number };
+type WorkerResp = {
+  id: number;
+  ok: boolean;
+  result?: any;
+  error?: string;
+  event?: any;
+  busy?: boolean;
+  retryAfter?: number;
+  sched?: SchedInfo;
+};
+type Pending = { resolve: (r: WorkerResp) => void; onEvent?: (event: any) => void; timer?: NodeJS.Timeout };
+
+type WorkerState = {
+  proc: ChildProcessWithoutNullStreams | null;
+  nextId: number;
+  pending: Map<number, Pending>;
+};
+
+// dev の HMR でモジュールが読み直されてもプロセスを増やさない
+const g = globalThis as unknown as { __pyWorker?: WorkerState };
+const state: WorkerState = (g.__pyWorker ??= { proc: null, nextId: 1, pending: new Map() });
+
+const TIMEOUT_MS = Number(process.env.PY_WORKER_TIMEOUT_MS) || 180_000;
+
+function settle(id: number, resp: WorkerResp) {
+  const p = state.pending.get(id);
+  if (!p) return;
+  clearTimeout(p.timer);
+  state.pending.delete(id);
+  p.resolve(resp);
+}
+
+function failAll(error: string) {
+  for (const id of [...state.pending.keys()]) settle(id, { id, ok: false, error });
+}
+
+// 応答・イベントが届くたびに測り直す（ストリーミング操作は全体ではなく間隔で見る）
+function armTimeout(id: number, op: string) {
+  const p = state.pending.get(id);
+  if (!p) return;
+  clearTimeout(p.timer);
+  p.timer = setTimeout(() => settle(id, { id, ok: false, error: `${op}: worker timed out` }), TIMEOUT_MS);
+}
+
+function dropWorker(proc: ChildProcessWithoutNullStreams, error: string) {
+  if (state.proc === proc) state.proc = null;
+  failAll(error);
+}
+
+function ensureWorker(): ChildProcessWithoutNullStreams {
+  if (state.proc && state.proc.exitCode === null) return state.proc;
+
+  const pyCmd = process.platform === "win32" ? "python" : "python3";
+  const proc = spawn(pyCmd, ["python/worker.py"], {
+    cwd: process.cwd(),
+    stdio: ["pipe", "pipe", "pipe"],
+  });
+
+  readline.createInterface({ input: proc.stdout }).on("line", (line) => {
+    let resp: WorkerResp;
+    try {
+      resp = JSON.parse(line);
+    } catch {
+      return;
+    }
+    const p = state.pending.get(resp.id);
+    if (!p) return;
+    if (resp.event !== undefined) {
+      p.timer?.refresh();
+      p.onEvent?.(resp.event);
+      return;
+    }
+    settle(resp.id, resp);
+  });
+  proc.stderr.on("data", (d) => process.stderr.write(d));
+  // error を拾わないと、起動失敗や EPIPE が Next.js のプロセスごと落とす
+  proc.on("error", (e) => dropWorker(proc, `worker error: ${e.message}`));
+  proc.stdin.on("error", (e) => dropWorker(proc, `worker stdin error: ${e.message}`));
+  proc.on("close", (c) => dropWorker(proc, `worker exited (${c ?? "signal"})`));
+
+  state.proc = proc;
+  return proc;
+}
+
+export class WorkerBusyError extends Error {
+  constructor(
+    public op: string,
+    public retryAfter: number,
+  ) {
+    super(`${op}: worker is busy`);
+    this.name = "WorkerBusyError";
+  }
+}
+
+export async function callWorkerInfo<T = any>(
+  op: string,
+  args: Record<string, unknown> = {},
+  onEvent?: (event: any) => void,
+): Promise<{ result: T; sched?: SchedInfo }> {
+  const proc = ensureWorker();
+  const id = state.nextId++;
+  const resp = await new Promise<WorkerResp>((resolve) => {
+    state.pending.set(id, { resolve, onEvent });
+    armTimeout(id, op);
+    proc.stdin.write(JSON.stringify({ id, op, args }) + "\n");
+  });
+  if (resp.busy) throw new WorkerBusyError(op, resp.retryAfter ?? 1);
+  if (!resp.ok) throw new Error(resp.error || `${op} failed`);
+  return { result: resp.result as T, sched: resp.sched };
+}
+
+export async function callWorker<T = any>(
+  op: string,
+  args: Record<string, unknown> = {},
+  onEvent?: (event: any) => void,
+): Promise<T> {
+  return (await callWorkerInfo<T>(op, args, onEvent)).result;
+}
+
+// 混んでいたときの 503 応答（Retry-After は整数秒）
+export function busyResponse(e: WorkerBusyError): Response {
+  return Response.json(
+    { error: "busy", busy: true, retryAfter: e.retryAfter },
+    { status: 503, headers: { "Retry-After": String(Math.max(1, Math.ceil(e.retryAfter))) } },
+  );
+}
+
+export function queueHeaders(sched?: SchedInfo): Record<string, string> {
+  return sched?.waitMs !== undefined ? { "X-Queue-Wait-Ms": String(sched.waitMs) } : {};
+}
@@ -0,0 +1,32 @@
+// lib/session.ts
+// 会話セッション ID（Cookie）。ユーザーごとに会話ログを分け、同時に使っても混ざらないようにする
+// - /api/start で新しい ID を発行して Cookie に入れる
+// - /api/ask・/api/finish・/api/delete は Cookie の ID で Python 側のログを選ぶ
+import { randomUUID } from "node:crypto";
+import type { NextResponse } from "next/server";
+
+export const SESSION_COOKIE = "diary_session";
+
+const VALID = /^[A-Za-z0-9_-]{1,64}$/;
+
+export function newSessionId(): string {
+  return randomUUID();
+}
+
+// Cookie から ID を取り出す（無い/不正なら ""＝既定セッション）
+export function getSessionId(req: Request): string {
+  const cookie = req.headers.get("cookie") || "";
+  for (const part of cookie.split(";")) {
+    const [k, ...v] = part.trim().split("=");
+    if (k === SESSION_COOKIE) {
+      const id = decodeURIComponent(v.join("="));
+      return VALID.test(id) ? id : "";
+    }
+  }
+  return "";
+}
+
+export function setSessionCookie(res: NextResponse, id: string): NextResponse {
+  res.cookies.set(SESSION_COOKIE, id, { httpOnly: true, sameSite: "lax", path: "/" });
+  return res;
+}
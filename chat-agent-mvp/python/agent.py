@@ -3,54 +3,69 @@
 # - stdin で受けたテキストに対して、プロンプトに従い Gemini で応答を生成
 # - 生成結果を JSON {"reply": "..."} のみ stdout へ（余計な print を混ぜない）
 # - さらに会話ログへ逐次追記保存（history.append_turn が使えなければ logs/conversation.txt に直接追記）
+# - --stream を付けると、応答を文ごとに JSON Lines {"sentence": "..."} で逐次出力する
+# - 同じプロンプトへの応答は llm_cache から返す（--no-cache で無効）
+# - 固定の指示 SYSTEM_PROMPT は system instruction として分け、prompt_cache でコンテキストキャッシュに載せて使い回す
+# - モデル呼び出しは llm_policy の期限・ヘッジ・サーキットブレーカー付き。期限切れやブレーカーが開いているときは
+#   呼び出し失敗と同じく定型のフォールバック文を返す（ブレーカーが開いている間はモデルを待たずに即座に返す）
+# - 段階ごとの時間（会話ログの読み込み・プロンプト組み立て・モデル呼び出し・パース・ログ追記）を metrics で測る
 
 from __future__ import annotations
 
-import os
-import re
 import sys
 import json
-from pathlib import Path
-from dotenv import load_dotenv
+import time
+from typing import Iterator
 
-# オプション依存（google-genai が無ければフォールバック応答）
-try:
-    from google import genai  # pip install google-genai
-except Exception:  # ライブラリ未導入でも動かす
-    genai = None  # type: ignore
+import bootstrap
+from bootstrap import CONV_PATH, PY_DIR, ROOT_DIR  # noqa: F401  (従来の import 先として残す)
 
-# ---- パス設定 ----
-PY_DIR = Path(__file__).resolve().parent
-ROOT_DIR = PY_DIR.parent
-CONV_PATH = ROOT_DIR / "python" / "logs" / "conversation.txt"  # ← 指定どおり固定
+# dotenv / google-genai / storage と、モデル呼び出しまわり（llm_policy / prompt_cache / metrics /
+# json_extract / reply_stream）は最初に使うときに読み込む（空入力なら読まずに返す）
 
-# ---- 環境変数 ----
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL = "gemini-2.5-flash"
+
+FALLBACK_EMPTY = "そうだったんですね。今日の出来事から一つ教えてもらえますか？"
+
+# ---- クライアント（常駐ワーカーでは使い回す） ----
+_client = None
+
+def get_client():
+    """genai.Client を 1 プロセスにつき 1 つだけ生成して返す（使えなければ None）"""
+    global _client
+    if _client is None:
+        api_key = bootstrap.gemini_api_key()
+        genai = bootstrap.genai() if api_key else None  # 未導入でもフォールバック応答で動かす
+        if genai is not None:
+            try:
+                _client = genai.Client(api_key=api_key)
+            except Exception as e:
+                print(f"[agent] Gemini client error: {e}", file=sys.stderr)
+    return _client
 
 # ---- ログ追記 ----
 def _append_turn_fallback(user_msg: str, reply_msg: str) -> None:
     """history が無い/失敗時のフォールバック: logs/conversation.txt に追記"""
     try:
-        CONV_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with CONV_PATH.open("a", encoding="utf-8") as f:
-            f.write(f"[USER] {user_msg}\n")
-            f.write(f"[ASSISTANT] {reply_msg}\n")
+        import conv_log
+        conv_log.append(CONV_PATH, f"[USER] {user_msg}\n[ASSISTANT] {reply_msg}\n")
     except Exception as e:
         print(f"[agent] fallback append error: {e}", file=sys.stderr)
 
-def append_turn_safe(user_msg: str, reply_msg: str) -> None:
-    """history.append_turn があれば使い、無ければフォールバック"""
+def append_turn_safe(user_msg: str, reply_msg: str, session: str = "") -> None:
+    """history.append_turn があれば使い、無ければフォールバック（既定セッションのみ）"""
     try:
         from history import append_turn  # 同ディレクトリ想定
-        try:
-            append_turn(user_msg, reply_msg, conv_path=CONV_PATH)  # パラメタ付き実装に対応
-        except TypeError:
-            append_turn(user_msg, reply_msg)  # シンプル実装に対応
-    except Exception:
+        append_turn(user_msg, reply_msg, session=session)
+    except Exception as e:
+        if session:
+            # セッション別ログを共有ファイルへ混ぜないよう、フォールバックはしない
+            print(f"[agent] append error ({session}): {e}", file=sys.stderr)
+            return
         _append_turn_fallback(user_msg, reply_msg)
 
 # ---- プロンプト ----
+# 毎回同じ指示（system instruction。prompt_cache でキャッシュする）
 SYSTEM_PROMPT = """あなたは、ユーザーが一日を振り返り、気軽に日記を書くのを手伝う、共感的で聞き上手な対話アシスタントです。
 あなたの目的は、会話の中から「具体的な出来事」「その時の感情や考え」「気づきや学び」「感謝やよかったこと」「明日やりたいこと」をやさしく引き出すことです。
 
@@ -65,10 +80,11 @@ SYSTEM_PROMPT = """あなたは、ユーザーが一日を振り返り、気軽
 {"reply":"ここにあなたの返信"}
 """
 
-def build_prompt(conv_text: str, user_text: str) -> str:
-    return f"""{SYSTEM_PROMPT}
-
-# 会話ログ:
+def build_prompt(conv_text: str, user_text: str, summary: str = "") -> str:
+    """毎回変わる部分（SYSTEM_PROMPT は含めない）"""
+    summary_block = f"\n# これまでの会話の要点:\n{summary}\n" if summary else ""
+    return f"""{summary_block}
+# 会話ログ（直近）:
 {conv_text}
 
 # ユーザーの最新発話:
@@ -79,85 +95,243 @@ def build_prompt(conv_text: str, user_text: str) -> str:
 """
 
 # ---- 応答パース ----
+REPLY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"reply": {"type": "STRING"}},
+    "required": ["reply"],
+}
+
 def parse_reply(resp_text: str, user_fallback: str) -> str:
     """
     モデル出力から reply を抽出。
-    - {"reply":"..."} を優先
-    - 見つからなければ {reply: ...} 的な簡易形式も試す
+    - {"reply":"..."} を含む最初の JSON オブジェクトを優先（前置きやコードフェンスがあっても可）
     - だめなら全文を返す
     """
     text = (resp_text or "").strip()
     if not text:
         return f"そうかそうか、{user_fallback}なんだね。"
 
-    # JSON を優先
-    try:
-        data = json.loads(text)
-        if isinstance(data, dict) and "reply" in data:
-            val = str(data["reply"]).strip()
-            if val:
-                return val
-    except Exception:
-        pass
-
-    # { reply: ... } 形式
-    m = re.search(r'\{\s*"?(reply)"?\s*:\s*"(.*?)"\s*\}\s*$', text, flags=re.DOTALL | re.IGNORECASE)
-    if m:
-        candidate = m.group(2).strip()
-        if candidate:
-            return candidate
+    from json_extract import find_object
+
+    data = find_object(text, "reply")
+    if data is not None:
+        val = str(data["reply"]).strip()
+        if val:
+            return val
 
     # それ以外は生テキスト
     return text
 
+def cache_text(prompt: str) -> str:
+    """llm_cache のキーにする全文（SYSTEM_PROMPT と分ける前と同じ文字列になる）"""
+    return f"{SYSTEM_PROMPT}\n{prompt}"
+
 # ---- モデル呼び出し ----
-def gen_reply_with_gemini(user_text: str, conv_text: str) -> str:
-    if not GEMINI_API_KEY or genai is None:
-        print("[agent] Gemini unavailable; using fallback.", file=sys.stderr)
-        return f"そうかそうか、{user_text}なんだね。"
+def _fallback_reason(e: Exception) -> str:
+    import llm_policy
+
+    if isinstance(e, llm_policy.Unavailable):
+        return "breaker"
+    if isinstance(e, llm_policy.DeadlineExceeded):
+        return "deadline"
+    return "error"
+
+def gen_reply_with_gemini(user_text: str, conv_text: str, summary: str = "", use_cache: bool = True) -> str:
+    import llm_cache
+    import llm_policy
+    import metrics
+    import prompt_cache
+    from json_extract import response_config
+
+    with metrics.span("agent.build_prompt"):
+        prompt = build_prompt(conv_text, user_text, summary)
+    cached = llm_cache.get(MODEL, cache_text(prompt)) if use_cache else None
+    if use_cache:
+        metrics.count("agent.llm_cache", result="miss" if cached is None else "hit")
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        prompt = build_prompt(conv_text, user_text)
-        resp = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
+        if cached is not None:
+            try:
+                with metrics.span("agent.parse_reply"):
+                    return parse_reply(cached, user_text)
+            except Exception as e:
+                # 読めない応答がキャッシュに入っていたら消して、モデルに聞き直す
+                print(f"[agent] cached reply error: {e}", file=sys.stderr)
+                metrics.count("agent.llm_cache", result="corrupt")
+                llm_cache.delete(MODEL, cache_text(prompt))
+
+        client = get_client()
+        if client is None:
+            print("[agent] Gemini unavailable; using fallback.", file=sys.stderr)
+            metrics.count("agent.fallback", reason="no_client")
+            return f"そうかそうか、{user_text}なんだね。"
+        with metrics.span("agent.generate", model=MODEL):
+            resp = llm_policy.call("agent", MODEL, lambda: prompt_cache.generate(
+                client, MODEL, SYSTEM_PROMPT, prompt, response_config(REPLY_SCHEMA), "agent"
+            ))
         resp_text = getattr(resp, "text", "") or ""
-        reply = parse_reply(resp_text, user_text)
+        if use_cache:
+            llm_cache.put(MODEL, cache_text(prompt), resp_text)
+        with metrics.span("agent.parse_reply"):
+            reply = parse_reply(resp_text, user_text)
         return reply or f"そうかそうか、{user_text}なんだね。"
     except Exception as e:
         print(f"[agent] Gemini error: {e}", file=sys.stderr)
+        metrics.count("agent.fallback", reason=_fallback_reason(e))
         return f"そうかそうか、{user_text}なんだね。"
 
-# ---- エントリポイント ----
-def main():
-    user_input = sys.stdin.read().strip()
+def gen_reply_stream_with_gemini(
+    user_text: str, conv_text: str, summary: str = "", use_cache: bool = True
+) -> Iterator[str]:
+    """
+    generate_content_stream で応答を生成し、reply の本文を文ごとに yield する。
+    Gemini が使えない・途中で失敗した場合も、まだ何も返していなければフォールバック文を返す。
+    同じプロンプトの応答がキャッシュにあれば、モデルを呼ばずにそれを文に分けて返す。
+    """
+    import llm_cache
+    import llm_policy
+    import metrics
+    import prompt_cache
+    from json_extract import response_config
+    from reply_stream import ReplyExtractor, SentenceSplitter
 
-    if not user_input:
-        # 空入力でも JSON は返す
-        fallback = "そうだったんですね。今日の出来事から一つ教えてもらえますか？"
-        print(json.dumps({"reply": fallback}, ensure_ascii=False))
+    fallback = f"そうかそうか、{user_text}なんだね。"
+    with metrics.span("agent.build_prompt"):
+        prompt = build_prompt(conv_text, user_text, summary)
+    cached = llm_cache.get(MODEL, cache_text(prompt)) if use_cache else None
+    if use_cache:
+        metrics.count("agent.llm_cache", result="miss" if cached is None else "hit")
+    if cached is not None:
+        try:
+            text = parse_reply(cached, user_text)
+        except Exception as e:
+            # 読めない応答がキャッシュに入っていたら消して、モデルに聞き直す
+            print(f"[agent] cached reply error: {e}", file=sys.stderr)
+            metrics.count("agent.llm_cache", result="corrupt")
+            llm_cache.delete(MODEL, cache_text(prompt))
+        else:
+            splitter = SentenceSplitter()
+            yield from splitter.feed(text) + splitter.flush()
+            return
+
+    client = get_client()
+    if client is None:
+        print("[agent] Gemini unavailable; using fallback.", file=sys.stderr)
+        metrics.count("agent.fallback", reason="no_client")
+        yield fallback
         return
 
-    # 直近の会話ログ（なければ空）
-    conv_text = ""
+    extractor = ReplyExtractor()
+    splitter = SentenceSplitter()
+    emitted = False
+    # yield している間（呼び出し側の音声合成など）は含めず、モデルを待っていた時間だけを足す
+    t0 = time.perf_counter()
+    waited = 0.0
     try:
-        if CONV_PATH.exists():
-            conv_text = CONV_PATH.read_text(encoding="utf-8")
+        for chunk in llm_policy.stream("agent", MODEL, lambda: prompt_cache.generate_stream(
+            client, MODEL, SYSTEM_PROMPT, prompt, response_config(REPLY_SCHEMA), "agent"
+        )):
+            waited += time.perf_counter() - t0
+            piece = extractor.feed(getattr(chunk, "text", "") or "")
+            for sentence in splitter.feed(piece):
+                if not emitted:
+                    metrics.observe("agent.first_sentence", waited, model=MODEL)
+                emitted = True
+                yield sentence
+            t0 = time.perf_counter()
+            if extractor.done:
+                break
+    except Exception as e:
+        print(f"[agent] Gemini stream error: {e}", file=sys.stderr)
+        metrics.count("agent.fallback", reason=_fallback_reason(e))
+        if not emitted:
+            yield fallback
+        return
+    metrics.observe("agent.generate", waited, model=MODEL, stream=True)
+
+    if use_cache:
+        # reply を閉じた時点で打ち切っても、JSON として読める形で保存する
+        llm_cache.put(MODEL, cache_text(prompt), json.dumps({"reply": extractor.text}, ensure_ascii=False) if extractor.done else extractor.raw)
+    rest = splitter.flush()
+    if not extractor.found:
+        # JSON なのに reply が無い等：全文を従来どおりパースして文に分ける
+        rest = splitter.feed(parse_reply(extractor.raw, user_text)) + splitter.flush()
+    for sentence in rest:
+        emitted = True
+        yield sentence
+    if not emitted:
+        yield fallback
+
+# ---- 1 ターン分の処理（CLI / worker 共通） ----
+def _load_context(session: str = "") -> tuple[str, str]:
+    """直近の会話ログ（末尾だけ読む。あふれた分は要約へ。なければ空）"""
+    try:
+        from storage import get_storage
+        return get_storage().conversation_context(session=session)
     except Exception as e:
         print(f"[agent] read conv error: {e}", file=sys.stderr)
+        return "", ""
+
+def reply(user_input: str, session: str = "", use_cache: bool = True) -> str:
+    """ユーザー発話から応答を生成し、session の会話ログへ追記して応答テキストを返す"""
+    user_input = (user_input or "").strip()
+    if not user_input:
+        # 空入力でも応答は返す
+        return FALLBACK_EMPTY
+
+    import metrics
+
+    with metrics.span("agent.reply"):
+        with metrics.span("agent.load_context"):
+            summary, conv_text = _load_context(session)
+
+        # 応答生成
+        reply_text = gen_reply_with_gemini(user_input, conv_text, summary, use_cache)
+
+        # ログ追記（失敗しても会話は返す）
+        try:
+            with metrics.span("agent.append_turn"):
+                append_turn_safe(user_input, reply_text, session)
+        except Exception as e:
+            print(f"[agent] append error: {e}", file=sys.stderr)
 
-    # 応答生成
-    reply_text = gen_reply_with_gemini(user_input, conv_text)
+    return reply_text
+
+def stream_reply(user_input: str, session: str = "", use_cache: bool = True) -> Iterator[str]:
+    """
+    reply() のストリーミング版。応答を文ごとに yield し、
+    全文が揃った時点で会話ログへ追記する。
+    """
+    user_input = (user_input or "").strip()
+    if not user_input:
+        yield FALLBACK_EMPTY
+        return
+
+    import metrics
+
+    with metrics.span("agent.load_context"):
+        summary, conv_text = _load_context(session)
+
+    parts: list[str] = []
+    for sentence in gen_reply_stream_with_gemini(user_input, conv_text, summary, use_cache):
+        parts.append(sentence)
+        yield sentence
 
-    # ログ追記（失敗しても会話は返す）
     try:
-        append_turn_safe(user_input, reply_text)
+        with metrics.span("agent.append_turn"):
+            append_turn_safe(user_input, "".join(parts).strip(), session)
     except Exception as e:
         print(f"[agent] append error: {e}", file=sys.stderr)
 
+# ---- エントリポイント ----
+def main():
+    user_input = sys.stdin.read()
+    use_cache = "--no-cache" not in sys.argv[1:]
     # 標準出力：JSON のみ
-    print(json.dumps({"reply": reply_text}, ensure_ascii=False))
+    if "--stream" in sys.argv[1:]:
+        for sentence in stream_reply(user_input, use_cache=use_cache):
+            print(json.dumps({"sentence": sentence}, ensure_ascii=False), flush=True)
+        return
+    print(json.dumps({"reply": reply(user_input, use_cache=use_cache)}, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
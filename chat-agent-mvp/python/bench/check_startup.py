@@ -0,0 +1,150 @@
+# python/bench/check_startup.py
+# 役割：CLI エントリポイントの起動時間（import 時間）が予算内かを確かめる
+# - python3 -X importtime -c "import <module>" を何回か実行し、起動時の import 時間の合計（最小値）を測る
+#   同じ回に基準（BASELINE: どのモジュールも使う標準ライブラリ json / re / pathlib だけの import）も測り、
+#   その差（基準より何 ms 余計にかかったか）を予算と比べる。マシンの速さや標準ライブラリの import 時間に
+#   左右されにくくするため（絶対値の予算は遅いマシン・CI では常に超える）
+# - あわせて、起動時に読み込んではいけない重い依存（google.genai / gtts / pyttsx3 / dotenv / sqlite3 など）が
+#   import されていないかも確かめる（遅延 import が崩れたら時間に関係なく失敗）
+# - 偽の google-genai / gTTS（bench/fakes）を import パスに入れるので、依存が未導入の環境でも検出できる
+# - 1 つでも超えたら終了コード 1（CI 向け）
+#
+# 使い方:
+#   python bench/check_startup.py
+#   python bench/check_startup.py --budget-ms 120 --runs 5
+#   python bench/check_startup.py --json   結果を JSON で stdout へ
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PY_DIR = BENCH_DIR.parent
+FAKES = BENCH_DIR / "fakes"
+FAKES_OPTIONAL = BENCH_DIR / "fakes_optional"
+
+# 基準の import（どの CLI も読む標準ライブラリ）
+BASELINE = "json, re, pathlib"
+
+# モジュールごとの予算（基準との差、ミリ秒）。ここに無いものは --budget-ms
+DEFAULT_BUDGET_MS = 60.0
+BUDGETS_MS = {
+    # 常駐ワーカーは全モジュールをまとめて読むので別枠
+    "worker": 150.0,
+}
+
+ENTRY_MODULES = [
+    "agent",
+    "voice",
+    "dump_logs",
+    "diary_get",
+    "diary_save",
+    "diary_delete",
+    "diary_list_month",
+    "diary_search",
+    "diary_export",
+    "diary_import",
+    "save_text_by_date",
+    "init_logs",
+    "delete_logs",
+    "tts_cache",
+    "storage",
+    "worker",
+]
+
+# 起動時に読み込んではいけないモジュール（使う時点で import する）
+# （常駐ワーカーも preload() は main() の中で呼ぶので、import 時点では同じ制約がかかる）
+FORBIDDEN = ["google.genai", "gtts", "pyttsx3", "dotenv", "sqlite3"]
+
+_LINE_RE = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+def check_env() -> dict:
+    env = dict(os.environ)
+    paths = [str(FAKES)]
+    if importlib.util.find_spec("dotenv") is None:
+        paths.append(str(FAKES_OPTIONAL))
+    paths.append(str(PY_DIR))
+    env.update({"PYTHONPATH": os.pathsep.join(paths), "PYTHONDONTWRITEBYTECODE": "1"})
+    env.pop("PYTHONIMPORTTIME", None)
+    return env
+
+def import_profile(modules: str, env: dict) -> tuple[float, set[str]]:
+    """
+    python -X importtime -c "import <modules>" の (起動時の import 時間の合計 ms, 読み込まれたモジュール名の集合) を返す。
+    合計はトップレベル（字下げ無し）の累積時間の和なので、site などインタプリタ自身の import も含む（基準と差を取れば消える）
+    """
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modules}"],
+        cwd=PY_DIR, env=env, capture_output=True, text=True,
+    )
+    if p.returncode != 0:
+        raise RuntimeError(f"import {modules} failed:\n{p.stderr[-2000:]}")
+    total_us = 0
+    loaded: set[str] = set()
+    for line in p.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        loaded.add(m.group(4))
+        if len(m.group(3)) == 1:  # 字下げ無し＝トップレベル
+            total_us += int(m.group(2))
+    if not loaded:
+        raise RuntimeError(f"import {modules}: no importtime output")
+    return total_us / 1000, loaded
+
+def check(modules: list[str], runs: int, budget_ms: float) -> list[dict]:
+    env = check_env()
+    rows = []
+    for mod in modules:
+        times, base_times, loaded = [], [], set()
+        # 基準も毎回同じ並びで測り、そのときのマシンの状態に合わせる
+        for _ in range(runs):
+            base_times.append(import_profile(BASELINE, env)[0])
+            ms, names = import_profile(mod, env)
+            times.append(ms)
+            loaded |= names
+        budget = BUDGETS_MS.get(mod, budget_ms)
+        heavy = sorted(n for n in FORBIDDEN if n in loaded)
+        best, base = min(times), min(base_times)
+        over = max(0.0, best - base)
+        rows.append({
+            "module": mod,
+            "import_ms": round(best, 2),
+            "baseline_ms": round(base, 2),
+            "over_ms": round(over, 2),
+            "budget_ms": budget,
+            "eager_imports": heavy,
+            "ok": over <= budget and not heavy,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="既定の予算（基準との差、ミリ秒）")
+    parser.add_argument("--runs", type=int, default=3, help="モジュールごとの試行回数（最小値を使う）")
+    parser.add_argument("--module", action="append", default=[], help="対象を絞る（複数可）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で stdout へ")
+    args = parser.parse_args()
+
+    rows = check(args.module or ENTRY_MODULES, max(1, args.runs), args.budget_ms)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    for r in rows:
+        mark = "ok  " if r["ok"] else "FAIL"
+        extra = f"  eager: {', '.join(r['eager_imports'])}" if r["eager_imports"] else ""
+        print(
+            f"{mark} {r['module']:20} +{r['over_ms']:7.2f} ms / {r['budget_ms']:.0f} ms"
+            f"  (import {r['import_ms']:.2f} ms, baseline {r['baseline_ms']:.2f} ms){extra}",
+            file=sys.stderr,
+        )
+    sys.exit(0 if all(r["ok"] for r in rows) else 1)
+
+if __name__ == "__main__":
+    main()
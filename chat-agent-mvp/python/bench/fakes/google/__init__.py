@@ -0,0 +1,2 @@
+# python/bench/fakes/google/__init__.py
+# ベンチマーク用：本物の google-genai の代わりに読み込ませる（ネットワークに出ない）
@@ -0,0 +1,178 @@
+# python/bench/fakes/google/genai/__init__.py
+# ベンチマーク用の偽 genai.Client
+# - generate_content / generate_content_stream / aio.models.generate_content を本物と同じ形で返す
+# - 遅延は環境変数で調整:
+#     BENCH_LLM_LATENCY … 応答全体にかかる秒数（既定 0.05）
+#     BENCH_LLM_TTFT    … ストリーミングで最初のチャンクが出るまでの秒数（既定 LATENCY の 1/3）
+#     BENCH_LLM_CHUNKS  … ストリーミングのチャンク数（既定 8）
+# - 裾の遅さ・失敗も混ぜられる（llm_policy の期限・ヘッジ・ブレーカーの確認用）:
+#     BENCH_LLM_SLOW_P  … 呼び出しが遅くなる確率（既定 0）
+#     BENCH_LLM_SLOW_S  … 遅くなるときに足す秒数（既定 2。ストリーミングでは最初のチャンクの前に足す）
+#     BENCH_LLM_FAIL_P  … 503 の ServerError を送出する確率（既定 0）
+#     BENCH_LLM_SEED    … 乱数の種（既定 なし）
+# - caches.create / get / delete でコンテキストキャッシュを真似る（プロセス内。ttl を過ぎたら消える）
+#     BENCH_CACHE_MIN_TOKENS … これより短い指示はキャッシュを作れない（既定 0）
+#   消えたキャッシュを cached_content に渡すと、本物と同じく 404 の ClientError を送出する
+#   ヒット/ミス/作成数は caches.stats に数える
+# - models.stream_chunks にテキストのリストを入れると、generate_content_stream はその区切りのまま返す
+#   （チャンクの境目がキーやエスケープの途中に来る場合のテスト用）
+# - 応答には usage_metadata（トークン数は 2 文字 = 1 トークンで概算）を付ける
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from . import errors
+
+REPLY = "そうだったんですね。それは楽しそうですね！そのとき、どんな気持ちでしたか？"
+DIARY = {
+    "summary": "公園で友達と過ごした一日",
+    "body": "📅 日付：今日\n🌞 今日の出来事\n友達と公園を散歩した。\n💭 今日の気持ち\n楽しかった。",
+    "sections": {"出来事": "友達と公園を散歩した", "気持ち": "楽しかった"},
+}
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+def _latency() -> float:
+    return _env_float("BENCH_LLM_LATENCY", 0.05)
+
+_rng = random.Random(os.getenv("BENCH_LLM_SEED") or None)
+
+def _injected() -> float:
+    """遅延の上乗せ（秒）。失敗させる回なら ServerError を送出する"""
+    if _rng.random() < _env_float("BENCH_LLM_FAIL_P", 0.0):
+        raise errors.ServerError(503, "injected failure")
+    if _rng.random() < _env_float("BENCH_LLM_SLOW_P", 0.0):
+        return _env_float("BENCH_LLM_SLOW_S", 2.0)
+    return 0.0
+
+def _tokens(text: str) -> int:
+    return (len(text) + 1) // 2
+
+def _answer(system: str, contents) -> str:
+    prompt = system + (contents if isinstance(contents, str) else str(contents))
+    if '"summary"' in prompt:
+        return json.dumps(DIARY, ensure_ascii=False)
+    return json.dumps({"reply": REPLY}, ensure_ascii=False)
+
+def _usage(system: str, cached: bool, contents, text: str) -> SimpleNamespace:
+    prompt = _tokens(system) + _tokens(contents if isinstance(contents, str) else str(contents))
+    out = _tokens(text)
+    return SimpleNamespace(
+        prompt_token_count=prompt,
+        cached_content_token_count=_tokens(system) if cached else None,
+        candidates_token_count=out,
+        total_token_count=prompt + out,
+    )
+
+def _get(config, name: str, default=None):
+    if config is None:
+        return default
+    if isinstance(config, dict):
+        return config.get(name, default)
+    return getattr(config, name, default)
+
+class _Caches:
+    """client.caches 相当（プロセス内で共有）"""
+
+    _seq = itertools.count(1)
+    _store: dict[str, dict] = {}
+    stats = {"hits": 0, "misses": 0, "creates": 0}
+
+    def create(self, model: str, config=None):
+        system = str(_get(config, "system_instruction", "") or "")
+        if _tokens(system) < _env_float("BENCH_CACHE_MIN_TOKENS", 0):
+            raise errors.ClientError(400, f"Cached content is too small. min_total_token_count={int(_env_float('BENCH_CACHE_MIN_TOKENS', 0))}")
+        ttl = float(str(_get(config, "ttl", "3600s")).rstrip("s"))
+        name = f"cachedContents/fake-{next(self._seq)}"
+        expire = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self._store[name] = {"model": model, "system": system, "expire": expire}
+        self.stats["creates"] += 1
+        return SimpleNamespace(name=name, model=model, expire_time=expire)
+
+    def get(self, name: str):
+        c = self._store.get(name)
+        if c is None or c["expire"] <= datetime.now(timezone.utc):
+            self._store.pop(name, None)
+            raise errors.ClientError(404, f"CachedContent not found (or permission denied): {name}")
+        return SimpleNamespace(name=name, model=c["model"], expire_time=c["expire"])
+
+    def delete(self, name: str) -> None:
+        self._store.pop(name, None)
+
+    def resolve(self, config) -> tuple[str, bool]:
+        """config から (システム指示, キャッシュを使ったか)。消えたキャッシュなら 404"""
+        name = _get(config, "cached_content")
+        if not name:
+            return str(_get(config, "system_instruction", "") or ""), False
+        try:
+            self.get(name)
+        except errors.ClientError:
+            self.stats["misses"] += 1
+            raise
+        self.stats["hits"] += 1
+        return self._store[name]["system"], True
+
+class _Models:
+    def __init__(self, caches: _Caches) -> None:
+        self.calls = 0
+        self.stream_chunks: list[str] | None = None
+        self._caches = caches
+
+    def generate_content(self, model: str, contents, config=None, **kwargs):
+        self.calls += 1
+        system, cached = self._caches.resolve(config)
+        time.sleep(_latency() + _injected())
+        text = _answer(system, contents)
+        return SimpleNamespace(text=text, usage_metadata=_usage(system, cached, contents, text))
+
+    def generate_content_stream(self, model: str, contents, config=None, **kwargs):
+        self.calls += 1
+        system, cached = self._caches.resolve(config)
+        text = _answer(system, contents)
+        usage = _usage(system, cached, contents, text)
+        total = _latency()
+        ttft = _env_float("BENCH_LLM_TTFT", total / 3)
+        n = max(1, int(_env_float("BENCH_LLM_CHUNKS", 8)))
+        step = -(-len(text) // n)
+        time.sleep(ttft + _injected())
+        rest = max(0.0, total - ttft) / n
+        if self.stream_chunks is not None:
+            for i, piece in enumerate(self.stream_chunks):
+                last = i == len(self.stream_chunks) - 1
+                yield SimpleNamespace(text=piece, usage_metadata=usage if last else None)
+            return
+        for i in range(0, len(text), step):
+            last = i + step >= len(text)
+            yield SimpleNamespace(text=text[i:i + step], usage_metadata=usage if last else None)
+            time.sleep(rest)
+
+class _AsyncModels:
+    """client.aio.models 相当（呼び出し回数は同期版と共有）"""
+
+    def __init__(self, models: _Models) -> None:
+        self._models = models
+
+    async def generate_content(self, model: str, contents, config=None, **kwargs):
+        self._models.calls += 1
+        system, cached = self._models._caches.resolve(config)
+        await asyncio.sleep(_latency() + _injected())
+        text = _answer(system, contents)
+        return SimpleNamespace(text=text, usage_metadata=_usage(system, cached, contents, text))
+
+class Client:
+    def __init__(self, api_key: str | None = None, **kwargs) -> None:
+        self.caches = _Caches()
+        self.models = _Models(self.caches)
+        self.aio = SimpleNamespace(models=_AsyncModels(self.models))
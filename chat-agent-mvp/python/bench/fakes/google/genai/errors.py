@@ -0,0 +1,16 @@
+# python/bench/fakes/google/genai/errors.py
+# 偽 google.genai.errors（本物と同じく code と message を持つ）
+
+from __future__ import annotations
+
+class APIError(Exception):
+    def __init__(self, code: int, message: str = "") -> None:
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+class ClientError(APIError):
+    pass
+
+class ServerError(APIError):
+    pass
@@ -0,0 +1,32 @@
+# python/bench/fakes/gtts/__init__.py
+# ベンチマーク用の偽 gTTS（ネットワークに出ない）
+# - BENCH_TTS_LATENCY … 1 文字あたりの秒数（既定 0.002）＋固定 BENCH_TTS_BASE（既定 0.03）
+# - 出力はテキスト長に比例した大きさのダミー MP3 バイト列
+
+from __future__ import annotations
+
+import os
+import time
+
+BYTES_PER_CHAR = 400
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+class gTTS:
+    def __init__(self, text: str, lang: str = "ja", tld: str = "co.jp", slow: bool = False, **kwargs) -> None:
+        self.text = text
+
+    def _audio(self) -> bytes:
+        time.sleep(_env_float("BENCH_TTS_BASE", 0.03) + _env_float("BENCH_TTS_LATENCY", 0.002) * len(self.text))
+        return b"ID3\x03\x00\x00\x00\x00\x00\x00" + b"\xff\xfb" * (BYTES_PER_CHAR * len(self.text) // 2)
+
+    def write_to_fp(self, fp) -> None:
+        fp.write(self._audio())
+
+    def save(self, savefile: str) -> None:
+        with open(savefile, "wb") as f:
+            f.write(self._audio())
@@ -0,0 +1,60 @@
+# python/bench/fakes/pyttsx3/__init__.py
+# ベンチマーク用の偽 pyttsx3（OS の音声合成を使わない）
+# - Engine の初期化に BENCH_PYTTSX3_INIT 秒（既定 0.15）、合成に 1 文字あたり BENCH_PYTTSX3_LATENCY 秒（既定 0.0005）
+# - save_to_file → runAndWait でテキスト長に比例した無音の WAV を書く
+
+from __future__ import annotations
+
+import os
+import time
+import wave
+
+SAMPLES_PER_CHAR = 2000
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+class Voice:
+    def __init__(self, id: str, name: str, languages: list) -> None:
+        self.id = id
+        self.name = name
+        self.languages = languages
+
+_VOICES = [
+    Voice("gmw/en", "English", [b"\x05en"]),
+    Voice("jpx/ja", "Japanese", [b"\x05ja"]),
+]
+
+class Engine:
+    def __init__(self, driverName: str | None = None, debug: bool = False) -> None:
+        time.sleep(_env_float("BENCH_PYTTSX3_INIT", 0.15))
+        self._props = {"rate": 200, "volume": 1.0, "voice": _VOICES[0].id, "voices": _VOICES}
+        self._queue: list[tuple[str, str]] = []
+
+    def getProperty(self, name: str):
+        return self._props[name]
+
+    def setProperty(self, name: str, value) -> None:
+        self._props[name] = value
+
+    def save_to_file(self, text: str, filename: str) -> None:
+        self._queue.append((text, filename))
+
+    def say(self, text: str) -> None:
+        pass
+
+    def runAndWait(self) -> None:
+        for text, filename in self._queue:
+            time.sleep(_env_float("BENCH_PYTTSX3_LATENCY", 0.0005) * len(text))
+            with wave.open(filename, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(22050)
+                w.writeframes(b"\x00\x00" * SAMPLES_PER_CHAR * len(text))
+        self._queue.clear()
+
+def init(driverName: str | None = None, debug: bool = False) -> Engine:
+    return Engine(driverName, debug)
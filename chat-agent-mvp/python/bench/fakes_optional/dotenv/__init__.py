@@ -0,0 +1,5 @@
+# python/bench/fakes_optional/dotenv/__init__.py
+# python-dotenv が入っていない環境でもベンチマークを回すための代用品（入っていれば使われない）
+
+def load_dotenv(*args, **kwargs) -> bool:
+    return False
@@ -0,0 +1,403 @@
+# python/bench/run_bench.py
+# 役割：Python 側エントリポイントのオフラインベンチマーク
+# - 偽の genai.Client / gTTS（bench/fakes）を使うので、API キーもネットワークも不要
+# - 一時ディレクトリに会話ログ・日記コーパスを作り、サイズを変えながら測る
+#     startup … python3 の起動＋各モジュールの import にかかる時間
+#     cli     … agent.py / voice.py / dump_logs.py / diary_list_month.py / diary_export.py / diary_import.py を
+#               サブプロセスで丸ごと実行（時間・最大 RSS）
+#     stages  … 同じ処理をプロセス内で段階ごとに計測（時間・tracemalloc のピーク）
+#     tail    … 偽クライアントに遅い回・失敗する回を混ぜ、応答生成の裾（p95 / p99）とフォールバック率を
+#               llm_policy のヘッジ・期限あり／なしで比べる（BENCH_LLM_SLOW_P / BENCH_LLM_SLOW_S / BENCH_LLM_FAIL_P）
+# - 結果は JSON に書き出し、--compare で以前の結果と比べて退行を検出できる
+#
+# 使い方:
+#   python bench/run_bench.py                       # 全部（結果は bench/results/ に保存）
+#   python bench/run_bench.py --quick --suite stages
+#   python bench/run_bench.py --suite tail --tail-n 300
+#   python bench/run_bench.py --compare bench/results/old.json --threshold 0.2
+#
+# 偽クライアントの遅延は環境変数 BENCH_LLM_LATENCY / BENCH_LLM_TTFT / BENCH_TTS_BASE / BENCH_TTS_LATENCY で調整する。
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PY_DIR = BENCH_DIR.parent
+FAKES = BENCH_DIR / "fakes"
+FAKES_OPTIONAL = BENCH_DIR / "fakes_optional"
+RESULTS_DIR = BENCH_DIR / "results"
+
+ENTRY_MODULES = ["agent", "voice", "dump_logs", "diary_list_month", "worker"]
+SAMPLE_INPUT = "今日は友達と公園を散歩して、カフェでケーキを食べました。"
+
+SIZES = {
+    "full": {"turns": [0, 100, 1000, 10000], "diaries": [31, 365, 1825]},
+    "quick": {"turns": [0, 100], "diaries": [31, 365]},
+}
+
+# ---- データ生成 ----
+_WORDS = "今日は 公園 散歩 友達 カフェ 仕事 会議 雨 晴れ 映画 読書 料理 ランニング 買い物 家族 電話 勉強 旅行".split()
+
+def _sentence(i: int) -> str:
+    return "".join(_WORDS[(i * 7 + k * 3) % len(_WORDS)] for k in range(6)) + "。"
+
+def write_conversation(log_dir: Path, turns: int) -> None:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    lines = []
+    for i in range(turns):
+        lines.append(f"[USER] {_sentence(i)}{_sentence(i + 1)}\n")
+        lines.append(f"[ASSISTANT] そうだったんですね。{_sentence(i + 2)}\n")
+    (log_dir / "conversation.txt").write_text("".join(lines), encoding="utf-8")
+    for p in log_dir.glob("conversation.summary.json"):
+        p.unlink()
+
+def write_corpus(log_dir: Path, days: int, start: date = date(2020, 1, 1)) -> None:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(days):
+        d = start + timedelta(days=i)
+        body = "".join(_sentence(i + k) for k in range(20))
+        (log_dir / f"{d.isoformat()}.txt").write_text(body, encoding="utf-8")
+
+# ---- 計測 ----
+def summarize(samples_s: list[float]) -> dict:
+    ms = sorted(s * 1000 for s in samples_s)
+    p95 = ms[min(len(ms) - 1, int(round(0.95 * (len(ms) - 1))))]
+    p99 = ms[min(len(ms) - 1, int(round(0.99 * (len(ms) - 1))))]
+    return {
+        "n": len(ms),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+def bench_env(work: Path) -> dict:
+    env = dict(os.environ)
+    paths = [str(FAKES)]
+    if importlib.util.find_spec("dotenv") is None:
+        paths.append(str(FAKES_OPTIONAL))
+    paths.append(str(PY_DIR))
+    env.update({
+        "PYTHONPATH": os.pathsep.join(paths),
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "GEMINI_API_KEY": "bench",
+        "STORAGE_BACKEND": "file",
+        "STORAGE_LOG_DIR": str(work / "logs"),
+        "SEARCH_INDEX": str(work / "search.db"),
+        "TTS_CACHE_DIR": str(work / "tts"),
+        "TTS_CACHE_MAX_BYTES": "0",
+    })
+    return env
+
+def run_proc(cmd: list[str], env: dict, stdin: str = "") -> tuple[float, int]:
+    """サブプロセスを 1 回実行し、(経過秒, 最大 RSS KB) を返す"""
+    t0 = time.perf_counter()
+    p = subprocess.Popen(cmd, cwd=PY_DIR, env=env, stdin=subprocess.PIPE,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    p.stdin.write(stdin.encode("utf-8"))
+    p.stdin.close()
+    rss_kb = 0
+    if hasattr(os, "wait4"):
+        _, status, ru = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+        # Linux は KB、macOS はバイト
+        rss_kb = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss
+    else:
+        p.wait()
+    elapsed = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with {p.returncode}")
+    return elapsed, rss_kb
+
+def record(results: list, suite: str, name: str, params: dict, samples: list[float], **extra) -> None:
+    row = {"suite": suite, "name": name, "params": params, **summarize(samples), **extra}
+    results.append(row)
+    label = " ".join(f"{k}={v}" for k, v in params.items())
+    print(f"  {suite:8} {name:28} {label:22} median {row['median_ms']:9.2f} ms  p95 {row['p95_ms']:9.2f} ms", file=sys.stderr)
+
+# ---- startup ----
+def suite_startup(results: list, work: Path, repeat: int) -> None:
+    env = bench_env(work)
+    py = sys.executable
+    base = [run_proc([py, "-c", "pass"], env)[0] for _ in range(repeat)]
+    record(results, "startup", "interpreter", {}, base)
+    for mod in ENTRY_MODULES:
+        samples, rss = [], 0
+        for _ in range(repeat):
+            t, r = run_proc([py, "-c", f"import {mod}"], env)
+            samples.append(t)
+            rss = max(rss, r)
+        record(results, "startup", f"import {mod}", {}, samples,
+               import_only_ms=round((statistics.median(samples) - statistics.median(base)) * 1000, 3),
+               peak_rss_kb=rss)
+
+# ---- cli ----
+def suite_cli(results: list, work: Path, repeat: int, sizes: dict) -> None:
+    env = bench_env(work)
+    py = sys.executable
+    log_dir = work / "logs"
+
+    def timed(cmd, stdin="", setup=None):
+        samples, rss = [], 0
+        for _ in range(repeat):
+            if setup:
+                setup()
+            t, r = run_proc(cmd, env, stdin)
+            samples.append(t)
+            rss = max(rss, r)
+        return samples, rss
+
+    for turns in sizes["turns"]:
+        s, rss = timed([py, "agent.py"], SAMPLE_INPUT, lambda: write_conversation(log_dir, turns))
+        record(results, "cli", "agent.py", {"turns": turns}, s, peak_rss_kb=rss)
+        s, rss = timed([py, "dump_logs.py", "--date", "2024-01-01"], setup=lambda: write_conversation(log_dir, turns))
+        record(results, "cli", "dump_logs.py", {"turns": turns}, s, peak_rss_kb=rss)
+
+    for engine in ("gtts", "pyttsx3"):
+        s, rss = timed([py, "voice.py", "--out", "-", "--no-cache", "--engine", engine], SAMPLE_INPUT)
+        params = {"chars": len(SAMPLE_INPUT)} if engine == "gtts" else {"chars": len(SAMPLE_INPUT), "engine": engine}
+        record(results, "cli", "voice.py", params, s, peak_rss_kb=rss)
+
+    for days in sizes["diaries"]:
+        shutil.rmtree(log_dir, ignore_errors=True)
+        write_corpus(log_dir, days)
+        last = date(2020, 1, 1) + timedelta(days=days - 1)
+        s, rss = timed([py, "diary_list_month.py", "--year", str(last.year), "--month", str(last.month)])
+        record(results, "cli", "diary_list_month.py", {"diaries": days}, s, peak_rss_kb=rss)
+        s, rss = timed([py, "diary_list_month.py", "--from", "2020-01-01", "--to", last.isoformat()])
+        record(results, "cli", "diary_list_month.py --from/--to", {"diaries": days}, s, peak_rss_kb=rss)
+
+        # 一括書き出し・取り込み（件数/秒も残す）
+        s, rss = timed([py, "diary_export.py"])
+        record(results, "cli", "diary_export.py", {"diaries": days}, s, peak_rss_kb=rss,
+               per_sec=round(days / statistics.median(s), 1))
+        archive = subprocess.run([py, "diary_export.py"], cwd=PY_DIR, env=env, capture_output=True, check=True).stdout
+        s, rss = timed([py, "diary_import.py"], archive.decode("utf-8"), lambda: shutil.rmtree(log_dir, ignore_errors=True))
+        record(results, "cli", "diary_import.py", {"diaries": days}, s, peak_rss_kb=rss,
+               per_sec=round(days / statistics.median(s), 1))
+
+# ---- stages（プロセス内） ----
+def _measure(fn, repeat: int, setup=None) -> tuple[list[float], int]:
+    """fn を repeat 回計測し、最後に 1 回だけ tracemalloc でピークメモリを取る"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, peak // 1024
+
+def suite_stages(results: list, work: Path, repeat: int, sizes: dict) -> None:
+    env = bench_env(work)
+    for key in ("GEMINI_API_KEY", "STORAGE_BACKEND", "STORAGE_LOG_DIR", "SEARCH_INDEX", "TTS_CACHE_DIR", "TTS_CACHE_MAX_BYTES"):
+        os.environ[key] = env[key]
+    for p in reversed(env["PYTHONPATH"].split(os.pathsep)):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+    import agent
+    import diary_list_month
+    import dump_logs
+    import month_index
+    import storage
+    import voice
+
+    log_dir = work / "logs"
+
+    def fresh_storage():
+        storage._storage = storage.FileStorage(log_dir, log_dir / "conversation.txt")
+
+    def rec(name, params, fn, setup=None):
+        # 各モジュールの警告（FFmpeg なし等）で結果表示が埋もれないよう、計測中の stderr は捨てる
+        with contextlib.redirect_stderr(io.StringIO()):
+            samples, peak = _measure(fn, repeat, setup)
+        record(results, "stages", name, params, samples, peak_kb=peak)
+
+    for turns in sizes["turns"]:
+        def reset(turns=turns):
+            write_conversation(log_dir, turns)
+            fresh_storage()
+        reset()
+        ctx = {}
+        p = {"turns": turns}
+        rec("agent.context", p, lambda: ctx.update(v=storage.get_storage().conversation_context()), reset)
+        summary, conv = ctx["v"]
+        rec("agent.build_prompt", p, lambda: agent.build_prompt(conv, SAMPLE_INPUT, summary))
+        rec("agent.model", p, lambda: agent.gen_reply_with_gemini(SAMPLE_INPUT, conv, summary))
+        rec("agent.append", p, lambda: agent.append_turn_safe(SAMPLE_INPUT, "そうだったんですね。"), reset)
+        rec("agent.reply", p, lambda: agent.reply(SAMPLE_INPUT), reset)
+
+        def first_sentence():
+            it = agent.stream_reply(SAMPLE_INPUT)
+            next(it)
+            it.close()
+        rec("agent.stream_first_sentence", p, first_sentence, reset)
+        rec("dump_logs.generate_diary", p, lambda: dump_logs.generate_diary("2024-01-01"), reset)
+
+    os.environ["TTS_CACHE_MAX_BYTES"] = "0"
+    rec("voice.synthesize", {"cache": "off"}, lambda: voice.synthesize(SAMPLE_INPUT))
+    # pyttsx3 は初期化済みエンジンのプールを使い回すので、2 回目以降は初期化を含まない
+    rec("voice.synthesize", {"cache": "off", "engine": "pyttsx3"}, lambda: voice.synthesize(SAMPLE_INPUT, engine="pyttsx3"))
+    os.environ["TTS_CACHE_MAX_BYTES"] = str(50 * 1024 * 1024)
+    voice.synthesize(SAMPLE_INPUT)
+    rec("voice.synthesize", {"cache": "hit"}, lambda: voice.synthesize(SAMPLE_INPUT))
+    os.environ["TTS_CACHE_MAX_BYTES"] = "0"
+
+    for days in sizes["diaries"]:
+        shutil.rmtree(log_dir, ignore_errors=True)
+        write_corpus(log_dir, days)
+        fresh_storage()
+        last = date(2020, 1, 1) + timedelta(days=days - 1)
+        p = {"diaries": days}
+
+        def drop_index():
+            shutil.rmtree(log_dir / month_index.INDEX_DIRNAME, ignore_errors=True)
+        rec("diary_list_month.cold", p, lambda: diary_list_month.list_month(last.year, last.month), drop_index)
+        rec("diary_list_month.warm", p, lambda: diary_list_month.list_month(last.year, last.month))
+
+# ---- tail ----
+# 既定の注入：3% の呼び出しが 1 秒遅れ、1% が 503 で失敗する（環境変数があればそちら）
+TAIL_FAULTS = {"BENCH_LLM_LATENCY": "0.05", "BENCH_LLM_SLOW_P": "0.03", "BENCH_LLM_SLOW_S": "1.0",
+               "BENCH_LLM_FAIL_P": "0.01", "BENCH_LLM_SEED": "1"}
+TAIL_POLICIES = {
+    "off": {"LLM_HEDGE": "0", "LLM_AGENT_DEADLINE_S": "60", "LLM_BREAKER_FAILURES": "0"},
+    "on": {"LLM_HEDGE": "1", "LLM_AGENT_DEADLINE_S": "0.6", "LLM_BREAKER_FAILURES": "5"},
+}
+
+def suite_tail(results: list, work: Path, n: int) -> None:
+    env = bench_env(work)
+    for key in ("GEMINI_API_KEY", "STORAGE_BACKEND", "STORAGE_LOG_DIR", "SEARCH_INDEX"):
+        os.environ[key] = env[key]
+    for k, v in TAIL_FAULTS.items():
+        os.environ.setdefault(k, v)
+    for p in reversed(env["PYTHONPATH"].split(os.pathsep)):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+    import agent
+    import llm_policy
+
+    faults = {k: os.environ[k] for k in TAIL_FAULTS}
+    for name, policy in TAIL_POLICIES.items():
+        os.environ.update(policy)
+        llm_policy._latency.clear()
+        llm_policy._breakers.clear()
+        llm_policy._counters.clear()
+        samples: list[float] = []
+        fallbacks = 0
+        with contextlib.redirect_stderr(io.StringIO()):
+            for _ in range(n):
+                t0 = time.perf_counter()
+                reply = agent.gen_reply_with_gemini(SAMPLE_INPUT, "", use_cache=False)
+                samples.append(time.perf_counter() - t0)
+                fallbacks += reply.startswith("そうかそうか")
+        c = llm_policy.stats()["callers"].get("agent", {})
+        record(results, "tail", "agent.model", {"policy": name, **faults}, samples,
+               fallback_rate=round(fallbacks / n, 4), hedged=c.get("hedged", 0), deadline=c.get("deadline", 0))
+
+# ---- 比較 ----
+def _key(row: dict) -> str:
+    return f"{row['suite']}|{row['name']}|{json.dumps(row.get('params', {}), sort_keys=True)}"
+
+def compare(base_path: Path, current: dict, threshold: float, min_ms: float = 1.0) -> int:
+    """中央値が threshold（割合）かつ min_ms 以上悪化した項目を表示し、その件数を返す"""
+    base = {_key(r): r for r in json.loads(base_path.read_text(encoding="utf-8"))["results"]}
+    regressions = 0
+    print(f"{'benchmark':60} {'base':>10} {'now':>10} {'delta':>8}", file=sys.stderr)
+    for row in current["results"]:
+        old = base.get(_key(row))
+        if not old:
+            continue
+        a, b = old["median_ms"], row["median_ms"]
+        delta = (b - a) / a if a else 0.0
+        bad = delta > threshold and b - a > min_ms
+        regressions += bad
+        label = f"{row['suite']} {row['name']} {json.dumps(row.get('params', {}), ensure_ascii=False)}"
+        print(f"{label[:60]:60} {a:10.2f} {b:10.2f} {delta:+8.1%}{'  REGRESSION' if bad else ''}", file=sys.stderr)
+    return regressions
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PY_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suite", action="append", choices=["startup", "cli", "stages", "tail"],
+                        help="実行するスイート（複数指定可。省略時は tail 以外の全部）")
+    parser.add_argument("--quick", action="store_true", help="小さいサイズだけで回す")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tail-n", type=int, default=200, help="tail で呼び出す回数（ポリシーごと）")
+    parser.add_argument("--out", default="", help="結果 JSON の出力先（省略時は bench/results/bench-<時刻>.json）")
+    parser.add_argument("--compare", default="", help="比較対象の結果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="退行とみなす悪化率（既定 0.2 = 20%%）")
+    args = parser.parse_args()
+
+    suites = args.suite or ["startup", "cli", "stages"]
+    sizes = SIZES["quick" if args.quick else "full"]
+    results: list = []
+    with tempfile.TemporaryDirectory(prefix="diary-bench-") as td:
+        work = Path(td)
+        if "startup" in suites:
+            suite_startup(results, work, args.repeat)
+        if "cli" in suites:
+            suite_cli(results, work, args.repeat, sizes)
+        if "stages" in suites:
+            suite_stages(results, work, args.repeat, sizes)
+        if "tail" in suites:
+            suite_tail(results, work, args.tail_n)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ffmpeg": bool(shutil.which("ffmpeg")),
+            "repeat": args.repeat,
+            "sizes": sizes,
+            "fake_latency": {k: os.getenv(k, "") for k in
+                             ("BENCH_LLM_LATENCY", "BENCH_LLM_TTFT", "BENCH_TTS_BASE", "BENCH_TTS_LATENCY",
+                              "BENCH_LLM_SLOW_P", "BENCH_LLM_SLOW_S", "BENCH_LLM_FAIL_P")},
+        },
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[bench] wrote {out}", file=sys.stderr)
+
+    if args.compare:
+        if compare(Path(args.compare), report, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
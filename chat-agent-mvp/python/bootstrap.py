@@ -0,0 +1,57 @@
+# python/bootstrap.py
+# 役割：各 CLI が最初に読む軽量な共通部分（パスと環境変数）
+# - API ごとに python3 を起動し直すので、ここでは os / pathlib 以外を import しない
+# - .env の読み込み（python-dotenv）と google-genai / gTTS は、実際に必要になった時点で一度だけ import する
+# - 常駐ワーカーは preload() で先に読み込み、最初のリクエストで待たせない
+
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+PY_DIR = Path(__file__).resolve().parent
+ROOT_DIR = PY_DIR.parent
+LOG_DIR = PY_DIR / "logs"
+CONV_PATH = LOG_DIR / "conversation.txt"
+
+_env_loaded = False
+_optional: dict = {}
+
+def load_env() -> None:
+    """.env を一度だけ読み込む（python-dotenv が無ければ環境変数だけを使う）"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+def gemini_api_key() -> str | None:
+    load_env()
+    return os.getenv("GEMINI_API_KEY")
+
+def optional_import(name: str):
+    """name を import して返す。入っていなければ None（結果は覚えておき、失敗を毎回繰り返さない）"""
+    if name not in _optional:
+        try:
+            module = __import__(name, fromlist=["_"])
+        except Exception as e:
+            print(f"[bootstrap] {name} unavailable: {e}", file=sys.stderr)
+            module = None
+        _optional[name] = module
+    return _optional[name]
+
+def genai():
+    """google.genai モジュール（pip install google-genai。無ければ None）"""
+    return optional_import("google.genai")
+
+def preload() -> None:
+    """常駐プロセス向け：遅延 import している重い依存を先に読み込んでおく"""
+    load_env()
+    if gemini_api_key():
+        genai()
+    optional_import("gtts")
@@ -0,0 +1,123 @@
+# python/context_window.py
+# 役割：会話ログから「プロンプトに載せる分」だけを取り出す
+# - ログ全体は読まず、EOF から後ろ向きに seek して末尾だけ読み、予算（文字数）に収まる直近ターンだけ返す
+#   （セグメント化されたログでは、アクティブで足りないときだけ直前のセグメントを見る。conv_log.read_tail）
+# - 予算からあふれた古いターンは、ログの隣（conversation.summary.json）の要約に少しずつ畳み込む
+# - 1 ターンあたりの読み込み量・プロンプト長は会話の長さに依らずほぼ一定
+#
+# 予算は環境変数で変更可能:
+#   CONTEXT_MAX_CHARS   … 直近ログの最大文字数（既定 4000）
+#   CONTEXT_MAX_TOKENS  … トークン数で指定したい場合（CHARS_PER_TOKEN 倍して文字数に換算）
+#   CONTEXT_SUMMARY_CHARS … 要約の最大文字数（既定 800）
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import conv_log
+
+CHARS_PER_TOKEN = 1.5  # 日本語はおおむね 1 トークン 1〜2 文字
+
+def _env_int(name: str) -> int | None:
+    try:
+        v = int(os.getenv(name, ""))
+        return v if v > 0 else None
+    except ValueError:
+        return None
+
+def char_budget() -> int:
+    tokens = _env_int("CONTEXT_MAX_TOKENS")
+    if tokens:
+        return int(tokens * CHARS_PER_TOKEN)
+    return _env_int("CONTEXT_MAX_CHARS") or 4000
+
+def summary_budget() -> int:
+    return _env_int("CONTEXT_SUMMARY_CHARS") or 800
+
+def summary_path_for(log_path: Path) -> Path:
+    return log_path.with_name(log_path.stem + ".summary.json")
+
+# ---- 末尾読み ----
+def read_tail(log_path: Path, max_chars: int) -> tuple[str, int]:
+    """
+    ログ末尾から max_chars 文字以内に収まる行をまとめて返す（閉じたセグメントにまたがっても可）。
+    戻り値: (テキスト, テキスト先頭の論理オフセット)
+    """
+    return conv_log.read_tail(log_path, max_chars)
+
+# ---- 要約 ----
+def load_summary(log_path: Path) -> dict:
+    p = summary_path_for(log_path)
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+        if isinstance(data, dict):
+            return {
+                "epoch": str(data.get("epoch", "")),
+                "offset": int(data.get("offset", 0)),
+                "summary": str(data.get("summary", "")),
+            }
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[context] summary load error: {e}", file=sys.stderr)
+    return {"epoch": "", "offset": 0, "summary": ""}
+
+def _save_summary(log_path: Path, state: dict) -> None:
+    p = summary_path_for(log_path)
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(p)
+
+def reset_summary(log_path: Path) -> None:
+    try:
+        summary_path_for(log_path).unlink()
+    except FileNotFoundError:
+        pass
+
+def fold_turns(summary: str, old_text: str, max_chars: int) -> str:
+    """
+    あふれたターンを要約へ畳み込む（モデルは呼ばない抽出型）。
+    ユーザー発話を短く切って箇条書きで足し、予算を超えたら古い行から落とす。
+    """
+    items = [l for l in summary.splitlines() if l.strip()]
+    for line in old_text.splitlines():
+        if line.startswith("[USER] "):
+            s = " ".join(line[len("[USER] "):].split())
+            if s:
+                items.append("- " + (s if len(s) <= 40 else s[:40] + "…"))
+    while items and sum(len(i) + 1 for i in items) > max_chars:
+        items.pop(0)
+    return "\n".join(items)
+
+# ---- 公開 API ----
+def build_context(log_path: Path, max_chars: int | None = None) -> tuple[str, str]:
+    """
+    プロンプト用の (要約, 直近ログ) を返す。
+    直近ログからあふれた分は要約に畳み込み、要約ファイルを更新する。
+    """
+    max_chars = max_chars or char_budget()
+    tail, start = read_tail(log_path, max_chars)
+    state = load_summary(log_path)
+    gen = conv_log.epoch(log_path)
+
+    # ログが初期化された（世代が変わった・要約の位置より短い）なら要約も捨てる
+    if state["epoch"] != gen or state["offset"] > start + len(tail.encode("utf-8")):
+        state = {"epoch": gen, "offset": 0, "summary": ""}
+
+    if start > state["offset"]:
+        # 未要約区間が大きすぎても読み込みは要約予算の数倍までに抑える
+        lo = max(state["offset"], start - summary_budget() * 8)
+        try:
+            old = conv_log.read_range(log_path, lo, start)
+            if lo > state["offset"]:
+                nl = old.find("\n")
+                old = old[nl + 1:] if nl >= 0 else ""
+            state = {"epoch": gen, "offset": start, "summary": fold_turns(state["summary"], old, summary_budget())}
+            _save_summary(log_path, state)
+        except Exception as e:
+            print(f"[context] fold error: {e}", file=sys.stderr)
+
+    return state["summary"], tail
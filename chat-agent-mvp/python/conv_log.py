@@ -0,0 +1,316 @@
+# python/conv_log.py
+# 役割：会話ログ（conversation.txt / sessions/<id>.txt）をセグメントに分けて追記・読み出しする
+# - 書き込み先（アクティブセグメント）は従来どおりのファイルそのもの。追記は 1 レコード 1 回の write
+# - サイズ（CONV_SEGMENT_BYTES）を超えたとき、または日付が変わったときにローテーションし、
+#   閉じたセグメントは <stem>.segments/NNNNNN.txt.gz に gzip で圧縮して置く
+# - <stem>.segments/manifest.json に各セグメントの論理オフセット・サイズ・日付と、ログの世代（epoch）を持つ
+#   オフセットはすべて「全セグメントを連結したときのバイト位置」（論理オフセット）で表す
+#   初期化（reset）で epoch が変わるので、古いカーソルや要約の位置は無効だと分かる
+# - 読み出しはイテレータで、必要なセグメントだけを開く。末尾読み（read_tail）は通常アクティブだけで済み、
+#   足りないときだけ直前のセグメントを展開する
+# - 追記・ローテーションは <stem>.segments/.lock の排他ロック、読み出しは共有ロックの下で行う
+#
+# 設定（環境変数）:
+#   CONV_SEGMENT_BYTES … 1 セグメントの上限（既定 256KB、0 でサイズによるローテーションなし）
+#   CONV_ROTATE_DAILY  … "0" で日付によるローテーションをしない（既定 "1"）
+
+from __future__ import annotations
+
+import codecs
+import contextlib
+import json
+import os
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+DEFAULT_SEGMENT_BYTES = 256 * 1024
+_READ_CHUNK = 64 * 1024
+
+def segment_bytes() -> int:
+    try:
+        return max(0, int(os.getenv("CONV_SEGMENT_BYTES", "")))
+    except ValueError:
+        return DEFAULT_SEGMENT_BYTES
+
+def rotate_daily() -> bool:
+    return os.getenv("CONV_ROTATE_DAILY", "1") != "0"
+
+def segment_dir(path: Path) -> Path:
+    return path.with_name(path.stem + ".segments")
+
+def _manifest_path(path: Path) -> Path:
+    return segment_dir(path) / "manifest.json"
+
+# ---- ロック ----
+@contextlib.contextmanager
+def _locked(path: Path, exclusive: bool):
+    d = segment_dir(path)
+    if fcntl is None or (not exclusive and not d.exists()):
+        # まだ一度もローテーションしていないログは、追記が 1 回の write なので読むだけならロック不要
+        yield
+        return
+    d.mkdir(parents=True, exist_ok=True)
+    fd = os.open(d / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+# ---- マニフェスト ----
+def _today() -> str:
+    return date.today().isoformat()
+
+def _new_manifest(path: Path) -> dict:
+    try:
+        # 既存のログ（マニフェスト導入前）は最終更新日を開始日とみなす
+        opened = datetime.fromtimestamp(path.stat().st_mtime).date().isoformat()
+    except FileNotFoundError:
+        opened = _today()
+    return {"epoch": os.urandom(6).hex(), "base": 0, "opened": opened, "segments": []}
+
+def _load_manifest(path: Path) -> dict | None:
+    try:
+        data = json.loads(_manifest_path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("segments"), list):
+        return None
+    return data
+
+def _save_manifest(path: Path, manifest: dict) -> None:
+    p = _manifest_path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, p)
+
+def manifest(path: Path) -> dict:
+    """マニフェスト（無ければ空のもの）。読み出し専用"""
+    return _load_manifest(path) or {"epoch": "", "base": 0, "opened": _today(), "segments": []}
+
+def epoch(path: Path) -> str:
+    """ログの世代 ID。初期化するたびに変わる（無ければここで作って保存する）"""
+    m = _load_manifest(path)
+    if m is not None:
+        return m["epoch"]
+    with _locked(path, exclusive=True):
+        m = _load_manifest(path)
+        if m is None:
+            m = _new_manifest(path)
+            _save_manifest(path, m)
+        return m["epoch"]
+
+# ---- 書き込み ----
+def _write_all(fd: int, buf: bytes) -> None:
+    view = memoryview(buf)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+def _rotate(path: Path, m: dict, size: int) -> None:
+    """アクティブセグメントを閉じて圧縮し、新しい空のアクティブに切り替える（排他ロック中に呼ぶ）"""
+    d = segment_dir(path)
+    seq = (m["segments"][-1]["seq"] + 1) if m["segments"] else 1
+    raw = d / f"{seq:06d}.txt"
+    os.replace(path, raw)
+    entry = {"seq": seq, "file": raw.name, "start": m["base"], "bytes": size, "opened": m["opened"], "closed": _today()}
+    m["segments"].append(entry)
+    m["base"] += size
+    m["opened"] = _today()
+    _save_manifest(path, m)
+
+    import gzip
+
+    gz = raw.with_name(raw.name + ".gz")
+    tmp = gz.with_name(gz.name + ".tmp")
+    with raw.open("rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, gz)
+    entry["file"] = gz.name
+    _save_manifest(path, m)
+    raw.unlink()
+
+def append(path: Path, data: str) -> None:
+    """
+    1 レコードを追記する。必要ならその前にローテーションする。
+    ロックを取ってから 1 回の write で書くので、同時に追記しても行が混ざらない
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(path, exclusive=True):
+        m = _load_manifest(path)
+        created = m is None
+        if created:
+            m = _new_manifest(path)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        limit = segment_bytes()
+        if size > 0 and ((limit and size >= limit) or (rotate_daily() and m["opened"] != _today())):
+            _rotate(path, m, size)
+        elif created:
+            _save_manifest(path, m)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            _write_all(fd, data.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+def reset(path: Path, keep_file: bool = True) -> None:
+    """ログを初期化する（閉じたセグメントも消し、epoch を新しくする）。keep_file=False ならアクティブも消す"""
+    with _locked(path, exclusive=True):
+        d = segment_dir(path)
+        for p in d.glob("[0-9]*.txt*"):
+            p.unlink(missing_ok=True)
+        if keep_file:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("", encoding="utf-8")
+        else:
+            path.unlink(missing_ok=True)
+        m = _new_manifest(path)
+        m["opened"] = _today()
+        if keep_file:
+            _save_manifest(path, m)
+        else:
+            _manifest_path(path).unlink(missing_ok=True)
+    if not keep_file:
+        shutil.rmtree(d, ignore_errors=True)
+
+# ---- 読み出し ----
+def _open_segment(d: Path, seg: dict):
+    import gzip  # 閉じたセグメントを読むときだけ
+
+    p = d / seg["file"]
+    # 圧縮の途中で読まれた場合に備え、もう一方の形も見る
+    alt = p.with_name(p.name[:-3]) if p.name.endswith(".gz") else p.with_name(p.name + ".gz")
+    for q in (p, alt):
+        try:
+            return gzip.open(q, "rb") if q.name.endswith(".gz") else q.open("rb")
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(str(p))
+
+def _iter_bytes(path: Path, start: int = 0) -> Iterator[bytes]:
+    """論理オフセット start 以降のバイト列を、古いセグメントから順に少しずつ返す（ロック中に呼ぶ）"""
+    m = manifest(path)
+    d = segment_dir(path)
+    for seg in m["segments"]:
+        if seg["start"] + seg["bytes"] <= start:
+            continue  # まるごと読み飛ばす（展開しない）
+        with _open_segment(d, seg) as f:
+            skip = max(0, start - seg["start"])
+            if skip:
+                f.seek(skip)
+            while True:
+                buf = f.read(_READ_CHUNK)
+                if not buf:
+                    break
+                yield buf
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return
+    with f:
+        skip = max(0, start - m["base"])
+        if skip:
+            f.seek(skip)
+        while True:
+            buf = f.read(_READ_CHUNK)
+            if not buf:
+                break
+            yield buf
+
+def iter_text(path: Path, start: int = 0) -> Iterator[str]:
+    """論理オフセット start 以降の会話を、テキストの塊で順に返す（全体をメモリに載せない）"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with _locked(path, exclusive=False):
+        for buf in _iter_bytes(path, start):
+            s = decoder.decode(buf)
+            if s:
+                yield s
+    s = decoder.decode(b"", final=True)
+    if s:
+        yield s
+
+def read_all(path: Path, start: int = 0) -> str:
+    return "".join(iter_text(path, start))
+
+def end_offset(path: Path) -> int:
+    """ログ全体の末尾の論理オフセット"""
+    with _locked(path, exclusive=False):
+        m = manifest(path)
+        try:
+            return m["base"] + path.stat().st_size
+        except FileNotFoundError:
+            return m["base"]
+
+def read_range(path: Path, lo: int, hi: int) -> str:
+    """論理オフセット [lo, hi) のテキスト"""
+    out: list[bytes] = []
+    need = max(0, hi - lo)
+    with _locked(path, exclusive=False):
+        for buf in _iter_bytes(path, lo):
+            if need <= 0:
+                break
+            out.append(buf[:need])
+            need -= len(out[-1])
+    return b"".join(out).decode("utf-8", errors="replace")
+
+def read_tail(path: Path, max_chars: int) -> tuple[str, int]:
+    """
+    ログ末尾から max_chars 文字以内に収まる行をまとめて返す。
+    戻り値: (テキスト, テキスト先頭の論理オフセット)
+    行の途中では切らない（先頭の欠けた行は捨てる）。アクティブで足りなければ直前のセグメントから補う。
+    """
+    # UTF-8 は 1 文字最大 4 バイトなので、末尾 max_chars*4 バイトを読めば必ず足りる
+    want = max_chars * 4
+    with _locked(path, exclusive=False):
+        m = manifest(path)
+        try:
+            with path.open("rb") as f:
+                end = f.seek(0, os.SEEK_END)
+                pos = max(0, end - want)
+                f.seek(pos)
+                buf = f.read(end - pos)
+        except FileNotFoundError:
+            pos, buf = 0, b""
+        start = m["base"] + pos
+        d = segment_dir(path)
+        for seg in reversed(m["segments"]):
+            if pos > 0 or len(buf) >= want:
+                break
+            # 直前のセグメントは圧縮済みなので展開して末尾だけ使う（大きさはセグメント上限まで）
+            with _open_segment(d, seg) as f:
+                data = f.read()
+            take = data[-(want - len(buf)):]
+            buf = take + buf
+            start -= len(take)
+            pos = len(data) - len(take)
+
+    if pos > 0:
+        # 途中から始まる最初の行は捨てる（セグメントの境目はレコードの境目なので捨てなくてよい）（\n は多バイト文字の途中に現れない）
+        nl = buf.find(b"\n")
+        if nl < 0:
+            return "", start + len(buf)
+        buf = buf[nl + 1:]
+        start += nl + 1
+
+    lines = buf.decode("utf-8", errors="replace").splitlines(keepends=True)
+    kept: list[str] = []
+    total = 0
+    for line in reversed(lines):
+        if total + len(line) > max_chars and kept:
+            break
+        kept.append(line)
+        total += len(line)
+    dropped = lines[: len(lines) - len(kept)]
+    start += sum(len(l.encode("utf-8")) for l in dropped)
+    return "".join(reversed(kept)), start
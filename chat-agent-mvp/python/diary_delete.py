@@ -4,12 +4,22 @@ import argparse
 import sys
 import re
 
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+from storage import get_storage
 
 def valid_date(d: str) -> bool:
     return bool(re.fullmatch(r"\d{4}-\d{2}-\d{2}", d))
 
+def delete_diary(date: str) -> str:
+    """指定日の日記を削除し、対象（ファイルパス or DB 上の位置）を返す。日付不正は ValueError、削除失敗は OSError"""
+    if not valid_date(date):
+        raise ValueError("invalid date")
+
+    import diary_search
+
+    loc = get_storage().delete_diary(date)
+    diary_search.remove_diary(date)
+    return loc
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--date", required=True)
@@ -19,15 +29,12 @@ def main():
         print("invalid date", file=sys.stderr)
         exit(1)
 
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
-    p = LOG_DIR / f"{args.date}.txt"
-    if p.exists():
-        try:
-          p.unlink()
-        except Exception as e:
-          print(f"delete failed: {e}", file=sys.stderr)
-          exit(1)
-    print(str(p.resolve()), end="")
+    try:
+        p = delete_diary(args.date)
+    except Exception as e:
+        print(f"delete failed: {e}", file=sys.stderr)
+        exit(1)
+    print(p, end="")
 
 if __name__ == "__main__":
     main()
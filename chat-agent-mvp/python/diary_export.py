@@ -0,0 +1,82 @@
+# python/diary_export.py
+# 役割：日記アーカイブの一括書き出し（バックアップ・移行用）
+# - ストレージの日記を日付順に 1 件ずつ読み、そのまま stdout へ流す（全件をメモリに載せないので、何年分でもメモリは一定）
+# - 形式は 2 つ
+#     jsonl … 1 行 1 件 {"date": "YYYY-MM-DD", "content": "..."}
+#     tar   … YYYY-MM-DD.txt を並べたストリーミング tar（展開すれば logs/ と同じ形になる）
+# - 取り込みは diary_import.py（どちらの形式も読める）
+#
+# CLI:
+#   python diary_export.py [--format jsonl|tar] [--from YYYY-MM-DD] [--to YYYY-MM-DD] > backup.jsonl
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+import time
+from typing import BinaryIO, Iterable
+
+from diary_save import valid_date
+from storage import get_storage
+
+FORMATS = ("jsonl", "tar")
+
+def iter_jsonl(diaries: Iterable[tuple[str, str]]) -> Iterable[bytes]:
+    for date, content in diaries:
+        yield (json.dumps({"date": date, "content": content}, ensure_ascii=False) + "\n").encode("utf-8")
+
+def write_tar(diaries: Iterable[tuple[str, str]], out: BinaryIO) -> int:
+    """ストリーミングモード（w|）で書くので、出力がパイプでもシークしない"""
+    import tarfile  # tar のときだけ
+
+    n = 0
+    now = int(time.time())
+    with tarfile.open(fileobj=out, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+        for date, content in diaries:
+            data = content.encode("utf-8")
+            info = tarfile.TarInfo(f"{date}.txt")
+            info.size = len(data)
+            info.mtime = now
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+            n += 1
+    return n
+
+def export(out: BinaryIO, fmt: str = "jsonl", date_from: str = "", date_to: str = "") -> int:
+    """日記を out へ書き出し、件数を返す"""
+    diaries = get_storage().iter_diaries(date_from, date_to)
+    if fmt == "tar":
+        return write_tar(diaries, out)
+    n = 0
+    for line in iter_jsonl(diaries):
+        out.write(line)
+        n += 1
+    return n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--from", dest="date_from", default="")
+    parser.add_argument("--to", dest="date_to", default="")
+    args = parser.parse_args()
+
+    for d in (args.date_from, args.date_to):
+        if d and not valid_date(d):
+            print("invalid date", file=sys.stderr)
+            sys.exit(1)
+
+    t0 = time.perf_counter()
+    out = sys.stdout.buffer
+    try:
+        n = export(out, args.format, args.date_from, args.date_to)
+        out.flush()
+    except BrokenPipeError:
+        # 受け手が途中で閉じた（ダウンロード中止など）
+        sys.exit(1)
+    dt = time.perf_counter() - t0
+    print(f"[diary_export] {n} diaries in {dt:.2f}s ({n / dt if dt else 0:.0f}/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
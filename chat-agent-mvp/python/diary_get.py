@@ -4,29 +4,28 @@ import argparse
 import json
 import re
 
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+from storage import get_storage
 
 def valid_date(d: str) -> bool:
     return bool(re.fullmatch(r"\d{4}-\d{2}-\d{2}", d))
 
+def get_diary(date: str) -> str:
+    """指定日の日記本文を返す（無ければ空文字）。日付不正は ValueError"""
+    if not valid_date(date):
+        raise ValueError("invalid date")
+
+    return get_storage().get_diary(date)
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--date", required=True)
     args = parser.parse_args()
 
-    if not valid_date(args.date):
-        print(json.dumps({"error": "invalid date"}), end="")
+    try:
+        content = get_diary(args.date)
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), end="")
         exit(1)
-
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
-    p = LOG_DIR / f"{args.date}.txt"
-    content = ""
-    if p.exists():
-        try:
-            content = p.read_text(encoding="utf-8")
-        except Exception:
-            content = ""
     print(json.dumps({"content": content}, ensure_ascii=False), end="")
 
 if __name__ == "__main__":
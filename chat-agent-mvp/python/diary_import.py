@@ -0,0 +1,144 @@
+# python/diary_import.py
+# 役割：日記アーカイブの一括取り込み（diary_export.py の出力を読み戻す）
+# - stdin を少しずつ読み、jsonl（1 行 1 件 {"date","content"}）または tar（YYYY-MM-DD.txt の並び）を解釈する
+#   形式は --format で指定、省略時は先頭 1 バイトで判定する（{ や空白なら jsonl、それ以外は tar）
+# - 日付は形式と暦の両方を検査し、不正なもの・読めない行は invalid として数えて読み飛ばす
+# - --batch 件ずつまとめて保存する（ファイル形式は月インデックスの更新が月ごとに 1 回、SQLite は 1 トランザクション）
+#   検索インデックスもバッチごとに 1 トランザクションで差し替える
+# - 同じ日付が既にあれば上書き（--skip-existing で既存を残す）
+# - 結果は JSON で stdout: {"imported","skipped","invalid","errors","elapsed","per_sec"}
+#
+# CLI:
+#   python diary_import.py [--format jsonl|tar] [--batch 200] [--skip-existing] < backup.jsonl
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+import time
+from datetime import date
+from typing import BinaryIO, Iterator
+
+from diary_export import FORMATS
+from diary_save import valid_date
+from storage import get_storage
+
+DEFAULT_BATCH = 200
+
+def check_date(d: str) -> bool:
+    if not valid_date(d):
+        return False
+    try:
+        date.fromisoformat(d)
+    except ValueError:
+        return False
+    return True
+
+def detect_format(stream: BinaryIO) -> str:
+    """先頭を覗いて形式を決める（読み進めない）"""
+    head = stream.peek(1)[:1] if hasattr(stream, "peek") else b""
+    return "jsonl" if not head or head in b"{ \t\r\n" else "tar"
+
+def read_jsonl(stream: BinaryIO) -> Iterator[tuple[str | None, str]]:
+    """(date, content) を 1 件ずつ返す。不正なものは (None, 理由)"""
+    for lineno, raw in enumerate(stream, 1):
+        if not raw.strip():
+            continue
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            yield None, f"line {lineno}: bad json"
+            continue
+        if not isinstance(obj, dict):
+            yield None, f"line {lineno}: not an object"
+            continue
+        d, content = obj.get("date"), obj.get("content")
+        if not isinstance(d, str) or not check_date(d) or not isinstance(content, str):
+            yield None, f"line {lineno}: invalid date or content"
+            continue
+        yield d, content
+
+def read_tar(stream: BinaryIO) -> Iterator[tuple[str | None, str]]:
+    """ストリーミングモード（r|）で読むので、入力がパイプでもよい。YYYY-MM-DD.txt 以外のファイルは無視する"""
+    import tarfile  # tar のときだけ
+
+    with tarfile.open(fileobj=stream, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = member.name.rsplit("/", 1)[-1]
+            if not name.endswith(".txt"):
+                continue
+            d = name[:-4]
+            if not check_date(d):
+                yield None, f"{member.name}: invalid date"
+                continue
+            f = tar.extractfile(member)
+            try:
+                content = f.read().decode("utf-8") if f else ""
+            except UnicodeDecodeError:
+                yield None, f"{member.name}: not utf-8"
+                continue
+            yield d, content
+
+def import_diaries(stream: BinaryIO, fmt: str = "", batch_size: int = DEFAULT_BATCH, skip_existing: bool = False) -> dict:
+    import diary_search
+
+    fmt = fmt or detect_format(stream)
+    items = read_tar(stream) if fmt == "tar" else read_jsonl(stream)
+    st = get_storage()
+    counts = {"imported": 0, "skipped": 0, "invalid": 0, "errors": 0}
+    batch: list[tuple[str, str]] = []
+
+    def flush() -> None:
+        if not batch:
+            return
+        try:
+            st.save_diaries(batch)
+            diary_search.update_diaries(batch)
+            counts["imported"] += len(batch)
+        except Exception as e:
+            print(f"[diary_import] save error ({batch[0][0]}..{batch[-1][0]}): {e}", file=sys.stderr)
+            counts["errors"] += len(batch)
+        batch.clear()
+
+    t0 = time.perf_counter()
+    for d, content in items:
+        if d is None:
+            print(f"[diary_import] skip {content}", file=sys.stderr)
+            counts["invalid"] += 1
+            continue
+        if skip_existing and st.get_diary(d):
+            counts["skipped"] += 1
+            continue
+        batch.append((d, content))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    dt = time.perf_counter() - t0
+    return {
+        **counts,
+        "format": fmt,
+        "elapsed": round(dt, 3),
+        "per_sec": round(counts["imported"] / dt, 1) if dt else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=FORMATS, default="", help="省略時は先頭から判定")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="まとめて保存する件数")
+    parser.add_argument("--skip-existing", action="store_true", help="既にある日付は上書きしない")
+    args = parser.parse_args()
+
+    stream = sys.stdin.buffer
+    if not hasattr(stream, "peek"):
+        stream = io.BufferedReader(stream)
+    summary = import_diaries(stream, args.format, max(1, args.batch), args.skip_existing)
+    print(json.dumps(summary, ensure_ascii=False))
+    if summary["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,18 @@
 from __future__ import annotations
 from pathlib import Path
-from datetime import datetime
+from datetime import date as _date, datetime, timedelta
 import argparse
 import json
-import re
+import sys
+from typing import Iterator
 
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+from month_index import preview_20  # noqa: F401  (preview_20 は従来の import 先として残す)
+from storage import get_storage
 
-def preview_20(text: str) -> str:
-    # 改行・連続空白を整理して先頭20文字
-    s = re.sub(r"\s+", " ", text.strip())
-    return s[:20]
-
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--year", required=True)
-    parser.add_argument("--month", required=True)
-    args = parser.parse_args()
-
-    try:
-        y = int(args.year)
-        m = int(args.month)
-        assert 1 <= m <= 12
-    except Exception:
-        print(json.dumps({"error": "invalid year/month"}), end="")
-        exit(1)
-
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+def list_month(y: int, m: int) -> dict:
+    """指定月の日ごとの記録有無とプレビューを返す。月が不正なら ValueError"""
+    if not 1 <= m <= 12:
+        raise ValueError("invalid year/month")
 
     # 月末日数
     if m == 12:
@@ -37,32 +22,103 @@ def main():
     first_day = datetime(y, m, 1)
     days = (next_month - first_day).days
 
+    # 記録のある日だけ受け取る（ファイルなら月インデックス、SQLite なら範囲クエリ）
+    logged = get_storage().month_days(y, m)
+
     cells = []
     for d in range(1, days + 1):
         date = f"{y:04d}-{m:02d}-{d:02d}"
-        p = LOG_DIR / f"{date}.txt"
-        if p.exists():
-            try:
-                content = p.read_text(encoding="utf-8")
-            except Exception:
-                content = ""
-            cells.append({
-                "date": date,
-                "hasLog": True,
-                "preview": preview_20(content)
-            })
-        else:
-            cells.append({
-                "date": date,
-                "hasLog": False,
-                "preview": ""
-            })
+        e = logged.get(date)
+        cells.append({
+            "date": date,
+            "hasLog": e is not None,
+            "preview": e["preview"] if e else ""
+        })
 
-    data = {
+    return {
         "year": y,
         "month": m,
         "days": cells
     }
+
+# 期間指定の上限（約 10 年）
+MAX_RANGE_DAYS = 3660
+
+def parse_range(date_from: str, date_to: str) -> tuple[_date, _date]:
+    """期間を検査して date に直す。不正・逆順・長すぎる期間は ValueError"""
+    try:
+        lo, hi = _date.fromisoformat(date_from), _date.fromisoformat(date_to)
+    except (TypeError, ValueError):
+        raise ValueError("invalid from/to")
+    if hi < lo or (hi - lo).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError("invalid from/to")
+    return lo, hi
+
+def iter_range(date_from: str, date_to: str) -> Iterator[dict]:
+    """
+    期間内の日ごとのセルを 1 件ずつ返し、最後に集計を返す（NDJSON の 1 行ずつに対応）
+      {"type": "day", "date", "hasLog", "preview", "chars"}
+      {"type": "summary", "from", "to", "days", "daysLogged", "longestStreak", "totalChars"}
+    記録の有無はストレージから期間ごと一度に受け取り、集計もセルを作る同じループで数える
+    """
+    lo, hi = parse_range(date_from, date_to)
+    logged = get_storage().range_days(lo.isoformat(), hi.isoformat())
+
+    days = (hi - lo).days + 1
+    logged_days = total_chars = streak = longest = 0
+    for i in range(days):
+        date = (lo + timedelta(days=i)).isoformat()
+        e = logged.get(date)
+        if e is not None:
+            logged_days += 1
+            total_chars += e["chars"]
+            streak += 1
+            longest = max(longest, streak)
+        else:
+            streak = 0
+        yield {
+            "type": "day",
+            "date": date,
+            "hasLog": e is not None,
+            "preview": e["preview"] if e else "",
+            "chars": e["chars"] if e else 0,
+        }
+    yield {
+        "type": "summary",
+        "from": lo.isoformat(),
+        "to": hi.isoformat(),
+        "days": days,
+        "daysLogged": logged_days,
+        "longestStreak": longest,
+        "totalChars": total_chars,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year")
+    parser.add_argument("--month")
+    parser.add_argument("--from", dest="date_from", help="期間指定（--to と一緒に）。日ごとのセルと集計を NDJSON で返す")
+    parser.add_argument("--to", dest="date_to")
+    args = parser.parse_args()
+
+    if args.date_from or args.date_to:
+        try:
+            rows = iter_range(args.date_from or "", args.date_to or "")
+            for row in rows:
+                sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except ValueError:
+            print(json.dumps({"error": "invalid from/to"}), end="")
+            exit(1)
+        return
+    if args.year is None or args.month is None:
+        parser.error("--year and --month (or --from and --to) are required")
+
+    try:
+        data = list_month(int(args.year), int(args.month))
+    except Exception:
+        print(json.dumps({"error": "invalid year/month"}), end="")
+        exit(1)
+
     print(json.dumps(data, ensure_ascii=False), end="")
 
 if __name__ == "__main__":
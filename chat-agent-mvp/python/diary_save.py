@@ -5,12 +5,22 @@ import sys
 import json
 import re
 
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+from storage import get_storage
 
 def valid_date(d: str) -> bool:
     return bool(re.fullmatch(r"\d{4}-\d{2}-\d{2}", d))
 
+def save_diary(date: str, content: str) -> str:
+    """指定日の日記を上書き保存し、保存先（ファイルパス or DB 上の位置）を返す。日付不正は ValueError"""
+    if not valid_date(date):
+        raise ValueError("invalid date")
+
+    import diary_search
+
+    loc = get_storage().save_diary(date, content)
+    diary_search.update_diary(date, content)
+    return loc
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--date", required=True)
@@ -20,11 +30,8 @@ def main():
         print("invalid date", file=sys.stderr)
         exit(1)
 
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
     content = sys.stdin.read()
-    p = LOG_DIR / f"{args.date}.txt"
-    p.write_text(content, encoding="utf-8")
-    print(str(p.resolve()), end="")
+    print(save_diary(args.date, content), end="")
 
 if __name__ == "__main__":
     main()
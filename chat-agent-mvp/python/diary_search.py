@@ -0,0 +1,274 @@
+# python/diary_search.py
+# 役割：過去の日記の全文検索
+# - 形態素解析を使わず、文字 bigram（2 文字ずつ）の転置インデックスで日本語を検索する
+# - インデックスは SQLite の logs/.index/search.db（SEARCH_INDEX で変更可）に bigram ごとの postings として持つ
+#   保存・削除のたびに該当日の行だけを差し替える（update_diary / remove_diary、一括取り込みは update_diaries）
+#   検索はクエリの bigram の行だけを読む。常駐ワーカーと CLI（diary_import 等）が同時に書いても、
+#   書き込みは SQLite のロックで 1 つずつ反映されるので失われない
+# - クエリの bigram をすべて含む日記を BM25 で順位付けし、上位だけ本文を読んでスニペットを作る
+# - 日記の末尾には終端文字を付けて bigram を作る（最後の 1 文字も「その文字で始まる bigram」になる）
+#   1 文字のクエリは、その文字で始まる bigram の範囲を主キーで引くだけで済む（全件を見ない）
+#
+# CLI:
+#   python diary_search.py --q "公園" [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--limit 20]
+#   python diary_search.py --rebuild   ストレージの日記からインデックスを作り直す
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+
+from storage import LOG_DIR, get_storage
+
+DEFAULT_INDEX = LOG_DIR / ".index" / "search.db"
+INDEX_VERSION = 3
+_END = "\x00"          # 日記の末尾に付ける終端文字
+_MAX_CHAR = "\U0010ffff"
+
+# BM25 のパラメータ
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CHARS = 30
+
+# 常駐ワーカーでは保存（update_diary）が検索と並行して走るので、インデックスに触る間は常に取る
+_lock = threading.RLock()
+_cache: dict = {"path": None, "conn": None}
+
+def index_path() -> Path:
+    return Path(os.getenv("SEARCH_INDEX") or DEFAULT_INDEX)
+
+# ---- 文字列処理 ----
+def normalize(text: str) -> str:
+    """全角/半角・大文字/小文字をそろえ、空白を取り除く"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text).lower())
+
+def bigrams(text: str) -> dict[str, int]:
+    """正規化済みテキストの bigram と出現回数（1 文字だけならその 1 文字）"""
+    if len(text) == 1:
+        return {text: 1}
+    counts: dict[str, int] = {}
+    for i in range(len(text) - 1):
+        g = text[i:i + 2]
+        counts[g] = counts.get(g, 0) + 1
+    return counts
+
+# ---- インデックスの読み書き（SQLite） ----
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS docs (date TEXT PRIMARY KEY, len INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    date TEXT NOT NULL,
+    tf   INTEGER NOT NULL,
+    PRIMARY KEY (gram, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_date ON postings (date);
+"""
+
+def _conn():
+    """インデックス DB への接続（パスごとに 1 本を共有。_lock の下で使う）"""
+    p = index_path()
+    if _cache["path"] != p:
+        import sqlite3  # 検索・保存で初めて使うときに読み込む
+
+        if _cache["conn"] is not None:
+            _cache["conn"].close()
+        p.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(p), check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _cache.update(path=p, conn=conn)
+    return _cache["conn"]
+
+@contextlib.contextmanager
+def _write():
+    """書き込みトランザクション（BEGIN IMMEDIATE なので、別プロセスの更新とは 1 つずつ順に反映される）"""
+    with _lock:
+        conn = _conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+def _built(conn) -> bool:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    return row is not None and row[0] == str(INDEX_VERSION)
+
+def _remove_doc(conn, date: str) -> None:
+    conn.execute("DELETE FROM postings WHERE date = ?", (date,))
+    conn.execute("DELETE FROM docs WHERE date = ?", (date,))
+
+def _add_doc(conn, date: str, content: str) -> None:
+    text = normalize(content)
+    if not text:
+        return
+    counts = bigrams(text + _END)
+    conn.execute("INSERT INTO docs (date, len) VALUES (?, ?)", (date, len(text)))
+    conn.executemany("INSERT INTO postings (gram, date, tf) VALUES (?, ?, ?)", [(g, date, tf) for g, tf in counts.items()])
+
+def rebuild() -> int:
+    """ストレージ上の全日記からインデックスを作り直し、件数を返す"""
+    n = 0
+    with _write() as conn:
+        conn.execute("DELETE FROM postings")
+        conn.execute("DELETE FROM docs")
+        for date, content in get_storage().iter_diaries():
+            _add_doc(conn, date, content)
+            n += 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(INDEX_VERSION),))
+    return n
+
+def _ensure_built() -> None:
+    with _lock:
+        if _built(_conn()):
+            return
+    rebuild()
+
+# ---- 差分更新 ----
+def update_diaries(items: list[tuple[str, str]]) -> None:
+    """
+    保存直後に呼ぶ。items の日付の分だけを 1 トランザクションで差し替える（失敗しても保存自体は成功扱い）。
+    まだインデックスが無ければ、保存済みの内容も含めて作る
+    """
+    if not items:
+        return
+    try:
+        with _write() as conn:
+            built = _built(conn)
+            if built:
+                for date, content in items:
+                    _remove_doc(conn, date)
+                    _add_doc(conn, date, content)
+        if not built:
+            rebuild()
+    except Exception as e:
+        print(f"[diary_search] update error: {e}", file=sys.stderr)
+
+def update_diary(date: str, content: str) -> None:
+    update_diaries([(date, content)])
+
+def remove_diary(date: str) -> None:
+    """削除直後に呼ぶ"""
+    try:
+        with _write() as conn:
+            _remove_doc(conn, date)
+    except Exception as e:
+        print(f"[diary_search] remove error: {e}", file=sys.stderr)
+
+# ---- 検索 ----
+def snippet(content: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """最初に一致した箇所の前後 width 文字を切り出す（見つからなければ先頭）"""
+    flat = re.sub(r"\s+", " ", content.strip())
+    hay = flat.lower()
+    folded = unicodedata.normalize("NFKC", hay)
+    if len(folded) == len(hay):
+        # 正規化で長さが変わらなければ、位置はそのまま元の文字列に使える
+        hay = folded
+    q = re.sub(r"\s+", "", unicodedata.normalize("NFKC", query).lower())
+    pos = hay.find(q) if q else -1
+    if pos < 0 and len(q) >= 2:
+        pos = hay.find(q[:2])
+    if pos < 0:
+        return flat[: width * 2] + ("…" if len(flat) > width * 2 else "")
+    lo = max(0, pos - width)
+    hi = min(len(flat), pos + len(q) + width)
+    return ("…" if lo > 0 else "") + flat[lo:hi] + ("…" if hi < len(flat) else "")
+
+def search(query: str, date_from: str = "", date_to: str = "", limit: int = 20) -> dict:
+    """
+    query を含む日記を関連度順に返す。
+    戻り値: {"query", "total", "results": [{"date", "score", "snippet"}, ...]}
+    """
+    q = normalize(query)
+    if not q:
+        return {"query": query, "total": 0, "results": []}
+
+    _ensure_built()
+    with _lock:
+        ranked = _rank(q, date_from, date_to)
+    store = get_storage()
+    results = []
+    for d, score in ranked[: max(0, limit)]:
+        results.append({"date": d, "score": round(score, 4), "snippet": snippet(store.get_diary(d), query)})
+    return {"query": query, "total": len(ranked), "results": results}
+
+def _rank(q: str, date_from: str, date_to: str) -> list[tuple[str, float]]:
+    """正規化済みクエリ q に一致する (date, score) を関連度順に返す（_lock の下で呼ぶ）"""
+    conn = _conn()
+    grams = bigrams(q)
+
+    if len(q) == 1:
+        # 1 文字のときは、その文字で始まる bigram をまとめて見る（どの位置の文字も 1 回ずつ数える）
+        rows = conn.execute(
+            "SELECT date, SUM(tf) FROM postings WHERE gram >= ? AND gram <= ? GROUP BY date", (q, q + _MAX_CHAR)
+        )
+        lists = [dict(rows.fetchall())]
+    else:
+        lists = [dict(conn.execute("SELECT date, tf FROM postings WHERE gram = ?", (g,)).fetchall()) for g in grams]
+    if not all(lists):
+        return []
+
+    # 出現件数の少ない bigram から絞り込む
+    lists.sort(key=len)
+    candidates = set(lists[0])
+    for plist in lists[1:]:
+        candidates &= plist.keys()
+        if not candidates:
+            break
+    if date_from:
+        candidates = {d for d in candidates if d >= date_from}
+    if date_to:
+        candidates = {d for d in candidates if d <= date_to}
+    if not candidates:
+        return []
+
+    n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(len), 0) FROM docs").fetchone()
+    n = max(1, n)
+    avg_len = total / n or 1.0
+    lens: dict[str, int] = {}
+    cand = sorted(candidates)
+    for i in range(0, len(cand), 500):
+        part = cand[i:i + 500]
+        lens.update(conn.execute(
+            f"SELECT date, len FROM docs WHERE date IN ({','.join('?' * len(part))})", part
+        ).fetchall())
+    scores: dict[str, float] = {}
+    for plist in lists:
+        df = len(plist)
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for d in candidates:
+            tf = plist.get(d, 0)
+            norm = K1 * (1 - B + B * lens.get(d, avg_len) / avg_len)
+            scores[d] = scores.get(d, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+    return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--q", default="")
+    parser.add_argument("--from", dest="date_from", default="")
+    parser.add_argument("--to", dest="date_to", default="")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(json.dumps({"ok": True, "docs": rebuild()}, ensure_ascii=False))
+        return
+    print(json.dumps(search(args.q, args.date_from, args.date_to, args.limit), ensure_ascii=False), end="")
+
+if __name__ == "__main__":
+    main()
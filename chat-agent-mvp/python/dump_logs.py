@@ -1,36 +1,46 @@
 # python/dump_logs.py
+# 役割：会話ログと同日の日記から、その日の日記を Gemini で生成する
+# - --date … 1 日分を生成して stdout へ（保存はしない）
+#   前回どこまでの会話を読んだか（カーソル）と項目ごとの要点をストレージに残し、
+#   次からは増えた会話だけを送って更新する（--full で全体から作り直し）
+# - --from / --to … 期間の日記をまとめて生成し、ストレージへ保存する（バックフィル・作り直し用）
+#   モデル呼び出しは asyncio で最大 --concurrency 本を同時に投げ、--rate（回/秒）のトークンバケットで抑える
+#   進捗と処理量は stderr、集計は JSON で stdout
+# - テンプレートなど毎回同じ指示は system instruction として分け、prompt_cache でコンテキストキャッシュに載せて使い回す
+# - モデル呼び出しは agent と同じく llm_policy の期限・ヘッジ・サーキットブレーカー付き
+#   （ブレーカーが開いている間は呼び出さずに失敗の文言を返す。期間生成ではその日を error にする）
+# - 段階ごとの時間（入力の読み込み・プロンプト組み立て・モデル呼び出し・パース・状態の保存）を metrics で測る
 from __future__ import annotations
 import json
-import re
-from google import genai
-from pathlib import Path
+import os
 import argparse
 import sys
-from dotenv import load_dotenv
-import os
+import time
+from datetime import date, timedelta
 
-# パス設定
-PY_DIR = Path(__file__).resolve().parent
-ROOT_DIR = PY_DIR.parent
-CONV_PATH = PY_DIR / "logs" / "conversation.txt"  # ← ここは変更しない（指定どおり）
-LOG_DIR = PY_DIR / "logs"                            # 過去日記は python/logs/ を使用
+import bootstrap
+from bootstrap import CONV_PATH, LOG_DIR, PY_DIR, ROOT_DIR  # noqa: F401  (従来の import 先として残す)
+from diary_save import valid_date
+from storage import check_session, get_storage
 
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# モデル呼び出しまわり（llm_policy / prompt_cache / metrics / json_extract）は使うときに読み込む
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--date", required=True, help="YYYY-MM-DD")
-    args = ap.parse_args()
-    date_str = args.date
+MODEL = "gemini-2.5-flash"
 
-    # 入力読み込み（無ければ空文字）
-    conv = CONV_PATH.read_text(encoding="utf-8") if CONV_PATH.exists() else ""
-    past_path = LOG_DIR / f"{date_str}.txt"
-    past = past_path.read_text(encoding="utf-8") if past_path.exists() else ""
+# 常駐ワーカーでは Client を使い回す（google-genai は API キーがあるときだけ読み込む）
+_client = None
 
-    # プロンプト（stderr へ出しておくとデバッグしやすい）
-    prompt = f"""
+def get_client():
+    global _client
+    if _client is None:
+        genai = bootstrap.genai()
+        if genai is None:
+            raise RuntimeError("google-genai is not installed")
+        _client = genai.Client(api_key=bootstrap.gemini_api_key())
+    return _client
+
+# 毎回同じ指示（system instruction。prompt_cache でキャッシュする）。入力は build_diary_prompt が作る
+DIARY_INSTRUCTIONS = """
 あなたの役割は、ユーザーとの会話ログとその日の他の日記内容をもとに、
 1日を振り返る日記をテンプレート形式で作成することです。
 
@@ -63,15 +73,34 @@ def main():
 
 以下のJSON形式で出力してください：
 
-{{
+{
   "summary": "日記全体を20文字以内で要約した一文",
-  "body": "上記テンプレートに沿った日記本文（自然な日本語で）"
-}}
+  "body": "上記テンプレートに沿った日記本文（自然な日本語で）",
+  "sections": {"出来事": "…", "気持ち": "…", "気づき": "…", "感謝": "…", "明日": "…"}
+}
+
+sections には各項目の要点を短く（1〜2文で）入れてください。
 
 ---
 
 # 入力
 
+ユーザーのメッセージとして「会話ログ」「同日の日記（他の記録やメモなど）」「日付」を渡します。
+
+---
+
+# 指示
+
+1. 会話ログから、その日の出来事・感情・考えを抽出してください。
+2. 同日の日記があれば、そこからも補足情報を反映してください。
+3. 出来事・感情・気づき・感謝・明日の意気込みがすべて含まれるように文章を構成してください。
+4. 文章は日記として自然に読めるトーン（やわらかく、丁寧）にしてください。
+5. 出力は**必ずJSON形式のみ**で行ってください。説明文や余計なテキストは不要です。
+""".strip()
+
+def build_diary_prompt(conv: str, past: str, date_str: str) -> str:
+    """毎回変わる入力の部分（指示は DIARY_INSTRUCTIONS）"""
+    return f"""
 ## 会話ログ
 {conv}
 
@@ -80,60 +109,422 @@ def main():
 
 ## 日付
 {date_str}
+""".strip()
 
----
+SECTION_KEYS = ["出来事", "気持ち", "気づき", "感謝", "明日"]
+
+DIARY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "body": {"type": "STRING"},
+        "sections": {
+            "type": "OBJECT",
+            "properties": {k: {"type": "STRING"} for k in SECTION_KEYS},
+        },
+    },
+    "required": ["summary", "body"],
+}
+
+INCREMENTAL_INSTRUCTIONS = """
+あなたの役割は、作成済みの日記を、その後に増えた会話の内容で更新することです。
+前回までの内容は「これまでの日記」にまとまっています。会話ログの全体は渡しません。
+
+# 出力フォーマット
+
+以下のJSON形式で出力してください：
+
+{
+  "summary": "日記全体を20文字以内で要約した一文",
+  "body": "📅 日付・🌞 今日の出来事・💭 今日の気持ち・💡 気づき・学び・💖 感謝したこと・よかったこと・🎯 明日への一言 のテンプレートに沿った日記本文",
+  "sections": {"出来事": "…", "気持ち": "…", "気づき": "…", "感謝": "…", "明日": "…"}
+}
+
+# 入力
+
+ユーザーのメッセージとして「これまでの日記」「新しく増えた会話ログ」「日付」を渡します。
 
 # 指示
 
-1. 会話ログから、その日の出来事・感情・考えを抽出してください。
-2. 同日の日記があれば、そこからも補足情報を反映してください。
-3. 出来事・感情・気づき・感謝・明日の意気込みがすべて含まれるように文章を構成してください。
-4. 文章は日記として自然に読めるトーン（やわらかく、丁寧）にしてください。
-5. 出力は**必ずJSON形式のみ**で行ってください。説明文や余計なテキストは不要です。
+1. これまでの日記の内容は残し、新しい会話から分かった出来事・気持ち・気づき・感謝・明日のことを書き足してください。
+2. 新しい会話と食い違う部分は、新しい会話を優先してください。
+3. sections には各項目の要点を短く（1〜2文で）入れてください。
+4. 出力は**必ずJSON形式のみ**で行ってください。説明文や余計なテキストは不要です。
 """.strip()
 
+def build_incremental_prompt(prior: str, delta: str, date_str: str) -> str:
+    """前回の生成結果（項目ごとの要点、またはユーザーが直した日記）と、その後に増えた会話だけを渡す（指示は INCREMENTAL_INSTRUCTIONS）"""
+    return f"""
+## これまでの日記
+{prior}
+
+## 新しく増えた会話ログ
+{delta}
+
+## 日付
+{date_str}
+""".strip()
+
+def cache_text(system: str, prompt: str) -> str:
+    """llm_cache のキーにする全文（指示＋入力）"""
+    return f"{system}\n\n{prompt}"
+
+def _diary_json(resp_text: str) -> dict | None:
+    from json_extract import find_object
+
+    # 万一説明や前置きが混ざっていても、body を含む最初の {} を取り出す
+    return find_object(resp_text, "body")
+
+def parse_diary(resp_text: str) -> str:
+    """モデル出力から「要約\n\n本文」を取り出す（JSON でなければ生テキスト）"""
+    data = _diary_json(resp_text)
+    if data is not None:
+        return f"{data.get('summary','')}\n\n{data.get('body','')}".strip()
+    # 最後の砦：モデルの生テキストをそのまま返す
+    return resp_text.strip()
+
+def parse_sections(resp_text: str) -> dict:
+    """モデル出力の sections（出来事/気持ち/気づき/感謝/明日）。無ければ空"""
+    sections = (_diary_json(resp_text) or {}).get("sections")
+    if not isinstance(sections, dict):
+        return {}
+    return {k: str(sections[k]).strip() for k in SECTION_KEYS if str(sections.get(k) or "").strip()}
+
+def check_date(d: str) -> str:
+    """YYYY-MM-DD として実在する日付なら返す。不正は ValueError"""
+    if not valid_date(d or ""):
+        raise ValueError(f"invalid date: {d!r}")
+    try:
+        date.fromisoformat(d)
+    except ValueError:
+        raise ValueError(f"invalid date: {d!r}") from None
+    return d
+
+def _state_key(date_str: str, session: str) -> str:
+    return f"diary-{date_str}" + (f".{session}" if session else "")
+
+def _prior_text(state: dict, past: str) -> str:
+    """差分生成に渡す「これまでの日記」。ユーザーが直した日記があればそれを、無ければ項目ごとの要点を使う"""
+    if past.strip() and past.strip() != state.get("diary", "").strip():
+        return past
+    sections = state.get("sections") or {}
+    if sections:
+        return "\n".join(f"- {k}: {sections[k]}" for k in SECTION_KEYS if k in sections)
+    return state.get("diary", "")
+
+def generate_diary(date_str: str, session: str = "", use_cache: bool = True, incremental: bool = True) -> str:
+    """
+    session の会話ログと同日の日記から日記テキストを生成して返す（失敗時も文言を返す）。
+    前回の生成結果（会話ログのどこまでを読んだか＋項目ごとの要点）が残っていれば、
+    その後に増えた会話だけを送って更新する（incremental=False なら常に全文から作り直す）。
+    入力が変わっていなければ llm_cache の前回の応答を使う。日付・セッション ID が不正なら ValueError
+    """
+    import metrics
+
+    check_date(date_str)
+    session = check_session(session)
+
+    with metrics.span("dump.generate_diary"):
+        return _generate_diary(date_str, session, use_cache, incremental)
+
+def _generate_diary(date_str: str, session: str, use_cache: bool, incremental: bool) -> str:
+    import llm_cache
+    import llm_policy
+    import metrics
+    import prompt_cache
+    from json_extract import response_config
+
+    # 入力読み込み（無ければ空文字）
+    store = get_storage()
+    key = _state_key(date_str, session)
+    with metrics.span("dump.load", part="state"):
+        state = store.get_state(key) if incremental else None
+        past = store.get_diary(date_str)
+
+    prompt = ""
+    system = DIARY_INSTRUCTIONS
+    if state and state.get("diary"):
+        with metrics.span("dump.load", part="conversation_delta"):
+            delta, cursor, is_delta = store.read_conversation_since(state.get("cursor"), session)
+        if is_delta:
+            if not delta.strip() and past.strip() in ("", state["diary"].strip()):
+                # 会話も日記も前回から変わっていない
+                metrics.count("dump.unchanged")
+                return state["diary"]
+            with metrics.span("dump.build_prompt", mode="incremental"):
+                prompt = build_incremental_prompt(_prior_text(state, past), delta, date_str)
+            system = INCREMENTAL_INSTRUCTIONS
+            print(f"[dump_logs] incremental: {len(delta)} new chars, prompt {len(prompt)} chars", file=sys.stderr)
+    if not prompt:
+        with metrics.span("dump.load", part="conversation"):
+            conv, cursor, _ = store.read_conversation_since(None, session)
+        with metrics.span("dump.build_prompt", mode="full"):
+            prompt = build_diary_prompt(conv, past, date_str)
+
+    def remember(resp_text: str, diary_text: str) -> None:
+        try:
+            with metrics.span("dump.save_state"):
+                store.put_state(key, {"cursor": cursor, "sections": parse_sections(resp_text), "diary": diary_text})
+        except Exception as e:
+            print(f"[dump_logs] state save error: {e}", file=sys.stderr)
+
+    cached = llm_cache.get(MODEL, cache_text(system, prompt)) if use_cache else None
+    if use_cache:
+        metrics.count("dump.llm_cache", result="miss" if cached is None else "hit")
+    if cached is not None:
+        with metrics.span("dump.parse"):
+            diary_text = parse_diary(cached)
+        remember(cached, diary_text)
+        return diary_text
+
     # APIキー確認
-    if not GEMINI_API_KEY:
+    if not bootstrap.gemini_api_key():
         print("GOOGLE_API_KEY is not set.", file=sys.stderr)
-        sys.stdout.write("生成に失敗しました（APIキー未設定）")
-        return
+        return "生成に失敗しました（APIキー未設定）"
 
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        client = get_client()
 
         # 生成
-        resp = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
+        with metrics.span("dump.generate", model=MODEL):
+            resp = llm_policy.call("dump", MODEL, lambda: prompt_cache.generate(
+                client, MODEL, system, prompt, response_config(DIARY_SCHEMA), "dump"
+            ))
 
         # レスポンステキスト取得
         resp_text = getattr(resp, "text", "") or ""
-
-        # まず素直に JSON として読む
-        diary_text = ""
-        try:
-            data = json.loads(resp_text)
-            diary_text = f"{data.get('summary','')}\n\n{data.get('body','')}".strip()
-        except Exception:
-            # 万一説明や前置きが混ざった場合に {} を抽出
-            m = re.search(r'\{\s*"summary"\s*:\s*".*?"\s*,\s*"body"\s*:\s*".*?"\s*\}', resp_text, re.DOTALL)
-            if m:
-                data = json.loads(m.group(0))
-                diary_text = f"{data.get('summary','')}\n\n{data.get('body','')}".strip()
-            else:
-                # 最後の砦：モデルの生テキストをそのまま返す
-                diary_text = resp_text.strip()
+        with metrics.span("dump.parse"):
+            diary_text = parse_diary(resp_text)
+        if diary_text:
+            if use_cache:
+                llm_cache.put(MODEL, cache_text(system, prompt), resp_text)
+            remember(resp_text, diary_text)
 
         if not diary_text:
             diary_text = "生成に失敗しました（空の応答）"
 
-        sys.stdout.write(diary_text)
+        return diary_text
 
+    except llm_policy.Unavailable as e:
+        print(f"Gemini unavailable: {e}", file=sys.stderr)
+        return "生成に失敗しました（一時的に利用できません）"
+    except llm_policy.DeadlineExceeded as e:
+        print(f"Gemini timeout: {e}", file=sys.stderr)
+        return "生成に失敗しました（時間切れ）"
     except Exception as e:
-        # 例外はstderrへ、stdoutには最低限の文言を返す
+        # 例外はstderrへ、呼び出し側には最低限の文言を返す
         print(f"Gemini error: {e}", file=sys.stderr)
-        sys.stdout.write("生成に失敗しました（例外）")
+        return "生成に失敗しました（例外）"
+
+# ---- 期間まとめて生成（--from / --to） ----
+class TokenBucket:
+    """rate 回/秒・最大 burst 回までのレート制限（rate <= 0 なら無制限）"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = None
+
+    async def acquire(self) -> None:
+        import asyncio
+
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def date_range(date_from: str, date_to: str) -> list[str]:
+    d0 = date.fromisoformat(check_date(date_from))
+    d1 = date.fromisoformat(check_date(date_to))
+    if d1 < d0:
+        raise ValueError("--to must not be before --from")
+    return [(d0 + timedelta(days=i)).isoformat() for i in range((d1 - d0).days + 1)]
+
+async def _agenerate(client, prompt: str) -> str:
+    """非同期 API（client.aio）があれば使い、無ければ同期呼び出しをスレッドで回す（指示は DIARY_INSTRUCTIONS のキャッシュ）"""
+    import llm_policy
+    import prompt_cache
+    from json_extract import response_config
+
+    resp = await llm_policy.acall("dump", MODEL, lambda: prompt_cache.agenerate(
+        client, MODEL, DIARY_INSTRUCTIONS, prompt, response_config(DIARY_SCHEMA), "dump"
+    ))
+    return getattr(resp, "text", "") or ""
+
+async def generate_range(
+    dates: list[str],
+    *,
+    session: str = "",
+    with_conversation: bool = False,
+    concurrency: int = 4,
+    rate: float = 0.0,
+    burst: int = 1,
+    overwrite: bool = True,
+    use_cache: bool = True,
+) -> dict:
+    """
+    dates の日記をまとめて生成・保存する。モデル呼び出しは最大 concurrency 本を同時に、
+    rate 回/秒以内で投げる。元になる記録（同日の日記、with_conversation なら会話ログ）が
+    無い日は飛ばす。戻り値は集計と日ごとの結果（途中で例外になった日も error として入れる）。
+    ストレージ・llm_cache の読み書きはブロックするので、スレッドに逃がしてイベントループを止めない
+    """
+    import asyncio
+
+    import diary_search
+    import llm_cache
+    import metrics
+
+    store = get_storage()
+    conv = await asyncio.to_thread(lambda: "".join(store.iter_conversation(session))) if with_conversation else ""
+    client = get_client()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    bucket = TokenBucket(rate, burst)
+    t0 = time.perf_counter()
+    results: list[dict] = []
+    reported: set[str] = set()
+
+    def report(r: dict) -> None:
+        if "seconds" in r:
+            r["seconds"] = round(r["seconds"], 3)
+        results.append(r)
+        reported.add(r["date"])
+        done = len(results)
+        elapsed = time.perf_counter() - t0
+        print(
+            f"[dump_logs] {done}/{len(dates)} {r['date']} {r['status']}"
+            f" ({r.get('seconds', 0):.2f}s, {done / elapsed if elapsed else 0:.2f}/s)",
+            file=sys.stderr,
+        )
+
+    async def one(d: str) -> None:
+        past = await asyncio.to_thread(store.get_diary, d)
+        if not past.strip() and not conv.strip():
+            report({"date": d, "status": "skipped"})
+            return
+        if past.strip() and not overwrite:
+            report({"date": d, "status": "exists"})
+            return
+        prompt = build_diary_prompt(conv, past, d)
+        async with sem:
+            await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                key = cache_text(DIARY_INSTRUCTIONS, prompt)
+                resp_text = await asyncio.to_thread(llm_cache.get, MODEL, key) if use_cache else None
+                if resp_text is None:
+                    # 同じスレッドで並行に走るので、入れ子を持つ span ではなく observe で記録する
+                    t_gen = time.perf_counter()
+                    resp_text = await _agenerate(client, prompt)
+                    metrics.observe("dump.generate", time.perf_counter() - t_gen, model=MODEL, batch=True)
+                    if use_cache:
+                        await asyncio.to_thread(llm_cache.put, MODEL, key, resp_text)
+                text = parse_diary(resp_text)
+            except Exception as e:
+                print(f"[dump_logs] {d} error: {e}", file=sys.stderr)
+                report({"date": d, "status": "error", "error": str(e), "seconds": time.perf_counter() - started})
+                return
+        if not text:
+            report({"date": d, "status": "error", "error": "empty response", "seconds": time.perf_counter() - started})
+            return
+        # 保存は一時ファイル → rename（ストレージ層）なので、途中で止まっても書きかけは残らない
+        try:
+            path = await asyncio.to_thread(store.save_diary, d, text)
+        except Exception as e:
+            print(f"[dump_logs] {d} save error: {e}", file=sys.stderr)
+            report({"date": d, "status": "error", "error": str(e), "seconds": time.perf_counter() - started})
+            return
+        await asyncio.to_thread(diary_search.update_diary, d, text)
+        report({"date": d, "status": "ok", "path": path, "seconds": time.perf_counter() - started})
+
+    # 1 日分が想定外の例外で止まっても、他の日の結果と集計は返す
+    outcomes = await asyncio.gather(*(one(d) for d in dates), return_exceptions=True)
+    for d, out in zip(dates, outcomes):
+        if isinstance(out, Exception) and d not in reported:
+            print(f"[dump_logs] {d} error: {out!r}", file=sys.stderr)
+            report({"date": d, "status": "error", "error": str(out) or type(out).__name__})
+
+    elapsed = time.perf_counter() - t0
+    counts: dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    results.sort(key=lambda r: r["date"])
+    summary = {
+        "dates": len(dates),
+        **counts,
+        "elapsed_s": round(elapsed, 3),
+        "per_minute": round(counts.get("ok", 0) / elapsed * 60, 2) if elapsed else 0.0,
+        "results": results,
+    }
+    print(
+        f"[dump_logs] done: {counts.get('ok', 0)} ok, {counts.get('error', 0)} error, "
+        f"{counts.get('skipped', 0) + counts.get('exists', 0)} skipped in {elapsed:.2f}s "
+        f"({summary['per_minute']}/min)",
+        file=sys.stderr,
+    )
+    return summary
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--date", help="YYYY-MM-DD（1 日分を生成して stdout へ）")
+    ap.add_argument("--session", default="")
+    ap.add_argument("--from", dest="date_from", help="YYYY-MM-DD（--to と合わせて期間をまとめて生成・保存）")
+    ap.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("DIARY_BATCH_CONCURRENCY", "4")))
+    ap.add_argument("--rate", type=float, default=float(os.getenv("DIARY_BATCH_RATE", "0")), help="1 秒あたりの最大呼び出し数（0 で無制限）")
+    ap.add_argument("--burst", type=int, default=1)
+    ap.add_argument("--with-conversation", action="store_true", help="session の会話ログも各日の入力に含める")
+    ap.add_argument("--skip-existing", action="store_true", help="日記が既にある日は作り直さない")
+    ap.add_argument("--no-cache", action="store_true", help="llm_cache を使わずに必ずモデルを呼ぶ")
+    ap.add_argument("--full", action="store_true", help="前回の続きからではなく、会話ログ全体から作り直す")
+    args = ap.parse_args()
+
+    # 日付・セッションは最初に確かめる（途中で ValueError のトレースバックにしない）
+    try:
+        args.session = check_session(args.session)
+        if args.date:
+            check_date(args.date)
+    except ValueError as e:
+        ap.error(str(e))
+
+    if args.date_from or args.date_to:
+        if not (args.date_from and args.date_to):
+            ap.error("--from and --to must be given together")
+        if not bootstrap.gemini_api_key():
+            print("GOOGLE_API_KEY is not set.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            dates = date_range(args.date_from, args.date_to)
+        except ValueError as e:
+            ap.error(str(e))
+        import asyncio  # 期間生成のときだけ読み込む（1 日分の CLI の起動を遅くしない）
+
+        summary = asyncio.run(generate_range(
+            dates,
+            session=args.session,
+            with_conversation=args.with_conversation,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            burst=args.burst,
+            overwrite=not args.skip_existing,
+            use_cache=not args.no_cache,
+        ))
+        print(json.dumps(summary, ensure_ascii=False))
+        sys.exit(0 if not summary.get("error") else 1)
+
+    if not args.date:
+        ap.error("--date or --from/--to is required")
+    sys.stdout.write(generate_diary(args.date, args.session, use_cache=not args.no_cache, incremental=not args.full))
 
 if __name__ == "__main__":
     main()
@@ -1,30 +1,16 @@
 # python/history.py
 from __future__ import annotations
-from pathlib import Path
-from datetime import datetime
-import os
 
-# ログファイルの既定パス（python/ 配下に logs/conversation.txt）
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
-LOG_FILE = LOG_DIR / "conversation.txt"
+from bootstrap import CONV_PATH as LOG_FILE, LOG_DIR, PY_DIR as BASE_DIR  # noqa: F401
+from storage import get_storage
 
-def _ensure_dir() -> None:
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+def append_turn(user_text: str, assistant_text: str, session: str = "") -> None:
+    """ユーザ発話と応答を1ターン分として session の会話ログへ追記保存（保存先はストレージ層が決める）"""
+    get_storage().append_turn(user_text, assistant_text, session)
 
-def append_turn(user_text: str, assistant_text: str) -> None:
-    """ユーザ発話と応答を1ターン分として追記保存。タイムスタンプ付き。"""
-    _ensure_dir()
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"[USER] {user_text}\n")
-        f.write(f"[ASSISTANT] {assistant_text}\n")
-
-def dump_with_header(header: str = "日記") -> str:
-    """ファイル全文を読み出し、先頭に見出しを付けて返す。存在しない場合は空扱い。"""
-    _ensure_dir()
-    body = ""
-    if LOG_FILE.exists():
-        body = LOG_FILE.read_text(encoding="utf-8").rstrip()
+def dump_with_header(header: str = "日記", session: str = "") -> str:
+    """会話ログ全文を読み出し、先頭に見出しを付けて返す。存在しない場合は空扱い。"""
+    # セグメントごとに少しずつ読む（閉じたセグメントは圧縮されたまま順に展開される）
+    body = "".join(get_storage().iter_conversation(session)).rstrip()
     # 将来設計：ここで前処理やフィルタなどを差し込める
     return f"{header}\n{body}".rstrip()  # 末尾の余分な改行を削る
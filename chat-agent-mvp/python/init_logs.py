@@ -1,12 +1,16 @@
 # python/init_logs.py
-# 役割：conversation.txt を初期化（空にする）
+# 役割：会話ログを初期化（空にする）。--session でそのセッションのログだけを対象にする
 
-from pathlib import Path
-from history import LOG_FILE, _ensure_dir
+import argparse
+
+from storage import get_storage
 
 def main():
-    _ensure_dir()
-    LOG_FILE.write_text("", encoding="utf-8")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--session", default="", help="セッション ID（省略時は共有の conversation.txt）")
+    args = parser.parse_args()
+
+    get_storage().reset_conversation(args.session)
     print("OK")
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+# python/json_extract.py
+# 役割：モデル出力から JSON オブジェクトを取り出す（agent / dump_logs 共通）
+# - 前置きの文章やコードフェンス（```json … ```）が混ざっていても、最初の { から対応する } までを探して json.loads する
+# - 走査は {, }, ", \ だけを正規表現で拾って 1 回なめるだけ（.*? のような後戻りは無いので、長い・壊れた出力でも線形時間）
+# - ObjectScanner はストリーミングのチャンクをそのまま feed でき、閉じた時点でオブジェクトを返す
+# - response_config() はモデル側に JSON（スキーマ付き）で出力させるための設定。こちらの抽出はその保険
+
+from __future__ import annotations
+
+import json
+import re
+
+_TOKEN_RE = re.compile(r'[{}"\\]')
+
+def response_config(schema: dict) -> dict:
+    """generate_content の config に渡す：JSON のみ・schema どおりの形で出力させる"""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+def _decode(segment: str) -> dict | None:
+    try:
+        data = json.loads(segment)
+    except (ValueError, RecursionError):
+        # 入れ子が深すぎる（[[[[… のような壊れた出力）ものも「読めなかった」扱いにする
+        return None
+    return data if isinstance(data, dict) else None
+
+class ObjectScanner:
+    """
+    テキストを少しずつ受け取り、最初に閉じた JSON オブジェクト（key があればそれを含むもの）を返す。
+    - 文字列中の { } や \\" は数えない
+    - 閉じたのに JSON として読めなかった候補は捨て、その後ろから探し直す
+    - 候補が始まっていない部分は保持しないので、前置きが長くてもメモリは増えない
+    """
+
+    def __init__(self, key: str | None = None) -> None:
+        self.key = key
+        self.result: dict | None = None
+        self._buf = ""       # 未確定部分（候補の { 以降、または未走査の末尾）
+        self._pos = 0        # _buf のどこまで走査したか
+        self._start = -1     # 候補の { の位置（-1 は候補なし）
+        self._depth = 0
+        self._in_str = False
+        self._skip = -1      # 直前の \ でエスケープされた文字の位置
+
+    def feed(self, chunk: str) -> dict | None:
+        if self.result is not None or not chunk:
+            return self.result
+        self._buf += chunk
+        buf = self._buf
+        for m in _TOKEN_RE.finditer(buf, self._pos):
+            i = m.start()
+            if i == self._skip:
+                continue
+            c = m.group()
+            if self._start < 0:
+                if c == "{":
+                    self._start, self._depth, self._in_str = i, 1, False
+                continue
+            if self._in_str:
+                if c == "\\":
+                    self._skip = i + 1
+                elif c == '"':
+                    self._in_str = False
+                continue
+            if c == '"':
+                self._in_str = True
+            elif c == "{":
+                self._depth += 1
+            elif c == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = _decode(buf[self._start:i + 1])
+                    if obj is not None and (self.key is None or self.key in obj):
+                        self.result = obj
+                        self._buf = ""
+                        return obj
+                    self._start = -1
+        # 走査済みで不要になった先頭を捨てる
+        drop = len(buf) if self._start < 0 else self._start
+        self._buf = buf[drop:]
+        self._pos = len(buf) - drop
+        self._skip -= drop
+        if self._start >= 0:
+            self._start = 0
+        return None
+
+def find_object(text: str, key: str | None = None) -> dict | None:
+    """text 中の最初の JSON オブジェクト（key があればそれを含むもの）を返す。無ければ None"""
+    text = (text or "").strip()
+    if text.startswith("{"):
+        # 素直な JSON ならそのまま読む
+        obj = _decode(text)
+        if obj is not None and (key is None or key in obj):
+            return obj
+    return ObjectScanner(key).feed(text)
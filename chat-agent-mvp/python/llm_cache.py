@@ -0,0 +1,232 @@
+# python/llm_cache.py
+# 役割：モデル応答のディスクキャッシュ（agent / dump_logs 共通）
+# - キーは (model, prompt) の SHA-256。プロンプトが 1 バイトも変わらなければ、モデルを呼ばずに前回の応答を返す
+#   （会話が変わらないまま「終了」を二度押した、タイムアウト後にルートが再試行した、など）
+# - 1 件 1 ファイル（JSON）。作成時刻から TTL を過ぎたものはミス扱いにして消す
+# - 合計サイズが上限を超えたら、最後に使われた時刻（mtime）が古いものから消す（LRU）
+#   合計サイズは書き込みのたびに数え直さず、カウンタに足し引きして持つ（超えたときだけ全件を見て追い出す）
+# - 1 リクエスト 1 プロセスでもヒット率が分かるよう、ヒット/ミス数と合計サイズは固定長の stats.bin に持つ
+#   （ファイルロックを取って読み書きするので、複数プロセスから同時に数えても失われず、大きさも増えない）
+#
+# 設定（環境変数）:
+#   LLM_CACHE_DIR        … キャッシュの置き場所（既定 python/cache/llm）
+#   LLM_CACHE_MAX_BYTES  … 合計サイズの上限（既定 10MB、0 でキャッシュ無効）
+#   LLM_CACHE_TTL        … 有効期間（秒、既定 86400）
+#
+# CLI:
+#   python llm_cache.py --stats   件数・合計サイズ・ヒット率を表示
+#   python llm_cache.py --clear   全削除（統計もリセット）
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+from bootstrap import PY_DIR
+
+DEFAULT_DIR = PY_DIR / "cache" / "llm"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_TTL = 24 * 60 * 60
+STATS_FILE = "stats.bin"
+
+# stats.bin の中身：ヒット数, ミス数, 合計サイズ（-1 はまだ数えていない）
+_STATS = struct.Struct("<QQq")
+
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+def cache_dir() -> Path:
+    return Path(os.getenv("LLM_CACHE_DIR") or DEFAULT_DIR)
+
+def max_bytes() -> int:
+    try:
+        return max(0, int(os.getenv("LLM_CACHE_MAX_BYTES", "")))
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+
+def ttl() -> float:
+    try:
+        return max(0.0, float(os.getenv("LLM_CACHE_TTL", "")))
+    except ValueError:
+        return float(DEFAULT_TTL)
+
+def enabled() -> bool:
+    return max_bytes() > 0
+
+def cache_key(model: str, prompt: str) -> str:
+    payload = json.dumps([model, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _path_for(key: str) -> Path:
+    return cache_dir() / f"{key}.json"
+
+def _update_stats(fn) -> tuple[int, int, int] | None:
+    """
+    stats.bin の (hits, misses, bytes) を fn で書き換え、新しい値を返す（失敗したら None）。
+    読んで書くまでファイルロックを取るので、別プロセスと同時に数えても失われない
+    """
+    try:
+        d = cache_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        with _stats_lock:
+            fd = os.open(d / STATS_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, _STATS.size)
+                cur = _STATS.unpack(raw) if len(raw) == _STATS.size else (0, 0, -1)
+                new = fn(*cur)
+                if new != cur:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, _STATS.pack(*new))
+                return new
+            finally:
+                os.close(fd)  # ロックも一緒に外れる
+    except OSError:
+        return None
+
+def _count(hit: bool) -> None:
+    _update_stats(lambda h, m, b: (h + 1, m, b) if hit else (h, m + 1, b))
+
+def _add_bytes(delta: int) -> int | None:
+    """
+    ファイルを書いた・消した後に呼び、合計サイズに delta を足して返す。
+    まだ数えていなければここで 1 回だけ数える（その時点の数は変更後なので delta は足さない）
+    """
+    def fn(h, m, b):
+        if b < 0:
+            return h, m, sum(size for _, size, _ in _entries())
+        return h, m, max(0, b + delta)
+
+    new = _update_stats(fn)
+    return None if new is None else new[2]
+
+def get(model: str, prompt: str) -> str | None:
+    """キャッシュにあり期限内ならその応答テキストを返し、最終使用時刻を更新する"""
+    if not enabled():
+        return None
+    p = _path_for(cache_key(model, prompt))
+    try:
+        entry = json.loads(p.read_text(encoding="utf-8"))
+        if time.time() - float(entry.get("created", 0)) > ttl():
+            size = p.stat().st_size
+            p.unlink()
+            _add_bytes(-size)
+            raise FileNotFoundError
+        text = str(entry["text"])
+        os.utime(p)
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        _count(False)
+        return None
+    _count(True)
+    return text
+
+def put(model: str, prompt: str, text: str) -> None:
+    """応答を原子的に書き込み、上限を超えた分を追い出す（空の応答は入れない）"""
+    if not enabled() or not text:
+        return
+    d = cache_dir()
+    p = _path_for(cache_key(model, prompt))
+    try:
+        d.mkdir(parents=True, exist_ok=True)
+        try:
+            old = p.stat().st_size
+        except FileNotFoundError:
+            old = 0
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "created": time.time(), "text": text}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, p)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        total = _add_bytes(size - old)
+        if total is None or total > max_bytes():
+            evict()
+    except Exception as e:
+        print(f"[llm_cache] store error: {e}", file=sys.stderr)
+
+def delete(model: str, prompt: str) -> None:
+    """エントリを消す（読めない応答が入っていたときなど）"""
+    p = _path_for(cache_key(model, prompt))
+    try:
+        size = p.stat().st_size
+        p.unlink()
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"[llm_cache] delete error: {e}", file=sys.stderr)
+        return
+    _add_bytes(-size)
+
+def _entries() -> list[tuple[float, int, Path]]:
+    out = []
+    for p in cache_dir().glob("*.json"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        out.append((st.st_mtime, st.st_size, p))
+    return out
+
+def evict(limit: int | None = None) -> int:
+    """合計サイズが limit 以下になるまで古いものから消し、消した件数を返す（数え直した合計をカウンタへ戻す）"""
+    limit = max_bytes() if limit is None else limit
+    with _lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, p in entries:
+            if total <= limit:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        _update_stats(lambda h, m, b: (h, m, total))
+    return removed
+
+def stats() -> dict:
+    entries = _entries()
+    counts = _update_stats(lambda h, m, b: (h, m, b))
+    hits, misses = counts[:2] if counts else (0, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": max_bytes(),
+        "ttl": ttl(),
+    }
+
+def clear() -> None:
+    evict(0)
+    (cache_dir() / STATS_FILE).unlink(missing_ok=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stats", action="store_true", help="キャッシュの状態を表示")
+    parser.add_argument("--clear", action="store_true", help="キャッシュと統計を全削除")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    print(json.dumps(stats(), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+# python/llm_policy.py
+# 役割：モデル呼び出しの待ち時間に上限を付ける（agent / dump_logs 共通）
+# - 期限（deadline）… 呼び出し元ごとの秒数で打ち切り、DeadlineExceeded を送出する
+#   （呼び出し側はそれを受けて、例外のときと同じフォールバック文を返す）
+# - ヘッジ … 最初の呼び出しが最近の所要時間の p95 を過ぎても返らなければ、同じ要求をもう 1 本だけ投げ、
+#   先に返った方を使う。最初の呼び出しが先に失敗したときも、その場でもう 1 本を投げる
+#   p95 が分かるまで（成功 HEDGE_MIN_SAMPLES 回未満）は呼び出し元ごとの既定の待ち時間を使う
+#   ストリーミングは最初のチャンクまでの時間で判断し、先にチャンクを返した方に決めたら他方は捨てる
+# - サーキットブレーカー … 失敗（5xx・429・期限切れ・接続エラー）が LLM_BREAKER_FAILURES 回続いたら、
+#   LLM_BREAKER_COOLDOWN_S 秒は呼び出さずに Unavailable を即座に送出する
+#   その後 1 本だけ試し、成功すれば元に戻す（失敗すればまた止める）。4xx は要求側の誤りなので数えない
+#   状態はモデルごと・プロセスごとのメモリにだけ持つ。効くのは常駐ワーカー（worker.py。agent と dump_logs で共有）
+#   の中だけで、1 回ごとに起動する CLI（python agent.py 等）では連続失敗が数えられないので実質働かない
+#   （CLI でも期限とヘッジは効く）
+# - 打ち切った呼び出しはスレッドで最後まで走ることがある（同期 API は途中で止められない）。
+#   その所要時間も p95 の計算に入れる
+# - ストリーミングの期限はチャンクが届いた時刻（モデルから読むスレッドで測る）で判断する。
+#   呼び出し側がチャンクの間に音声合成などで時間を使っても、その分は期限に数えない
+# - metrics: llm.call（呼び出し元ごとの所要時間）、llm.hedge / llm.deadline / llm.breaker（件数）
+#
+# 設定（環境変数）:
+#   LLM_HEDGE                … "0" でヘッジしない（既定 "1"）
+#   LLM_<CALLER>_DEADLINE_S  … 期限（秒。既定 agent 20 / dump 90）
+#   LLM_<CALLER>_HEDGE_S     … p95 が分かるまでのヘッジの待ち時間（秒。既定 agent 4 / dump 30）
+#   LLM_BREAKER_FAILURES     … ブレーカーを開く連続失敗回数（既定 5。0 で使わない）
+#   LLM_BREAKER_COOLDOWN_S   … 開いてから試し直すまでの秒数（既定 30）
+
+from __future__ import annotations
+
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterator
+
+import metrics
+
+DEFAULTS = {
+    "agent": {"deadline": 20.0, "hedge": 4.0},
+    "dump": {"deadline": 90.0, "hedge": 30.0},
+}
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+HEDGE_MIN_SAMPLES = 20
+HEDGE_FLOOR = 0.1   # p95 がこれより短くても、これ以上は待つ（秒）
+WINDOW = 200        # p95 を取る直近の成功数
+
+class Unavailable(Exception):
+    """ブレーカーが開いているので呼び出さなかった"""
+
+class DeadlineExceeded(TimeoutError):
+    """期限までに応答が無かった"""
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, "")))
+    except ValueError:
+        return default
+
+def hedging() -> bool:
+    return os.getenv("LLM_HEDGE", "1") != "0"
+
+def deadline(caller: str) -> float:
+    d = DEFAULTS.get(caller, DEFAULTS["agent"])["deadline"]
+    return _env_float(f"LLM_{caller.upper()}_DEADLINE_S", d) or d
+
+def breaker_failures() -> int:
+    return int(_env_float("LLM_BREAKER_FAILURES", DEFAULT_BREAKER_FAILURES))
+
+def breaker_cooldown() -> float:
+    return _env_float("LLM_BREAKER_COOLDOWN_S", DEFAULT_BREAKER_COOLDOWN)
+
+# ---- 状態（_lock の下で読み書きする） ----
+_lock = threading.Lock()
+_latency: dict[str, deque] = {}  # "<caller>.call" / "<caller>.first_chunk" → 直近の所要時間（秒）
+_breakers: dict[str, dict] = {}  # モデル → {"state", "failures", "until", "probing"}
+_counters: dict[str, dict[str, int]] = {}
+
+def _bump(caller: str, name: str) -> None:
+    with _lock:
+        c = _counters.setdefault(caller, {"calls": 0, "hedged": 0, "hedge_won": 0, "deadline": 0, "rejected": 0})
+        c[name] += 1
+
+def _record(key: str, seconds: float) -> None:
+    with _lock:
+        _latency.setdefault(key, deque(maxlen=WINDOW)).append(seconds)
+
+def _p95(samples: list[float]) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(0.95 * len(s)))]
+
+def hedge_delay(caller: str, kind: str = "call") -> float | None:
+    """もう 1 本を投げるまでの秒数（ヘッジしないなら None）"""
+    if not hedging():
+        return None
+    with _lock:
+        samples = list(_latency.get(f"{caller}.{kind}", ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        d = DEFAULTS.get(caller, DEFAULTS["agent"])["hedge"]
+        return _env_float(f"LLM_{caller.upper()}_HEDGE_S", d)
+    return max(HEDGE_FLOOR, _p95(samples))
+
+# ---- サーキットブレーカー ----
+def _breaker(model: str) -> dict:
+    return _breakers.setdefault(model, {"state": "closed", "failures": 0, "until": 0.0, "probing": False})
+
+def _admit(caller: str, model: str) -> None:
+    """呼び出してよければ戻る。ブレーカーが開いていれば Unavailable"""
+    with _lock:
+        b = _breaker(model)
+        if b["state"] == "closed":
+            return
+        if b["state"] == "open" and time.monotonic() >= b["until"]:
+            b["state"] = "half_open"
+            b["probing"] = False
+        if b["state"] == "half_open" and not b["probing"]:
+            b["probing"] = True  # 試しの 1 本
+            return
+    _bump(caller, "rejected")
+    metrics.count("llm.breaker", model=model, result="rejected")
+    raise Unavailable(f"{model}: circuit open")
+
+def is_failure(e: BaseException) -> bool:
+    """バックエンドの不調とみなす失敗か（4xx は要求側の誤りなので数えない。429 / 408 は数える）"""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if isinstance(code, int) and 400 <= code < 500 and code not in (408, 429):
+        return False
+    return True
+
+def _settle(model: str, ok: bool | None) -> None:
+    """呼び出しの結果をブレーカーに反映する（ok=None は成否に数えない）"""
+    opened = closed = False
+    with _lock:
+        b = _breaker(model)
+        was = b["state"]
+        b["probing"] = False
+        if ok:
+            b["failures"] = 0
+            b["state"] = "closed"
+            closed = was != "closed"
+        elif ok is False:
+            b["failures"] += 1
+            limit = breaker_failures()
+            if was == "half_open" or (limit and b["failures"] >= limit and was == "closed"):
+                b["state"] = "open"
+                b["until"] = time.monotonic() + breaker_cooldown()
+                opened = True
+    if opened:
+        print(f"[llm_policy] {model}: circuit open for {breaker_cooldown():g}s", file=sys.stderr)
+        metrics.count("llm.breaker", model=model, result="open")
+    if closed:
+        print(f"[llm_policy] {model}: circuit closed", file=sys.stderr)
+        metrics.count("llm.breaker", model=model, result="close")
+
+def _failed(caller: str, model: str, e: BaseException) -> None:
+    if isinstance(e, DeadlineExceeded):
+        _bump(caller, "deadline")
+        metrics.count("llm.deadline", caller=caller)
+    _settle(model, False if is_failure(e) else None)
+
+# ---- 呼び出し ----
+def _start(target: Callable[[], None], caller: str, i: int) -> None:
+    threading.Thread(target=target, name=f"llm-{caller}-{i}", daemon=True).start()
+
+def call(caller: str, model: str, fn: Callable[[], object]):
+    """fn()（モデル呼び出し）を期限・ヘッジ・ブレーカー付きで実行し、先に返った結果を返す"""
+    _admit(caller, model)
+    _bump(caller, "calls")
+    t0 = time.monotonic()
+    limit = deadline(caller)
+    end = t0 + limit
+    delay = hedge_delay(caller)
+    hedge_at = t0 + delay if delay is not None and delay < limit else None
+    results: queue.Queue = queue.Queue()
+
+    def attempt(i: int) -> None:
+        ts = time.monotonic()
+        try:
+            r = fn()
+        except Exception as e:
+            results.put((i, False, e))
+            return
+        _record(f"{caller}.call", time.monotonic() - ts)
+        results.put((i, True, r))
+
+    def hedge(reason: str) -> None:
+        _bump(caller, "hedged")
+        metrics.count("llm.hedge", caller=caller, reason=reason)
+        _start(lambda: attempt(1), caller, 1)
+
+    _start(lambda: attempt(0), caller, 0)
+    launched, failed = 1, 0
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            e = DeadlineExceeded(f"{caller}: no response within {limit:.1f}s")
+            _failed(caller, model, e)
+            raise e
+        wait = end - now
+        if hedge_at is not None and launched == 1:
+            wait = min(wait, max(0.0, hedge_at - now))
+        try:
+            i, ok, value = results.get(timeout=wait)
+        except queue.Empty:
+            if hedge_at is not None and launched == 1 and time.monotonic() >= hedge_at:
+                hedge("slow")
+                launched = 2
+            continue
+        if ok:
+            if i == 1:
+                _bump(caller, "hedge_won")
+            metrics.observe("llm.call", time.monotonic() - t0, caller=caller, hedged=launched > 1)
+            _settle(model, True)
+            return value
+        failed += 1
+        if failed < launched:
+            continue  # もう一方を待つ
+        if launched == 1 and hedge_at is not None and is_failure(value):
+            hedge("error")
+            launched = 2
+            continue
+        _failed(caller, model, value)
+        raise value
+
+def stream(caller: str, model: str, make_iter: Callable[[], Iterator]) -> Iterator:
+    """
+    ストリーミング版。最初のチャンクまでの時間でヘッジし、先にチャンクを返した方のチャンクだけを yield する。
+    モデル側が期限までに次のチャンク（または終わり）を届けなければ DeadlineExceeded（それまでに yield した分はそのまま）。
+    期限はチャンクが届いた時刻で見るので、yield している間（呼び出し側の処理）に過ぎた時間は数えない
+    """
+    _admit(caller, model)
+    _bump(caller, "calls")
+    t0 = time.monotonic()
+    limit = deadline(caller)
+    end = t0 + limit
+    delay = hedge_delay(caller, "first_chunk")
+    hedge_at = t0 + delay if delay is not None and delay < limit else None
+    items: queue.Queue = queue.Queue()
+    stop = [threading.Event(), threading.Event()]
+
+    def attempt(i: int) -> None:
+        ts = time.monotonic()
+        it = None
+        first = True
+        try:
+            # 呼び出し自体がすぐ失敗した（認証・上限・要求の誤り）ときも error として渡す（期限まで待たせない）
+            it = make_iter()
+            for chunk in it:
+                if stop[i].is_set():
+                    return
+                now = time.monotonic()
+                if first:
+                    _record(f"{caller}.first_chunk", now - ts)
+                    first = False
+                items.put((i, "chunk", chunk, now))
+            items.put((i, "end", None, time.monotonic()))
+        except Exception as e:
+            items.put((i, "error", e, time.monotonic()))
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()  # 打ち切ったときも usage を数えさせる
+
+    def hedge(reason: str) -> None:
+        _bump(caller, "hedged")
+        metrics.count("llm.hedge", caller=caller, reason=reason)
+        _start(lambda: attempt(1), caller, 1)
+
+    _start(lambda: attempt(0), caller, 0)
+    launched, failed = 1, 0
+    winner: int | None = None
+    settled = False
+
+    def expired() -> DeadlineExceeded:
+        return DeadlineExceeded(f"{caller}: stream not finished within {limit:.1f}s")
+
+    try:
+        while True:
+            now = time.monotonic()
+            wait = max(0.0, end - now)
+            if winner is None and hedge_at is not None and launched == 1:
+                wait = min(wait, max(0.0, hedge_at - now))
+            try:
+                # 期限を過ぎていても、期限内に届いて待っているチャンクは受け取る
+                i, kind, value, at = items.get(timeout=wait) if wait > 0 else items.get_nowait()
+            except queue.Empty:
+                if time.monotonic() >= end:
+                    settled = True
+                    e = expired()
+                    _failed(caller, model, e)
+                    raise e
+                if winner is None and hedge_at is not None and launched == 1 and time.monotonic() >= hedge_at:
+                    hedge("slow")
+                    launched = 2
+                continue
+            if at > end and (winner is None or i == winner):
+                settled = True
+                e = expired()
+                _failed(caller, model, e)
+                raise e
+            if winner is not None and i != winner:
+                continue
+            if kind == "error":
+                if winner is None:
+                    failed += 1
+                    if failed < launched:
+                        continue
+                    if launched == 1 and hedge_at is not None and is_failure(value):
+                        hedge("error")
+                        launched = 2
+                        continue
+                settled = True
+                _failed(caller, model, value)
+                raise value
+            if winner is None:
+                winner = i
+                stop[1 - i].set()
+                if i == 1:
+                    _bump(caller, "hedge_won")
+            if kind == "end":
+                metrics.observe("llm.call", at - t0, caller=caller, hedged=launched > 1, stream=True)
+                settled = True
+                _settle(model, True)
+                return
+            yield value
+    finally:
+        for ev in stop:
+            ev.set()
+        if not settled:
+            # 呼び出し側が途中で打ち切った（必要な分は届いている）
+            _settle(model, True)
+
+async def acall(caller: str, model: str, make_coro: Callable[[], Awaitable]):
+    """asyncio 版の call。負けた方のタスクは取り消す"""
+    import asyncio
+
+    _admit(caller, model)
+    _bump(caller, "calls")
+    t0 = time.monotonic()
+    limit = deadline(caller)
+    end = t0 + limit
+    delay = hedge_delay(caller)
+    hedge_at = t0 + delay if delay is not None and delay < limit else None
+
+    async def attempt():
+        ts = time.monotonic()
+        r = await make_coro()
+        _record(f"{caller}.call", time.monotonic() - ts)
+        return r
+
+    def hedge(reason: str) -> asyncio.Task:
+        _bump(caller, "hedged")
+        metrics.count("llm.hedge", caller=caller, reason=reason)
+        return asyncio.ensure_future(attempt())
+
+    tasks = [asyncio.ensure_future(attempt())]
+    pending = set(tasks)
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                e = DeadlineExceeded(f"{caller}: no response within {limit:.1f}s")
+                _failed(caller, model, e)
+                raise e
+            wait = end - now
+            if hedge_at is not None and len(tasks) == 1:
+                wait = min(wait, max(0.0, hedge_at - now))
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if hedge_at is not None and len(tasks) == 1 and time.monotonic() >= hedge_at:
+                    tasks.append(hedge("slow"))
+                    pending.add(tasks[-1])
+                continue
+            for t in done:
+                if t.exception() is None:
+                    if t is not tasks[0]:
+                        _bump(caller, "hedge_won")
+                    metrics.observe("llm.call", time.monotonic() - t0, caller=caller, hedged=len(tasks) > 1)
+                    _settle(model, True)
+                    return t.result()
+            if pending:
+                continue
+            e = next(iter(done)).exception()
+            if len(tasks) == 1 and hedge_at is not None and is_failure(e):
+                tasks.append(hedge("error"))
+                pending.add(tasks[-1])
+                continue
+            _failed(caller, model, e)
+            raise e
+    finally:
+        for t in pending:
+            t.cancel()
+
+def stats() -> dict:
+    """呼び出し元ごとの回数・ヘッジ・期限切れと p50 / p95、モデルごとのブレーカーの状態（このプロセス内）"""
+    with _lock:
+        latency = {k: list(v) for k, v in _latency.items()}
+        out = {
+            "callers": {c: dict(v) for c, v in _counters.items()},
+            "breakers": {m: {"state": b["state"], "failures": b["failures"]} for m, b in _breakers.items()},
+        }
+    out["latency"] = {
+        k: {"n": len(v), "p50Ms": round(sorted(v)[len(v) // 2] * 1000, 1), "p95Ms": round(_p95(v) * 1000, 1)}
+        for k, v in latency.items() if v
+    }
+    return out
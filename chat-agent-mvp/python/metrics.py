@@ -0,0 +1,229 @@
+# python/metrics.py
+# 役割：処理の段階ごとの所要時間と件数を測る（agent / voice / dump_logs / worker 共通）
+# - with span("agent.generate"): ... で段階の時間を測り、count("llm_cache", result="hit") で件数を数える
+#   span は入れ子にでき、記録には外側の span 名（parent）も入る
+# - 出力先は環境変数 METRICS で選ぶ（カンマ区切りで両方も可）
+#     stderr … span が終わるたびに 1 行の JSON を stderr へ
+#              [metrics] {"span": "agent.generate", "ms": 812.4, "parent": "agent.reply", "pid": 123, ...ラベル}
+#     prom   … Prometheus の textfile 形式（node_exporter の textfile collector 用）で METRICS_TEXTFILE へ
+#              chat_agent_stage_seconds（ヒストグラム。stage ラベル）と chat_agent_<name>_total（カウンタ）
+#              値はすべて加算なので、CLI のように 1 回ごとに別プロセスでも、ファイルの値に足し込んで累積する
+#              書き出しはプロセス終了時と、常駐ワーカーでは最大 METRICS_FLUSH_S 秒ごと
+# - METRICS が空（既定）なら span() は何もしない共有のコンテキストを返すだけで、時刻も取らない
+#
+# 設定（環境変数）:
+#   METRICS            … "stderr" / "prom" / "stderr,prom"（既定 空 = 無効）
+#   METRICS_TEXTFILE   … prom の書き出し先（既定 python/cache/metrics.prom）
+#   METRICS_FLUSH_S    … prom を書き出す最短間隔（秒、既定 10）
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from bootstrap import PY_DIR
+
+DEFAULT_TEXTFILE = PY_DIR / "cache" / "metrics.prom"
+DEFAULT_FLUSH_S = 10.0
+PREFIX = "chat_agent_"
+# 秒。モデル呼び出し（数秒）から 1 ファイルの読み込み（数ミリ秒）まで
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _sinks() -> frozenset[str]:
+    return frozenset(s.strip() for s in os.getenv("METRICS", "").lower().split(",") if s.strip())
+
+_SINKS = _sinks()
+_NOOP = contextlib.nullcontext()
+
+def enabled() -> bool:
+    return bool(_SINKS)
+
+def textfile() -> Path:
+    return Path(os.getenv("METRICS_TEXTFILE") or DEFAULT_TEXTFILE)
+
+def flush_interval() -> float:
+    try:
+        return max(0.0, float(os.getenv("METRICS_FLUSH_S", "")))
+    except ValueError:
+        return DEFAULT_FLUSH_S
+
+# ---- 集計（prom 用。前回書き出してからの増分） ----
+_lock = threading.Lock()
+_pending: dict[str, float] = {}  # サンプル行のキー（名前{ラベル}）→ 増分
+_last_flush = time.monotonic()
+_local = threading.local()       # span の入れ子（スレッドごと）
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _metric_name(name: str) -> str:
+    return PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+def _add(key: str, value: float) -> None:
+    _pending[key] = _pending.get(key, 0.0) + value
+
+def _record_span(stage: str, seconds: float, labels: dict) -> None:
+    lab = {"stage": stage, **labels}
+    name = PREFIX + "stage_seconds"
+    with _lock:
+        for le in BUCKETS:
+            if seconds <= le:
+                _add(f"{name}_bucket{_labels({**lab, 'le': le})}", 1)
+        _add(f"{name}_bucket{_labels({**lab, 'le': '+Inf'})}", 1)
+        _add(f"{name}_sum{_labels(lab)}", seconds)
+        _add(f"{name}_count{_labels(lab)}", 1)
+    _maybe_flush()
+
+def _emit(rec: dict) -> None:
+    import json
+
+    rec["pid"] = os.getpid()
+    print(f"[metrics] {json.dumps(rec, ensure_ascii=False)}", file=sys.stderr)
+
+# ---- 公開 API ----
+def observe(stage: str, seconds: float, **labels) -> None:
+    """測り終えた時間を記録する（最初の音声までの時間など、span で囲めないもの）"""
+    if not _SINKS:
+        return
+    if "stderr" in _SINKS:
+        stack = getattr(_local, "stack", None)
+        rec = {"span": stage, "ms": round(seconds * 1000, 3), **labels}
+        if stack:
+            rec["parent"] = stack[-1]
+        _emit(rec)
+    if "prom" in _SINKS:
+        _record_span(stage, seconds, labels)
+
+@contextlib.contextmanager
+def _span(stage: str, labels: dict):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(stage)
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        stack.pop()
+        if "stderr" in _SINKS:
+            rec = {"span": stage, "ms": round(dt * 1000, 3), **labels}
+            if parent:
+                rec["parent"] = parent
+            if error:
+                rec["error"] = True
+            _emit(rec)
+        if "prom" in _SINKS:
+            _record_span(stage, dt, labels)
+
+def span(stage: str, **labels):
+    """with span("voice.ffmpeg", codec="opus"): ... で段階の時間を測る。無効時は何もしない"""
+    if not _SINKS:
+        return _NOOP
+    return _span(stage, labels)
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """カウンタ chat_agent_<name>_total に value を足す"""
+    if not _SINKS:
+        return
+    if "stderr" in _SINKS:
+        _emit({"count": name, "value": value, **labels})
+    if "prom" in _SINKS:
+        with _lock:
+            _add(f"{_metric_name(name)}_total{_labels(labels)}", value)
+        _maybe_flush()
+
+# ---- textfile への書き出し ----
+def _parse(text: str) -> dict[str, float]:
+    out: dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        key, _, value = line.rpartition(" ")
+        try:
+            out[key] = float(value)
+        except ValueError:
+            continue
+    return out
+
+def _family(key: str) -> tuple[str, str]:
+    """サンプル行のキー → (メトリクス名, 型)"""
+    base = key.split("{", 1)[0]
+    hist = PREFIX + "stage_seconds"
+    return (hist, "histogram") if base.startswith(hist + "_") else (base, "counter")
+
+def flush() -> None:
+    """前回からの増分をファイルの値に足し込んで書き出す（別プロセスと同時でもよいよう、ロックを取る）"""
+    global _last_flush
+    if "prom" not in _SINKS:
+        return
+    with _lock:
+        delta = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not delta:
+        return
+    import tempfile
+
+    p = textfile()
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with _file_lock(p):
+            try:
+                totals = _parse(p.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                totals = {}
+            for k, v in delta.items():
+                totals[k] = totals.get(k, 0.0) + v
+            lines: list[str] = []
+            seen: set[str] = set()
+            for k in sorted(totals, key=lambda k: (_family(k)[0], k)):
+                name, kind = _family(k)
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{k} {totals[k]:.10g}")
+            fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=".metrics.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, p)  # collector が書きかけを読まないように
+    except Exception as e:
+        print(f"[metrics] flush error: {e}", file=sys.stderr)
+
+@contextlib.contextmanager
+def _file_lock(p: Path):
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover
+        yield
+        return
+    fd = os.open(p.with_name(p.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def _maybe_flush() -> None:
+    if time.monotonic() - _last_flush >= flush_interval():
+        flush()
+
+if "prom" in _SINKS:
+    import atexit
+
+    atexit.register(flush)
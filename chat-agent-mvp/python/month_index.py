@@ -0,0 +1,239 @@
+# python/month_index.py
+# 役割：月ごとの日記インデックス（カレンダー表示用）
+# - logs/.index/YYYY-MM.json に {date, hasLog, preview, mtime, size, chars} を月単位で持つ
+# - 保存・削除は write_diary / delete_diary を通し、そのたびに該当日だけ書き換える
+# - range_days は複数月にまたがる期間をまとめて返す（古い月があってもディレクトリの走査は 1 回）
+# - 読み出し時は logs/ のディレクトリ mtime と突き合わせ、一致すればインデックス 1 ファイルを読むだけで済ませる
+#   一致しない（外部でファイルが増減した等）ときは、その月のファイルを stat し、
+#   mtime・サイズが変わったものだけ読み直してインデックスを作り直す
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+INDEX_DIRNAME = ".index"
+
+_DIARY_FILE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})\.txt")
+
+def preview_20(text: str) -> str:
+    # 改行・連続空白を整理して先頭20文字
+    s = re.sub(r"\s+", " ", text.strip())
+    return s[:20]
+
+def _index_path(log_dir: Path, month_key: str) -> Path:
+    return log_dir / INDEX_DIRNAME / f"{month_key}.json"
+
+def _dir_mtime(log_dir: Path) -> int:
+    try:
+        return log_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+def _load(log_dir: Path, month_key: str) -> dict | None:
+    try:
+        data = json.loads(_index_path(log_dir, month_key).read_text(encoding="utf-8"))
+        if isinstance(data, dict) and isinstance(data.get("days"), dict):
+            return data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[month_index] load error: {e}", file=sys.stderr)
+    return None
+
+def _save(log_dir: Path, month_key: str, days: dict, dir_mtime: int) -> None:
+    import tempfile
+
+    p = _index_path(log_dir, month_key)
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"dirMtime": dir_mtime, "days": days}, f, ensure_ascii=False)
+        os.replace(tmp, p)
+    except Exception as e:
+        print(f"[month_index] save error: {e}", file=sys.stderr)
+
+def _entry(date: str, content: str, st: os.stat_result) -> dict:
+    return {
+        "date": date,
+        "hasLog": True,
+        "preview": preview_20(content),
+        "mtime": st.st_mtime_ns,
+        "size": st.st_size,
+        "chars": len(content),
+    }
+
+def _rebuild(log_dir: Path, month_key: str, old_days: dict) -> dict:
+    """月のファイルを stat し、変わったものだけ読み直す"""
+    pat = re.compile(rf"({re.escape(month_key)}-\d{{2}})\.txt")
+    days: dict = {}
+    try:
+        it = os.scandir(log_dir)
+    except FileNotFoundError:
+        return days
+    with it:
+        for de in it:
+            m = pat.fullmatch(de.name)
+            if not m or not de.is_file():
+                continue
+            date = m.group(1)
+            st = de.stat()
+            old = old_days.get(date)
+            if old and old.get("mtime") == st.st_mtime_ns and old.get("size") == st.st_size:
+                days[date] = old
+                continue
+            try:
+                content = Path(de.path).read_text(encoding="utf-8")
+            except Exception:
+                content = ""
+            days[date] = _entry(date, content, st)
+    return days
+
+# ---- 公開 API ----
+def month_days(log_dir: Path, y: int, m: int) -> dict:
+    """指定月の {date: entry}（記録がある日だけ）を返す"""
+    month_key = f"{y:04d}-{m:02d}"
+    # インデックス置き場の作成自体もディレクトリ mtime を変えるので、先に作っておく
+    (log_dir / INDEX_DIRNAME).mkdir(parents=True, exist_ok=True)
+    # 先に mtime を取っておき、走査中の変更は次回の検証で拾う
+    dir_mtime = _dir_mtime(log_dir)
+    idx = _load(log_dir, month_key)
+    if idx is not None and idx.get("dirMtime") == dir_mtime:
+        return idx["days"]
+    days = _rebuild(log_dir, month_key, idx["days"] if idx else {})
+    _save(log_dir, month_key, days, dir_mtime)
+    return days
+
+def _month_keys(date_from: str, date_to: str) -> list[str]:
+    y, m = int(date_from[:4]), int(date_from[5:7])
+    keys = []
+    while f"{y:04d}-{m:02d}" <= date_to[:7]:
+        keys.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return keys
+
+def range_days(log_dir: Path, date_from: str, date_to: str) -> dict:
+    """
+    date_from〜date_to（両端含む）の {date: entry}（記録がある日だけ）を返す。
+    範囲内の月インデックスがすべて検証済みなら、それを読むだけで済ませる。
+    どれかが古ければディレクトリを 1 回だけ走査し（日ごとの exists() は使わない）、
+    変わったファイルだけ読み直して、範囲内の月インデックスをまとめて作り直す
+    """
+    (log_dir / INDEX_DIRNAME).mkdir(parents=True, exist_ok=True)
+    dir_mtime = _dir_mtime(log_dir)
+    keys = _month_keys(date_from, date_to)
+    idxs = {k: _load(log_dir, k) for k in keys}
+    stale = [
+        k for k, idx in idxs.items()
+        if idx is None or idx.get("dirMtime") != dir_mtime
+        # 文字数を持たない古い形式のエントリも作り直す
+        or any("chars" not in e for e in idx["days"].values())
+    ]
+    if stale:
+        old = {k: (idxs[k] or {}).get("days", {}) for k in stale}
+        fresh: dict = {k: {} for k in stale}
+        try:
+            it = os.scandir(log_dir)
+        except FileNotFoundError:
+            it = None
+        if it is not None:
+            with it:
+                for de in it:
+                    m = _DIARY_FILE_RE.fullmatch(de.name)
+                    if not m or m.group(1)[:7] not in fresh or not de.is_file():
+                        continue
+                    date = m.group(1)
+                    st = de.stat()
+                    prev = old[date[:7]].get(date)
+                    if prev and prev.get("mtime") == st.st_mtime_ns and prev.get("size") == st.st_size and "chars" in prev:
+                        fresh[date[:7]][date] = prev
+                        continue
+                    try:
+                        content = Path(de.path).read_text(encoding="utf-8")
+                    except Exception:
+                        content = ""
+                    fresh[date[:7]][date] = _entry(date, content, st)
+        for k, days in fresh.items():
+            _save(log_dir, k, days, dir_mtime)
+            idxs[k] = {"days": days}
+    out: dict = {}
+    for k in keys:
+        for date, e in idxs[k]["days"].items():
+            if date_from <= date <= date_to:
+                out[date] = e
+    return out
+
+def _apply(log_dir: Path, date: str, entry: dict | None, dir_mtime_before: int) -> None:
+    """
+    1 日分のエントリを差し替える。書き込み前のディレクトリ mtime がインデックスと
+    一致していたときだけ新しい mtime で検証済みにする（外部の変更を見落とさないため）
+    """
+    month_key = date[:7]
+    idx = _load(log_dir, month_key)
+    if idx is None:
+        # まだインデックスが無い月は、次の読み出しでまとめて作る
+        return
+    if entry is None:
+        idx["days"].pop(date, None)
+    else:
+        idx["days"][date] = entry
+    valid = idx.get("dirMtime") == dir_mtime_before
+    _save(log_dir, month_key, idx["days"], _dir_mtime(log_dir) if valid else idx.get("dirMtime", 0))
+
+def _write_atomic(log_dir: Path, date: str, content: str) -> Path:
+    import tempfile
+
+    p = log_dir / f"{date}.txt"
+    # 一時ファイル → os.replace で、書きかけの日記を読ませない
+    fd, tmp = tempfile.mkstemp(dir=log_dir, prefix=f".{date}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, p)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return p
+
+def write_diary(log_dir: Path, date: str, content: str) -> Path:
+    """date の日記を上書き保存し、インデックスの該当日だけ更新する"""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    before = _dir_mtime(log_dir)
+    p = _write_atomic(log_dir, date, content)
+    _apply(log_dir, date, _entry(date, content, p.stat()), before)
+    return p
+
+def write_diaries(log_dir: Path, items: list[tuple[str, str]]) -> int:
+    """
+    まとめて保存する（一括取り込み用）。各日記は 1 件ずつ原子的に書き、
+    インデックスは月ごとに 1 回だけ読み書きする。書いた件数を返す
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    before = _dir_mtime(log_dir)
+    by_month: dict[str, dict] = {}
+    for date, content in items:
+        p = _write_atomic(log_dir, date, content)
+        by_month.setdefault(date[:7], {})[date] = _entry(date, content, p.stat())
+    after = _dir_mtime(log_dir)
+    for month_key, entries in by_month.items():
+        idx = _load(log_dir, month_key)
+        if idx is None:
+            continue  # 次の読み出しでまとめて作る
+        idx["days"].update(entries)
+        # 書き込み前に検証済みだった月だけ、新しい mtime で検証済みにする
+        valid = idx.get("dirMtime") == before
+        _save(log_dir, month_key, idx["days"], after if valid else idx.get("dirMtime", 0))
+    return len(items)
+
+def delete_diary(log_dir: Path, date: str) -> Path:
+    """date の日記を削除し（無ければ何もしない）、インデックスから外す"""
+    before = _dir_mtime(log_dir)
+    p = log_dir / f"{date}.txt"
+    if p.exists():
+        p.unlink()
+    _apply(log_dir, date, None, before)
+    return p
@@ -0,0 +1,241 @@
+# python/prompt_cache.py
+# 役割：プロンプトの固定部分（システム指示）を Gemini のコンテキストキャッシュに載せて使い回す（agent / dump_logs 共通）
+# - 会話の役割や日記テンプレートなど、毎回同じ長い指示は system instruction として分け、
+#   client.caches.create で一度だけ送ってキャッシュ名（cachedContents/...）を覚えておく
+#   以降の呼び出しは config の cached_content にその名前を渡すだけで、指示の本文は送らない
+# - キャッシュ名と期限は cache/prompt_cache.json にも残すので、1 回ごとに起動する CLI 同士でも使い回せる
+#   期限の PROMPT_CACHE_REFRESH 秒前になったら作り直す
+# - 作れなかった（指示が短すぎてキャッシュの最小トークン数に届かない等）ときは、しばらく作り直さずに
+#   system_instruction として毎回送る（呼び出し自体は失敗させない）
+# - caches.create（ネットワーク越し）はロックの外で呼ぶ。同じ指示を別スレッドが作っている間は待たずに、
+#   その回だけ指示を直接送る（ロックは record_usage / stats と共有なので、作成の遅さを持ち込まない）
+# - 使ったキャッシュが消えていた（期限切れ・削除）エラーなら、覚えた名前を捨てて指示を直接送り、1 回だけやり直す
+# - 呼び出しごとに usage_metadata のトークン数（プロンプト・うちキャッシュ分・応答）を数える
+#   metrics の llm_prompt_tokens / llm_cached_tokens / llm_response_tokens（caller ラベル）と stats()
+#
+# 設定（環境変数）:
+#   PROMPT_CACHE          … "0" でコンテキストキャッシュを使わない（既定 "1"）
+#   PROMPT_CACHE_TTL      … キャッシュの有効期間（秒、既定 3600）
+#   PROMPT_CACHE_REFRESH  … 期限の何秒前に作り直すか（既定 60）
+#   PROMPT_CACHE_FILE     … キャッシュ名の保存先（既定 python/cache/prompt_cache.json）
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import metrics
+from bootstrap import PY_DIR
+
+DEFAULT_FILE = PY_DIR / "cache" / "prompt_cache.json"
+DEFAULT_TTL = 3600
+DEFAULT_REFRESH = 60
+
+_lock = threading.Lock()
+_handles: dict | None = None  # key → {"name", "expires"} または {"retry_after"}
+_creating: set[str] = set()   # いま caches.create している key
+_usage: dict[str, dict[str, int]] = {}
+
+def enabled() -> bool:
+    return os.getenv("PROMPT_CACHE", "1") != "0"
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, "")))
+    except ValueError:
+        return default
+
+def ttl() -> int:
+    return _env_int("PROMPT_CACHE_TTL", DEFAULT_TTL) or DEFAULT_TTL
+
+def refresh_margin() -> int:
+    return _env_int("PROMPT_CACHE_REFRESH", DEFAULT_REFRESH)
+
+def state_file() -> Path:
+    return Path(os.getenv("PROMPT_CACHE_FILE") or DEFAULT_FILE)
+
+def cache_key(model: str, system: str) -> str:
+    return hashlib.sha256(f"{model}\0{system}".encode("utf-8")).hexdigest()[:16]
+
+# ---- キャッシュ名の保存（ロック中に呼ぶ） ----
+def _load() -> dict:
+    global _handles
+    try:
+        data = json.loads(state_file().read_text(encoding="utf-8"))
+        _handles = data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        _handles = _handles if _handles is not None else {}
+    except Exception as e:
+        print(f"[prompt_cache] load error: {e}", file=sys.stderr)
+        _handles = {}
+    return _handles
+
+def _save(handles: dict) -> None:
+    p = state_file()
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(handles))
+        os.replace(tmp, p)
+    except Exception as e:
+        print(f"[prompt_cache] save error: {e}", file=sys.stderr)
+
+def _expire_epoch(cached) -> float | None:
+    t = getattr(cached, "expire_time", None)
+    return t.timestamp() if hasattr(t, "timestamp") else None
+
+def handle(client, model: str, system: str) -> str | None:
+    """system のキャッシュ名を返す（無ければ作る。使えなければ None）"""
+    if not enabled() or not system or getattr(client, "caches", None) is None:
+        return None
+    key = cache_key(model, system)
+    with _lock:
+        now = time.time()
+
+        def usable(h: dict) -> bool:
+            return bool(h.get("name")) and h.get("expires", 0) - refresh_margin() > now
+
+        h = (_handles or {}).get(key) or {}
+        if not usable(h):
+            # 別のプロセスが作り直しているかもしれないので、ファイルから読み直す
+            h = _load().get(key) or {}
+        if usable(h):
+            metrics.count("prompt_cache", result="hit")
+            return h["name"]
+        if h.get("retry_after", 0) > now or key in _creating:
+            return None
+        _creating.add(key)
+
+    entry, name = None, None
+    try:
+        try:
+            cached = client.caches.create(
+                model=model,
+                config={"system_instruction": system, "ttl": f"{ttl()}s", "display_name": f"chat-agent-{key}"},
+            )
+        except Exception as e:
+            # 短すぎる指示などは作れない。期間をおいてから試し直す
+            print(f"[prompt_cache] create error: {e}", file=sys.stderr)
+            metrics.count("prompt_cache", result="error")
+            entry = {"retry_after": time.time() + ttl()}
+        else:
+            metrics.count("prompt_cache", result="create")
+            entry = {"name": cached.name, "expires": _expire_epoch(cached) or time.time() + ttl()}
+            name = cached.name
+    finally:
+        with _lock:
+            _creating.discard(key)
+            if entry is not None:
+                handles = _handles if _handles is not None else _load()
+                handles[key] = entry
+                _save(handles)
+    return name
+
+def invalidate(model: str, system: str, name: str) -> None:
+    """name が消えていた：覚えている名前が同じなら捨てる（次の呼び出しで作り直す）"""
+    key = cache_key(model, system)
+    with _lock:
+        handles = _load()
+        if (handles.get(key) or {}).get("name") == name:
+            handles.pop(key, None)
+            _save(handles)
+    metrics.count("prompt_cache", result="stale")
+
+def is_stale(e: Exception) -> bool:
+    """キャッシュが消えていた（期限切れ・削除）ことによる失敗か"""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    msg = str(e).lower()
+    return code in (400, 403, 404) and ("cache" in msg or "cached_content" in msg)
+
+def generation_config(client, model: str, system: str, base: dict) -> tuple[dict, str | None]:
+    """(generate_content に渡す config, 使ったキャッシュ名)。キャッシュが使えなければ指示を直接入れる"""
+    name = handle(client, model, system)
+    if name:
+        return {**base, "cached_content": name}, name
+    return ({**base, "system_instruction": system} if system else dict(base)), None
+
+# ---- トークン数 ----
+def record_usage(usage, caller: str) -> None:
+    if usage is None:
+        return
+    counts = {
+        "prompt": getattr(usage, "prompt_token_count", None) or 0,
+        "cached": getattr(usage, "cached_content_token_count", None) or 0,
+        "response": getattr(usage, "candidates_token_count", None) or 0,
+    }
+    with _lock:
+        u = _usage.setdefault(caller, {"calls": 0, "prompt": 0, "cached": 0, "response": 0})
+        u["calls"] += 1
+        for k, v in counts.items():
+            u[k] += v
+    for k, v in counts.items():
+        metrics.count(f"llm.{k}_tokens", v, caller=caller)
+
+def stats() -> dict:
+    """呼び出し元ごとの呼び出し回数とトークン数の合計（このプロセス内）"""
+    with _lock:
+        return {caller: dict(u) for caller, u in _usage.items()}
+
+# ---- 呼び出し ----
+def generate(client, model: str, system: str, contents: str, base: dict, caller: str):
+    """client.models.generate_content を、システム指示をキャッシュして呼ぶ"""
+    config, name = generation_config(client, model, system, base)
+    try:
+        resp = client.models.generate_content(model=model, contents=contents, config=config)
+    except Exception as e:
+        if not (name and is_stale(e)):
+            raise
+        invalidate(model, system, name)
+        resp = client.models.generate_content(model=model, contents=contents, config={**base, "system_instruction": system})
+    record_usage(getattr(resp, "usage_metadata", None), caller)
+    return resp
+
+def generate_stream(client, model: str, system: str, contents: str, base: dict, caller: str) -> Iterator:
+    """generate_content_stream 版。キャッシュが消えていたエラーが最初のチャンクより前なら、指示を直接送ってやり直す"""
+    config, name = generation_config(client, model, system, base)
+    usage = None
+    started = False
+    try:
+        for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+            started = True
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+    except Exception as e:
+        if started or not (name and is_stale(e)):
+            raise
+        invalidate(model, system, name)
+        for chunk in client.models.generate_content_stream(
+            model=model, contents=contents, config={**base, "system_instruction": system}
+        ):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+    finally:
+        # 呼び出し側が途中で打ち切っても、そこまでの分を数える
+        record_usage(usage, caller)
+
+async def agenerate(client, model: str, system: str, contents: str, base: dict, caller: str):
+    """非同期 API（client.aio）があれば使い、無ければ同期呼び出しをスレッドで回す"""
+    import asyncio
+
+    aio = getattr(client, "aio", None)
+    if aio is None:
+        return await asyncio.to_thread(generate, client, model, system, contents, base, caller)
+    # キャッシュ名の読み込み・作成はファイルとネットワークを待つので、イベントループの外で行う
+    config, name = await asyncio.to_thread(generation_config, client, model, system, base)
+    try:
+        resp = await aio.models.generate_content(model=model, contents=contents, config=config)
+    except Exception as e:
+        if not (name and is_stale(e)):
+            raise
+        await asyncio.to_thread(invalidate, model, system, name)
+        resp = await aio.models.generate_content(model=model, contents=contents, config={**base, "system_instruction": system})
+    record_usage(getattr(resp, "usage_metadata", None), caller)
+    return resp
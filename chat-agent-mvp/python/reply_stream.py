@@ -0,0 +1,123 @@
+# python/reply_stream.py
+# 役割：ストリーミング応答を「文」単位に切り出す
+# - モデルは {"reply":"..."} 形式で少しずつ返してくるので、reply の中身だけを逐次デコードする
+# - デコードできた分を 。！？ などの文末で区切り、完成した文から順に返す
+# - 文ごとに音声合成へ回せば、応答全体を待たずに最初の音声を出せる
+
+from __future__ import annotations
+
+import json
+import re
+
+# 文末記号（直後に続く閉じ括弧・引用符も同じ文に含める）
+SENTENCE_ENDS = "。！？!?\n"
+CLOSERS = "」』）)】\"'"
+
+_SENTENCE_RE = re.compile(rf"[^{SENTENCE_ENDS}]*[{SENTENCE_ENDS}]+[{re.escape(CLOSERS)}]*")
+_REPLY_KEY_RE = re.compile(r'"?reply"?\s*:\s*"', re.IGNORECASE)
+
+class SentenceSplitter:
+    """テキスト断片を受け取り、文末まで揃った文だけを返す"""
+
+    def __init__(self) -> None:
+        self._buf = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buf += text
+        out: list[str] = []
+        pos = 0
+        for m in _SENTENCE_RE.finditer(self._buf):
+            # バッファ末尾で終わる文は、記号や閉じ括弧がまだ続くかもしれないので保留
+            if m.end() == len(self._buf):
+                break
+            out.append(m.group(0))
+            pos = m.end()
+        self._buf = self._buf[pos:]
+        return out
+
+    def flush(self) -> list[str]:
+        rest, self._buf = self._buf, ""
+        return [rest] if rest else []
+
+class ReplyExtractor:
+    """
+    ストリーミング出力から reply の文字列を逐次取り出す。
+    - 先頭が { や ``` なら JSON とみなし、"reply":" の後ろを JSON 文字列としてデコード
+    - それ以外はそのまま本文として扱う
+    feed() は新たに確定した本文を返す。
+    """
+
+    def __init__(self) -> None:
+        self.raw = ""
+        self.text = ""
+        self._mode: str | None = None  # None / "json" / "plain"
+        self._pos = -1                  # JSON モードでの reply 文字列の読み取り位置
+        self._search_from = 0           # reply キーを探し始める位置（同じ所を何度も探さない）
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self._mode is None:
+            head = self.raw.lstrip()
+            if not head:
+                return ""
+            self._mode = "json" if head[0] in "{`" else "plain"
+            if self._mode == "plain":
+                return self._emit(head)
+        if self._mode == "plain":
+            return self._emit(chunk)
+        return self._emit(self._decode())
+
+    @property
+    def found(self) -> bool:
+        """本文を取り出せたか（JSON なのに reply が無かった場合は False）"""
+        return self._mode == "plain" or self._pos >= 0
+
+    def _emit(self, s: str) -> str:
+        self.text += s
+        return s
+
+    def _decode(self) -> str:
+        if self.done:
+            return ""
+        if self._pos < 0:
+            m = _REPLY_KEY_RE.search(self.raw, self._search_from)
+            if not m:
+                # キーがチャンクの境目で切れていても次回拾えるよう、少し手前から探し直す
+                self._search_from = max(0, len(self.raw) - 16)
+                return ""
+            self._pos = m.end()
+        out: list[str] = []
+        raw, i = self.raw, self._pos
+        while i < len(raw):
+            c = raw[i]
+            if c == '"':
+                self.done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            # エスケープは揃うまで待つ
+            if i + 1 >= len(raw):
+                break
+            n = 6 if raw[i + 1] == "u" else 2
+            if i + n > len(raw):
+                break
+            if n == 6 and raw[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+                # 上位サロゲート（ensure_ascii の絵文字など）は、続く \uDCxx と合わせてデコードする
+                nxt = raw[i + 6:i + 8]
+                if len(nxt) < 2 and not nxt.startswith('"'):
+                    break
+                if nxt == "\\u":
+                    n = 12
+                    if i + n > len(raw):
+                        break
+            try:
+                out.append(json.loads(f'"{raw[i:i + n]}"'))
+            except ValueError:
+                out.append(raw[i + 1:i + n])
+            i += n
+        self._pos = i
+        return "".join(out)
@@ -5,24 +5,24 @@ from datetime import datetime
 import sys
 import argparse
 
-BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+from storage import get_storage
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--date", default="")  # YYYY-MM-DD（未指定なら今日）
     args = parser.parse_args()
 
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
     d_str = args.date or datetime.now().strftime("%Y-%m-%d")
-    out_path = LOG_DIR / f"{d_str}.txt"
 
     # 確認画面の内容を「そのまま」保存（上書き）
     content = sys.stdin.read()
-    out_path.write_text(content, encoding="utf-8")
+    import diary_search
 
-    # 呼び出し側で使えるよう絶対パスを返す
-    print(str(out_path.resolve()))
+    out_path = get_storage().save_diary(d_str, content)
+    diary_search.update_diary(d_str, content)
+
+    # 呼び出し側で使えるよう保存先（ファイルなら絶対パス）を返す
+    print(out_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,194 @@
+# python/scheduler.py
+# 役割：常駐ワーカーでのモデル呼び出し・音声合成の実行順を決めるジョブスケジューラ
+# - ジョブは優先度クラスに分ける（PRIORITY の順に空きを割り当てる）
+#     interactive … チャットの応答・読み上げ（/api/ask）。待たせると会話が止まるので先に流す
+#     batch       … 日記の生成（/api/finish）や定型文の事前合成。同時実行数を絞り、チャットの邪魔をしない
+# - 同時に動かすのは全体で SCHED_WORKERS 本まで、クラスごとにも上限がある
+# - 受け付け制御：クラスの待ち行列が上限に達していたら、待たせずにすぐ Busy を送出する
+#   （retry_after はそのクラスの平均実行時間と待ち行列の長さからの目安）
+# - 同じセッションのジョブは、クラスをまたいで届いた順に 1 つずつ実行する（会話ログの追記順を保つ）
+#   session=None のジョブ（読み上げ等）は順序の制約を受けない
+# - ジョブごとに待ち時間・実行時間を記録し（job["wait"] / job["run"]）、metrics の sched.wait / sched.run にも出す
+#
+# 設定（環境変数）:
+#   SCHED_WORKERS                  … 全体の同時実行数（既定 4）
+#   SCHED_INTERACTIVE_CONCURRENCY  … interactive の同時実行数（既定 4）
+#   SCHED_INTERACTIVE_QUEUE        … interactive の待ち行列の上限（既定 16）
+#   SCHED_BATCH_CONCURRENCY        … batch の同時実行数（既定 1）
+#   SCHED_BATCH_QUEUE              … batch の待ち行列の上限（既定 4）
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import metrics
+
+PRIORITY = ("interactive", "batch")
+DEFAULTS = {
+    "interactive": {"concurrency": 4, "queue": 16},
+    "batch": {"concurrency": 1, "queue": 4},
+}
+DEFAULT_WORKERS = 4
+
+class Busy(Exception):
+    """待ち行列が満杯で受け付けなかった"""
+
+    def __init__(self, cls: str, depth: int, retry_after: float) -> None:
+        super().__init__(f"busy: {cls} queue is full ({depth} waiting)")
+        self.cls = cls
+        self.depth = depth
+        self.retry_after = retry_after
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, "")))
+    except ValueError:
+        return default
+
+def workers() -> int:
+    return _env_int("SCHED_WORKERS", DEFAULT_WORKERS) or DEFAULT_WORKERS
+
+def concurrency(cls: str) -> int:
+    return _env_int(f"SCHED_{cls.upper()}_CONCURRENCY", DEFAULTS[cls]["concurrency"]) or 1
+
+def max_queue(cls: str) -> int:
+    return _env_int(f"SCHED_{cls.upper()}_QUEUE", DEFAULTS[cls]["queue"])
+
+# ---- 状態（_cond の下で読み書きする） ----
+_cond = threading.Condition()
+_queues: dict[str, deque] = {cls: deque() for cls in PRIORITY}
+_running: dict[str, int] = {cls: 0 for cls in PRIORITY}
+_session_queues: dict[str, deque] = {}  # セッション → そのセッションの未完了ジョブ（届いた順）
+_avg_run: dict[str, float] = {cls: 0.0 for cls in PRIORITY}  # 実行時間の移動平均（秒）
+_counters = {"submitted": 0, "rejected": 0, "done": 0}
+_threads: list[threading.Thread] = []
+
+def _runnable(job: dict) -> bool:
+    s = job["session"]
+    return s is None or _session_queues[s][0] is job
+
+def _pick() -> dict | None:
+    """優先度の高いクラスから、空きがあり順番が来ているジョブを 1 つ取り出す"""
+    if sum(_running.values()) >= workers():
+        return None
+    for cls in PRIORITY:
+        if _running[cls] >= concurrency(cls):
+            continue
+        q = _queues[cls]
+        for job in q:
+            if _runnable(job):
+                q.remove(job)
+                _running[cls] += 1
+                return job
+    return None
+
+def _run_worker() -> None:
+    while True:
+        with _cond:
+            job = _pick()
+            while job is None:
+                _cond.wait()
+                job = _pick()
+        job["started"] = time.perf_counter()
+        job["wait"] = job["started"] - job["enqueued"]
+        metrics.observe("sched.wait", job["wait"], cls=job["cls"], op=job["op"])
+        try:
+            job["result"] = job["fn"]()
+        except BaseException as e:  # fn 側で包む前提だが、ワーカーを落とさない
+            print(f"[scheduler] {job['op']} error: {e}", file=sys.stderr)
+            job["error"] = e
+        job["run"] = time.perf_counter() - job["started"]
+        metrics.observe("sched.run", job["run"], cls=job["cls"], op=job["op"])
+        with _cond:
+            cls = job["cls"]
+            _running[cls] -= 1
+            _avg_run[cls] = job["run"] if not _avg_run[cls] else 0.8 * _avg_run[cls] + 0.2 * job["run"]
+            s = job["session"]
+            if s is not None:
+                sq = _session_queues[s]
+                sq.popleft()
+                if not sq:
+                    del _session_queues[s]
+            _counters["done"] += 1
+            _cond.notify_all()
+        if job["on_done"] is not None:
+            try:
+                job["on_done"](job)
+            except Exception as e:
+                print(f"[scheduler] on_done error: {e}", file=sys.stderr)
+        job["done"].set()  # on_done（応答の書き出し）が済んでから待っている側を起こす
+
+def _ensure_workers() -> None:
+    """ワーカースレッドを SCHED_WORKERS 本まで起こす（_cond の下で呼ぶ）"""
+    while len(_threads) < workers():
+        t = threading.Thread(target=_run_worker, name=f"sched-{len(_threads)}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+def submit(
+    op: str,
+    cls: str,
+    fn: Callable[[], object],
+    *,
+    session: str | None = None,
+    on_done: Callable[[dict], None] | None = None,
+) -> dict:
+    """
+    fn を cls の待ち行列に入れてジョブ（dict）を返す。終わると on_done(job) が呼ばれ、job["done"] がセットされる。
+    待ち行列が満杯なら Busy を送出する（fn は実行しない）
+    """
+    if cls not in _queues:
+        raise ValueError(f"unknown class: {cls}")
+    job = {
+        "op": op, "cls": cls, "session": session, "fn": fn, "on_done": on_done,
+        "enqueued": time.perf_counter(), "done": threading.Event(),
+        "wait": 0.0, "run": 0.0, "result": None, "error": None,
+    }
+    with _cond:
+        q = _queues[cls]
+        if len(q) >= max_queue(cls):
+            _counters["rejected"] += 1
+            retry_after = max(1.0, _avg_run[cls] * (len(q) + 1) / concurrency(cls))
+            metrics.count("sched.rejected", cls=cls, op=op)
+            raise Busy(cls, len(q), round(retry_after, 1))
+        _counters["submitted"] += 1
+        q.append(job)
+        if session is not None:
+            _session_queues.setdefault(session, deque()).append(job)
+        _ensure_workers()
+        _cond.notify_all()
+    return job
+
+def run(op: str, cls: str, fn: Callable[[], object], *, session: str | None = None) -> dict:
+    """submit して終わるまで待ち、ジョブを返す"""
+    job = submit(op, cls, fn, session=session)
+    job["done"].wait()
+    return job
+
+def join() -> None:
+    """受け付けたジョブがすべて終わるまで待つ（終了前に応答を書き切るため）"""
+    with _cond:
+        while any(_queues.values()) or any(_running.values()):
+            _cond.wait()
+
+def stats() -> dict:
+    with _cond:
+        return {
+            **_counters,
+            "classes": {
+                cls: {
+                    "waiting": len(_queues[cls]),
+                    "running": _running[cls],
+                    "concurrency": concurrency(cls),
+                    "maxQueue": max_queue(cls),
+                    "avgRunMs": round(_avg_run[cls] * 1000, 1),
+                }
+                for cls in PRIORITY
+            },
+            "workers": workers(),
+        }
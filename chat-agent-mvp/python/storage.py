@@ -0,0 +1,550 @@
+# python/storage.py
+# 役割：日記と会話ログの保存先を切り替えられるストレージ層
+# - FileStorage   … 従来どおり logs/YYYY-MM-DD.txt と logs/conversation.txt（既定）
+# - SQLiteStorage … 1 つの DB ファイルに diaries / turns テーブル（WAL、プレースホルダ付き SQL、接続は 1 本を共有）
+# - diary_get / diary_save / diary_delete / diary_list_month / history / dump_logs / agent はすべて get_storage() 経由
+# - 会話ログはセッション ID ごとに分ける（"" は従来の conversation.txt）。複数ユーザーが同時に話しても混ざらない
+# - ファイル形式の日記の保存・削除は write_journal を通す（同時に来た保存をまとめて 1 回の fsync で確定する）
+#   途中で止まった保存の反映（recover）は、開くたびではなく常駐ワーカーの起動時と storage.py --recover で行う
+# - ファイル形式の会話ログはセグメント単位でローテーション・圧縮する（conv_log）。iter_conversation で少しずつ読める
+# - read_conversation_since でカーソル以降の会話だけを読める。get_state / put_state は生成処理の途中状態の置き場
+#   （ファイル形式は logs/.index/state/<key>.json、SQLite は state テーブル）
+#
+# 設定（環境変数）:
+#   STORAGE_BACKEND … "file"（既定）または "sqlite"
+#   STORAGE_DB      … SQLite のファイルパス（既定 python/data/diary.db）
+#   STORAGE_LOG_DIR … ファイル形式の置き場所（既定 python/logs。ベンチマーク等で差し替える）
+#
+# CLI:
+#   python storage.py --migrate   logs/ の日記と全セッションの会話ログを SQLite へ取り込む（何度実行しても同じ結果）
+#   python storage.py --recover   write_journal に残った未反映の保存を日記ファイルへ書き直す
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from bootstrap import CONV_PATH, LOG_DIR, PY_DIR
+
+# conv_log / month_index / write_journal / context_window は使うメソッドの中で読み込む
+# （diary_get など 1 つの操作しかしない CLI の起動を軽くする）
+
+DEFAULT_DB = PY_DIR / "data" / "diary.db"
+
+_DIARY_FILE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})\.txt")
+_SESSION_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_STATE_KEY_RE = re.compile(r"[A-Za-z0-9_.-]{1,128}")
+
+def check_session(session: str | None) -> str:
+    """セッション ID を検査して返す（空なら既定セッション ""）。不正は ValueError"""
+    session = (session or "").strip()
+    if session and not _SESSION_RE.fullmatch(session):
+        raise ValueError("invalid session")
+    return session
+
+def check_state_key(key: str) -> str:
+    if not _STATE_KEY_RE.fullmatch(key or ""):
+        raise ValueError("invalid state key")
+    return key
+
+def format_turn(user_text: str, assistant_text: str) -> str:
+    return f"[USER] {user_text}\n[ASSISTANT] {assistant_text}\n"
+
+def parse_turns(text: str) -> list[tuple[str, str]]:
+    """conversation.txt 形式のテキストを (user, assistant) の列に戻す"""
+    turns: list[list[str]] = []
+    field = -1
+    for line in text.splitlines():
+        if line.startswith("[USER] "):
+            turns.append([line[len("[USER] "):], ""])
+            field = 0
+        elif line.startswith("[ASSISTANT] ") and turns and field == 0:
+            turns[-1][1] = line[len("[ASSISTANT] "):]
+            field = 1
+        elif turns and field >= 0:
+            # 複数行の発話は直前の項目に続ける
+            turns[-1][field] += "\n" + line
+    return [(u, a) for u, a in turns]
+
+# ---- ファイル ----
+class FileStorage:
+    name = "file"
+
+    def __init__(self, log_dir: Path = LOG_DIR, conv_path: Path = CONV_PATH) -> None:
+        self.log_dir = log_dir
+        self.conv_path = conv_path
+
+    def recover(self) -> int:
+        """前回途中で止まった保存を反映する（ジャーナルを読み直して fsync するので、プロセスごとに 1 回だけ呼ぶ）"""
+        import write_journal
+
+        try:
+            return write_journal.recover(self.log_dir)
+        except Exception as e:
+            print(f"[storage] journal recover error: {e}", file=sys.stderr)
+            return 0
+
+    def conv_path_for(self, session: str = "") -> Path:
+        session = check_session(session)
+        if not session:
+            return self.conv_path
+        return self.log_dir / "sessions" / f"{session}.txt"
+
+    # 日記
+    def get_diary(self, date: str) -> str:
+        p = self.log_dir / f"{date}.txt"
+        try:
+            return p.read_text(encoding="utf-8")
+        except Exception:
+            return ""
+
+    def save_diary(self, date: str, content: str) -> str:
+        import write_journal
+
+        # 同時に来た保存とまとめて確定する（ジャーナルへの fsync は 1 回、日記は一時ファイル → rename）
+        return str(write_journal.write(self.log_dir, date, content).resolve())
+
+    def delete_diary(self, date: str) -> str:
+        import write_journal
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        return str(write_journal.delete(self.log_dir, date).resolve())
+
+    def month_days(self, y: int, m: int) -> dict:
+        import month_index
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        return month_index.month_days(self.log_dir, y, m)
+
+    def range_days(self, date_from: str, date_to: str) -> dict:
+        """期間内の記録がある日の {date: {"preview", "chars"}}（月インデックス経由、走査は多くても 1 回）"""
+        import month_index
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        days = month_index.range_days(self.log_dir, date_from, date_to)
+        return {d: {"preview": e["preview"], "chars": e["chars"]} for d, e in days.items()}
+
+    def iter_diaries(self, date_from: str = "", date_to: str = ""):
+        """(date, content) を日付順に 1 件ずつ返す（本文は 1 件ずつ読むので、件数が多くてもメモリは一定）"""
+        if not self.log_dir.exists():
+            return
+        dates = []
+        with os.scandir(self.log_dir) as it:
+            for de in it:
+                m = _DIARY_FILE_RE.fullmatch(de.name)
+                if m and (not date_from or m.group(1) >= date_from) and (not date_to or m.group(1) <= date_to):
+                    dates.append(m.group(1))
+        for d in sorted(dates):
+            try:
+                yield d, (self.log_dir / f"{d}.txt").read_text(encoding="utf-8")
+            except FileNotFoundError:
+                continue  # 走査後に消えた
+
+    def save_diaries(self, items: list[tuple[str, str]]) -> int:
+        """まとめて 1 回で確定する（1 件ずつ一時ファイル → rename、月インデックスの更新は月ごとに 1 回）"""
+        import write_journal
+
+        write_journal.submit(self.log_dir, list(items))
+        return len(items)
+
+    # 会話ログ
+    def append_turn(self, user_text: str, assistant_text: str, session: str = "") -> None:
+        import conv_log
+
+        conv_log.append(self.conv_path_for(session), format_turn(user_text, assistant_text))
+
+    def read_conversation(self, session: str = "") -> str:
+        import conv_log
+
+        return conv_log.read_all(self.conv_path_for(session))
+
+    def sessions(self) -> list[str]:
+        """会話ログのあるセッション ID（既定セッション "" を含む）"""
+        found = {""}
+        d = self.log_dir / "sessions"
+        if d.is_dir():
+            with os.scandir(d) as it:
+                for de in it:
+                    name = de.name.removesuffix(".txt").removesuffix(".segments")
+                    if name != de.name and _SESSION_RE.fullmatch(name):
+                        found.add(name)
+        return sorted(found)
+
+    def iter_conversation(self, session: str = ""):
+        """会話ログを古い方からテキストの塊で返す（閉じたセグメントも含め、全体をメモリに載せない）"""
+        import conv_log
+
+        return conv_log.iter_text(self.conv_path_for(session))
+
+    def reset_conversation(self, session: str = "") -> None:
+        import conv_log
+        from context_window import reset_summary
+
+        p = self.conv_path_for(session)
+        # セッションのログは空にするより消してしまう（溜まらないように）
+        conv_log.reset(p, keep_file=p == self.conv_path)
+        reset_summary(p)
+
+    def conversation_context(self, max_chars: int | None = None, session: str = "") -> tuple[str, str]:
+        from context_window import build_context
+
+        return build_context(self.conv_path_for(session), max_chars)
+
+    def read_conversation_since(self, cursor: dict | None = None, session: str = "") -> tuple[str, dict, bool]:
+        """
+        cursor（前回返したもの）以降に追記された会話だけを読む。戻り値は (テキスト, 新しいカーソル, 差分かどうか)。
+        カーソルはログの世代（epoch）と論理オフセット。ログが初期化されて世代が変わっていれば、
+        先頭から全部読んで False を返す
+        """
+        import conv_log
+
+        p = self.conv_path_for(session)
+        gen = conv_log.epoch(p)
+        end = conv_log.end_offset(p)
+        off = (cursor or {}).get("offset")
+        is_delta = bool(cursor) and cursor.get("epoch") == gen and isinstance(off, int) and 0 <= off <= end
+        start = off if is_delta else 0
+        text = conv_log.read_range(p, start, end)
+        return text, {"epoch": gen, "offset": end}, is_delta
+
+    # 生成処理の途中状態（dump_logs の差分生成など）
+    def _state_path(self, key: str) -> Path:
+        import month_index
+
+        return self.log_dir / month_index.INDEX_DIRNAME / "state" / f"{check_state_key(key)}.json"
+
+    def get_state(self, key: str) -> dict | None:
+        try:
+            data = json.loads(self._state_path(key).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def put_state(self, key: str, value: dict) -> None:
+        p = self._state_path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, p)
+
+    def delete_state(self, key: str) -> None:
+        self._state_path(key).unlink(missing_ok=True)
+
+# ---- SQLite ----
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diaries (
+    date       TEXT PRIMARY KEY,
+    content    TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    user       TEXT NOT NULL,
+    assistant  TEXT NOT NULL,
+    session    TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS state (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+class SQLiteStorage:
+    name = "sqlite"
+
+    def __init__(self, db_path: Path = DEFAULT_DB) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 常駐ワーカーでは複数スレッドから使うので、1 本の接続をロックで守って共有する
+        self._lock = threading.Lock()
+        import sqlite3  # SQLite バックエンドを使うときだけ読み込む
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # session 列の無い古い DB に列を足す
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(turns)")}
+        if "session" not in cols:
+            self._conn.execute("ALTER TABLE turns ADD COLUMN session TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id)")
+
+    def _location(self, date: str) -> str:
+        return f"{self.db_path.resolve()}#{date}"
+
+    # 日記
+    def get_diary(self, date: str) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM diaries WHERE date = ?", (date,)).fetchone()
+        return row[0] if row else ""
+
+    def save_diary(self, date: str, content: str) -> str:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO diaries (date, content, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(date) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at",
+                (date, content, datetime.now().isoformat(timespec="seconds")),
+            )
+        return self._location(date)
+
+    def delete_diary(self, date: str) -> str:
+        with self._lock:
+            self._conn.execute("DELETE FROM diaries WHERE date = ?", (date,))
+        return self._location(date)
+
+    def month_days(self, y: int, m: int) -> dict:
+        import month_index
+
+        lo = f"{y:04d}-{m:02d}-01"
+        hi = f"{y:04d}-{m:02d}-31"
+        # プレビューは先頭 20 文字だけなので、本文全体は取り出さない
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, substr(content, 1, 400), length(content) FROM diaries "
+                "WHERE date BETWEEN ? AND ? ORDER BY date",
+                (lo, hi),
+            ).fetchall()
+        return {
+            d: {"date": d, "hasLog": True, "preview": month_index.preview_20(head), "size": size}
+            for d, head, size in rows
+        }
+
+    def range_days(self, date_from: str, date_to: str) -> dict:
+        import month_index
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, substr(content, 1, 400), length(content) FROM diaries "
+                "WHERE date BETWEEN ? AND ? ORDER BY date",
+                (date_from, date_to),
+            ).fetchall()
+        return {d: {"preview": month_index.preview_20(head), "chars": n} for d, head, n in rows}
+
+    def iter_diaries(self, date_from: str = "", date_to: str = "", page: int = 200):
+        """日付順に返す。page 件ずつ日付でページングして読むので、全件をメモリに載せない"""
+        last = date_from
+        hi = date_to or "9999-99-99"
+        op = ">="
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT date, content FROM diaries WHERE date {op} ? AND date <= ? ORDER BY date LIMIT ?",
+                    (last, hi, page),
+                ).fetchall()
+            yield from rows
+            if len(rows) < page:
+                return
+            last, op = rows[-1][0], ">"
+
+    def save_diaries(self, items: list[tuple[str, str]]) -> int:
+        """まとめて 1 トランザクションで保存する"""
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO diaries (date, content, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(date) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at",
+                    [(d, c, now) for d, c in items],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(items)
+
+    # 会話ログ
+    def append_turn(self, user_text: str, assistant_text: str, session: str = "") -> None:
+        session = check_session(session)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO turns (created_at, user, assistant, session) VALUES (?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), user_text, assistant_text, session),
+            )
+
+    def read_conversation(self, session: str = "") -> str:
+        session = check_session(session)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user, assistant FROM turns WHERE session = ? ORDER BY id", (session,)
+            ).fetchall()
+        return "".join(format_turn(u, a) for u, a in rows)
+
+    def reset_conversation(self, session: str = "") -> None:
+        session = check_session(session)
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE session = ?", (session,))
+
+    def conversation_context(self, max_chars: int | None = None, session: str = "") -> tuple[str, str]:
+        """
+        新しいターンから遡って予算に収まる分を直近ログにし、
+        その手前の数ターンを抽出型の要約に畳む（範囲読みなので要約の保存は不要）
+        """
+        from context_window import char_budget, fold_turns, summary_budget
+
+        session = check_session(session)
+        max_chars = max_chars or char_budget()
+        old_budget = summary_budget() * 8
+        recent: list[str] = []
+        older: list[str] = []
+        total = 0
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT user, assistant FROM turns WHERE session = ? ORDER BY id DESC", (session,)
+            )
+            for u, a in cur:
+                t = format_turn(u, a)
+                if not older and (total + len(t) <= max_chars or not recent):
+                    recent.append(t)
+                    total += len(t)
+                    continue
+                older.append(t)
+                old_budget -= len(t)
+                if old_budget <= 0:
+                    break
+            cur.close()
+        summary = fold_turns("", "".join(reversed(older)), summary_budget()) if older else ""
+        return summary, "".join(reversed(recent))
+
+    def read_conversation_since(self, cursor: dict | None = None, session: str = "") -> tuple[str, dict, bool]:
+        """
+        cursor（前回返したもの）以降のターンだけを読む。カーソルは最後に読んだターンの id。
+        そのターンが消えていれば（会話の初期化）先頭から全部読んで False を返す
+        """
+        session = check_session(session)
+        last = (cursor or {}).get("id")
+        with self._lock:
+            is_delta = isinstance(last, int) and (
+                last == 0
+                or self._conn.execute("SELECT 1 FROM turns WHERE id = ? AND session = ?", (last, session)).fetchone()
+                is not None
+            )
+            since = last if is_delta else 0
+            rows = self._conn.execute(
+                "SELECT id, user, assistant FROM turns WHERE session = ? AND id > ? ORDER BY id", (session, since)
+            ).fetchall()
+        text = "".join(format_turn(u, a) for _, u, a in rows)
+        return text, {"id": rows[-1][0] if rows else since}, is_delta
+
+    def iter_conversation(self, session: str = ""):
+        session = check_session(session)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user, assistant FROM turns WHERE session = ? ORDER BY id", (session,)
+            ).fetchall()
+        for u, a in rows:
+            yield format_turn(u, a)
+
+    # 生成処理の途中状態
+    def get_state(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (check_state_key(key),)).fetchone()
+        try:
+            data = json.loads(row[0]) if row else None
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def put_state(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO state (key, value, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (check_state_key(key), json.dumps(value, ensure_ascii=False), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def delete_state(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (check_state_key(key),))
+
+    def import_from(self, src: FileStorage) -> dict:
+        """
+        ファイル形式の日記と全セッションの会話ログを 1 トランザクションで取り込む。
+        同じ日付の日記は上書きし、取り込むセッションの会話はファイルの内容で置き換える
+        （何度実行しても重複しない）
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        diaries = [(d, c, now) for d, c in src.iter_diaries()]
+        sessions = src.sessions()
+        turns = [
+            (now, u, a, session)
+            for session in sessions
+            for u, a in parse_turns(src.read_conversation(session))
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO diaries (date, content, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(date) DO UPDATE SET content = excluded.content, updated_at = excluded.updated_at",
+                    diaries,
+                )
+                self._conn.executemany("DELETE FROM turns WHERE session = ?", [(s,) for s in sessions])
+                self._conn.executemany(
+                    "INSERT INTO turns (created_at, user, assistant, session) VALUES (?, ?, ?, ?)", turns
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"diaries": len(diaries), "turns": len(turns), "sessions": len(sessions)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# ---- 選択 ----
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """環境変数 STORAGE_BACKEND に応じたストレージを 1 プロセスにつき 1 つ返す"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = (os.getenv("STORAGE_BACKEND") or "file").lower()
+            if backend == "sqlite":
+                _storage = SQLiteStorage(Path(os.getenv("STORAGE_DB") or DEFAULT_DB))
+            elif backend == "file":
+                log_dir = Path(os.getenv("STORAGE_LOG_DIR") or LOG_DIR)
+                _storage = FileStorage(log_dir, log_dir / "conversation.txt")
+            else:
+                raise ValueError(f"unknown STORAGE_BACKEND: {backend}")
+        return _storage
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true", help="logs/ の内容を SQLite へ取り込む")
+    parser.add_argument("--recover", action="store_true", help="write_journal の未反映分を日記ファイルへ書き直す")
+    parser.add_argument("--db", default=os.getenv("STORAGE_DB") or str(DEFAULT_DB))
+    parser.add_argument("--logs", default=str(LOG_DIR))
+    args = parser.parse_args()
+
+    if not (args.migrate or args.recover):
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+
+    log_dir = Path(args.logs)
+    src = FileStorage(log_dir, log_dir / "conversation.txt")
+    recovered = src.recover()
+    if not args.migrate:
+        print(json.dumps({"ok": True, "recovered": recovered}, ensure_ascii=False))
+        return
+    db = SQLiteStorage(Path(args.db))
+    try:
+        counts = db.import_from(src)
+    finally:
+        db.close()
+    print(json.dumps({"ok": True, "db": str(Path(args.db).resolve()), **counts}, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# python/tests/conftest.py
+# テスト共通：bench/fakes の偽 genai.Client / gTTS を使い、ログ・キャッシュは一時ディレクトリへ向ける
+# - API キーもネットワークも不要（python -m pytest -q tests で動く）
+# - プロセス内で使い回している Client・ストレージ・キャッシュの状態はテストごとに作り直す
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+PY_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = PY_DIR / "bench"
+
+_paths = [str(BENCH_DIR / "fakes")]
+if importlib.util.find_spec("dotenv") is None:
+    _paths.append(str(BENCH_DIR / "fakes_optional"))
+_paths.append(str(PY_DIR))
+for p in reversed(_paths):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+@pytest.fixture(autouse=True)
+def fake_env(tmp_path, monkeypatch):
+    env = {
+        "GEMINI_API_KEY": "test",
+        "STORAGE_BACKEND": "file",
+        "STORAGE_LOG_DIR": str(tmp_path / "logs"),
+        "SEARCH_INDEX": str(tmp_path / "search.db"),
+        "LLM_CACHE_DIR": str(tmp_path / "llm"),
+        "TTS_CACHE_DIR": str(tmp_path / "tts"),
+        "TTS_CACHE_MAX_BYTES": "0",
+        "PROMPT_CACHE_FILE": str(tmp_path / "prompt_cache.json"),
+        "BENCH_LLM_LATENCY": "0",
+        "BENCH_LLM_TTFT": "0",
+        "DIARY_FSYNC": "0",
+    }
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    for k in ("BENCH_LLM_SLOW_P", "BENCH_LLM_FAIL_P", "METRICS", "LLM_HEDGE"):
+        monkeypatch.delenv(k, raising=False)
+
+    import agent
+    import dump_logs
+    import llm_policy
+    import prompt_cache
+    import storage
+
+    monkeypatch.setattr(agent, "_client", None)
+    monkeypatch.setattr(dump_logs, "_client", None)
+    monkeypatch.setattr(storage, "_storage", None)
+    monkeypatch.setattr(prompt_cache, "_handles", None)
+    monkeypatch.setattr(prompt_cache, "_creating", set())
+    monkeypatch.setattr(prompt_cache, "_usage", {})
+    monkeypatch.setattr(llm_policy, "_latency", {})
+    monkeypatch.setattr(llm_policy, "_breakers", {})
+    monkeypatch.setattr(llm_policy, "_counters", {})
+    return tmp_path
+
+@pytest.fixture
+def fake_client():
+    """agent / dump_logs が使う偽 genai.Client（同じものを両方に入れる）"""
+    import agent
+    import dump_logs
+
+    client = agent.get_client()
+    dump_logs._client = client
+    return client
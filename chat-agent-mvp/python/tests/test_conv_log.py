@@ -0,0 +1,88 @@
+# python/tests/test_conv_log.py
+# conv_log（サイズ・日付でのローテーションと gzip、論理オフセット・epoch、セグメントをまたぐ読み出し）
+
+from __future__ import annotations
+
+import pytest
+
+import conv_log
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONV_SEGMENT_BYTES", "64")
+    monkeypatch.setenv("CONV_ROTATE_DAILY", "1")
+    return tmp_path / "logs" / "conversation.txt"
+
+def _lines(n: int) -> list[str]:
+    return [f"ユーザ: {i:03d} 行目の発話\n" for i in range(n)]
+
+def test_rotation_compresses_closed_segments(log):
+    lines = _lines(10)
+    for line in lines:
+        conv_log.append(log, line)
+    m = conv_log.manifest(log)
+    assert len(m["segments"]) >= 2
+    assert all(s["file"].endswith(".txt.gz") for s in m["segments"])
+    assert not list(conv_log.segment_dir(log).glob("[0-9]*.txt"))
+    # 論理オフセットは連結したときのバイト位置
+    starts = [s["start"] for s in m["segments"]]
+    assert starts[0] == 0
+    for prev, seg in zip(m["segments"], m["segments"][1:]):
+        assert seg["start"] == prev["start"] + prev["bytes"]
+    assert m["base"] == m["segments"][-1]["start"] + m["segments"][-1]["bytes"]
+    assert conv_log.read_all(log) == "".join(lines)
+    assert conv_log.end_offset(log) == len("".join(lines).encode("utf-8"))
+
+def test_read_range_and_offset_across_rotated_segment(log):
+    lines = _lines(10)
+    for line in lines:
+        conv_log.append(log, line)
+    whole = "".join(lines).encode("utf-8")
+    seg = conv_log.manifest(log)["segments"][0]
+    # 閉じたセグメントの途中からアクティブまで
+    lo, hi = seg["start"] + seg["bytes"] - len(lines[0].encode("utf-8")), len(whole)
+    assert conv_log.read_range(log, lo, hi) == whole[lo:hi].decode("utf-8")
+    assert conv_log.read_all(log, start=lo) == whole[lo:].decode("utf-8")
+
+def test_read_tail_pulls_from_previous_segment(log):
+    lines = _lines(10)
+    for line in lines:
+        conv_log.append(log, line)
+    text, start = conv_log.read_tail(log, max_chars=3 * len(lines[0]))
+    assert text == "".join(lines[-3:])
+    whole = "".join(lines).encode("utf-8")
+    assert whole[start:].decode("utf-8") == text
+
+def test_daily_rotation(log, monkeypatch):
+    monkeypatch.setenv("CONV_SEGMENT_BYTES", "0")
+    monkeypatch.setattr(conv_log, "_today", lambda: "2025-01-01")
+    conv_log.append(log, "一日目\n")
+    monkeypatch.setattr(conv_log, "_today", lambda: "2025-01-02")
+    conv_log.append(log, "二日目\n")
+    segs = conv_log.manifest(log)["segments"]
+    assert [(s["opened"], s["closed"]) for s in segs] == [("2025-01-01", "2025-01-02")]
+    assert conv_log.read_all(log) == "一日目\n二日目\n"
+
+def test_reset_changes_epoch_and_clears_segments(log):
+    for line in _lines(10):
+        conv_log.append(log, line)
+    before = conv_log.epoch(log)
+    conv_log.reset(log)
+    assert conv_log.epoch(log) != before
+    assert conv_log.read_all(log) == ""
+    assert conv_log.end_offset(log) == 0
+    assert not list(conv_log.segment_dir(log).glob("[0-9]*.txt*"))
+
+def test_half_compressed_segment_is_still_readable(log):
+    lines = _lines(10)
+    for line in lines:
+        conv_log.append(log, line)
+    # 圧縮の途中で落ちた：マニフェストは .gz を指すが、残っているのは元の .txt
+    import gzip
+
+    d = conv_log.segment_dir(log)
+    seg = conv_log.manifest(log)["segments"][0]
+    gz = d / seg["file"]
+    (d / seg["file"][:-3]).write_bytes(gzip.decompress(gz.read_bytes()))
+    gz.unlink()
+    assert conv_log.read_all(log) == "".join(lines)
@@ -0,0 +1,79 @@
+# python/tests/test_diary_search.py
+# diary_search（SQLite の bigram インデックス）の差分更新・削除・順位付け
+
+from __future__ import annotations
+
+import sqlite3
+
+import diary_search
+import storage
+
+def _save(date: str, content: str) -> None:
+    storage.get_storage().save_diary(date, content)
+    diary_search.update_diary(date, content)
+
+def _dates(query: str, **kw) -> list[str]:
+    return [r["date"] for r in diary_search.search(query, **kw)["results"]]
+
+def test_first_search_builds_index_from_storage():
+    storage.get_storage().save_diary("2025-01-01", "公園を散歩した")
+    assert _dates("公園") == ["2025-01-01"]
+
+def test_update_replaces_only_that_day(fake_env):
+    _save("2025-01-01", "公園を散歩した")
+    _save("2025-01-02", "図書館で本を読んだ")
+    _save("2025-01-01", "海に行った")
+    assert _dates("公園") == []
+    assert _dates("海") == ["2025-01-01"]
+    assert _dates("図書館") == ["2025-01-02"]
+
+    conn = sqlite3.connect(fake_env / "search.db")
+    dates = {d for (d,) in conn.execute("SELECT DISTINCT date FROM postings WHERE gram = '公園'")}
+    assert dates == set()
+
+def test_remove_diary():
+    _save("2025-01-01", "公園を散歩した")
+    _save("2025-01-02", "公園で遊んだ")
+    diary_search.remove_diary("2025-01-01")
+    assert _dates("公園") == ["2025-01-02"]
+
+def test_ranking_and_date_filter():
+    _save("2025-01-01", "公園。" + "今日は長い一日で、いろいろなことがあった。" * 5)
+    _save("2025-01-02", "公園、公園、また公園")
+    _save("2025-02-01", "公園に行った")
+    assert _dates("公園")[0] == "2025-01-02"
+    assert _dates("公園", date_from="2025-01-02", date_to="2025-01-31") == ["2025-01-02"]
+    assert diary_search.search("公園", limit=1)["total"] == 3
+
+def test_single_char_and_normalized_query():
+    _save("2025-01-01", "ＡＢＣの海")
+    assert _dates("海") == ["2025-01-01"]
+    assert _dates("abc") == ["2025-01-01"]
+
+def test_separate_connection_sees_updates(fake_env):
+    # 別プロセス（CLI）からの書き込みも、次の検索で見える
+    _save("2025-01-01", "公園を散歩した")
+    conn = sqlite3.connect(fake_env / "search.db", isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO docs (date, len) VALUES ('2025-03-01', 2)")
+    conn.execute("INSERT INTO postings (gram, date, tf) VALUES ('公園', '2025-03-01', 1)")
+    conn.execute("COMMIT")
+    conn.close()
+    storage.get_storage().save_diary("2025-03-01", "公園")
+    assert set(_dates("公園")) == {"2025-01-01", "2025-03-01"}
+
+def test_single_char_query_uses_gram_range(fake_env):
+    _save("2025-01-01", "海と山と海")
+    _save("2025-01-02", "山")
+    assert _dates("山") == ["2025-01-02", "2025-01-01"]
+    assert _dates("海") == ["2025-01-01"]
+    conn = sqlite3.connect(fake_env / "search.db")
+    # 末尾の文字も含め、1 回の出現は 1 回として数える
+    tf = dict(conn.execute(
+        "SELECT date, SUM(tf) FROM postings WHERE gram >= '海' AND gram <= ? GROUP BY date", ("海\U0010ffff",)
+    ))
+    assert tf == {"2025-01-01": 2}
+    plan = " ".join(r[-1] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT date, SUM(tf) FROM postings WHERE gram >= ? AND gram <= ? GROUP BY date", ("海", "海\U0010ffff")
+    ))
+    assert "SEARCH" in plan and "SCAN postings" not in plan
@@ -0,0 +1,106 @@
+# python/tests/test_dump_logs.py
+# dump_logs.generate_range（期間まとめて生成）を偽クライアントで動かす
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+import dump_logs
+import storage
+
+DATES = ["2025-01-01", "2025-01-02", "2025-01-03"]
+
+def _seed(dates=DATES) -> None:
+    store = storage.get_storage()
+    for d in dates:
+        store.save_diary(d, f"{d} のメモ：公園に行った")
+
+def _run(dates=DATES, **kw) -> dict:
+    return asyncio.run(dump_logs.generate_range(dates, concurrency=2, **kw))
+
+def test_generate_range_saves_each_day(fake_client):
+    _seed()
+    summary = _run()
+    assert summary["dates"] == 3 and summary["ok"] == 3
+    assert [r["date"] for r in summary["results"]] == DATES
+    assert "公園で友達と過ごした一日" in storage.get_storage().get_diary("2025-01-02")
+
+def test_generate_range_skips_days_without_records(fake_client):
+    _seed(DATES[:1])
+    summary = _run(DATES[:2])
+    assert summary["ok"] == 1 and summary["skipped"] == 1
+
+def test_storage_calls_run_off_the_event_loop(fake_client, monkeypatch):
+    _seed()
+    store = storage.get_storage()
+    seen: list[str] = []
+    save = store.save_diary
+
+    def spy(date, content):
+        seen.append(threading.current_thread().name)
+        return save(date, content)
+
+    monkeypatch.setattr(store, "save_diary", spy)
+    _run()
+    assert len(seen) == 3
+    assert threading.main_thread().name not in seen
+
+def test_save_failure_is_reported_per_date(fake_client, monkeypatch):
+    _seed()
+    store = storage.get_storage()
+    save = store.save_diary
+
+    def flaky(date, content):
+        if date == "2025-01-02":
+            raise OSError("disk full")
+        return save(date, content)
+
+    monkeypatch.setattr(store, "save_diary", flaky)
+    summary = _run()
+    assert summary["ok"] == 2 and summary["error"] == 1
+    bad = next(r for r in summary["results"] if r["date"] == "2025-01-02")
+    assert bad["status"] == "error" and "disk full" in bad["error"]
+
+def test_unexpected_error_keeps_summary(fake_client, monkeypatch):
+    # 保存の外（日記の読み込み）で想定外の例外が出ても、他の日の結果と集計は返る
+    _seed()
+    store = storage.get_storage()
+    get = store.get_diary
+
+    def broken(date):
+        if date == "2025-01-01":
+            raise RuntimeError("read failed")
+        return get(date)
+
+    monkeypatch.setattr(store, "get_diary", broken)
+    summary = _run()
+    assert summary["ok"] == 2 and summary["error"] == 1
+    assert [r["date"] for r in summary["results"]] == DATES
+    assert summary["results"][0]["error"] == "read failed"
+
+@pytest.mark.parametrize("bad", [["2025-01-01", "2025-13-01"], ["2025-02-03", "2025-02-01"]])
+def test_date_range_rejects_bad_input(bad):
+    with pytest.raises(ValueError):
+        dump_logs.date_range(*bad)
+
+@pytest.mark.parametrize("argv", [
+    ["--date", "2025-02-30"],
+    ["--date", "../etc"],
+    ["--from", "2025-01-01", "--to", "20250105"],
+    ["--date", "2025-01-01", "--session", "a/b"],
+])
+def test_cli_rejects_malformed_input_without_traceback(argv, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["dump_logs.py", *argv])
+    with pytest.raises(SystemExit) as exc:
+        dump_logs.main()
+    assert exc.value.code == 2
+    err = capsys.readouterr().err
+    assert "invalid" in err and "Traceback" not in err
+
+def test_generate_diary_rejects_bad_date(fake_client):
+    with pytest.raises(ValueError):
+        dump_logs.generate_diary("2025-1-1")
+    assert fake_client.models.calls == 0
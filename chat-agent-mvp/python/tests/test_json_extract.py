@@ -0,0 +1,55 @@
+# python/tests/test_json_extract.py
+# json_extract（壊れた・深すぎる出力）と、agent のキャッシュ済み応答が読めなかったときの扱い
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from json_extract import ObjectScanner, find_object
+
+DEEP = '{"reply": ' + "[" * 100_000 + "]" * 100_000 + "}"
+
+def test_find_object_skips_too_deep_json():
+    assert find_object(DEEP, "reply") is None
+    assert find_object("前置き " + DEEP + ' {"reply": "ok"}', "reply") == {"reply": "ok"}
+
+def test_scanner_skips_too_deep_json_across_chunks():
+    sc = ObjectScanner("reply")
+    text = DEEP + '{"reply": "ok"}'
+    for i in range(0, len(text), 4096):
+        sc.feed(text[i:i + 4096])
+    assert sc.result == {"reply": "ok"}
+
+@pytest.mark.parametrize("raw, expected", [
+    ('```json\n{"reply": "はい"}\n```', {"reply": "はい"}),
+    ('{"a": "}"} {"reply": "x\\"}"}', {"reply": 'x"}'}),
+    ("reply なし", None),
+])
+def test_find_object(raw, expected):
+    assert find_object(raw, "reply") == expected
+
+def test_agent_evicts_unreadable_cached_reply(fake_client, monkeypatch):
+    import agent
+    import json_extract
+    import llm_cache
+
+    prompt = agent.build_prompt("", "雨", "")
+    llm_cache.put(agent.MODEL, agent.cache_text(prompt), json.dumps({"reply": "古い"}, ensure_ascii=False))
+
+    real = json_extract.find_object
+    calls = []
+
+    def broken_once(text, key=None):
+        calls.append(text)
+        if len(calls) == 1:
+            raise RecursionError("maximum recursion depth exceeded")
+        return real(text, key)
+
+    monkeypatch.setattr(json_extract, "find_object", broken_once)
+    assert agent.gen_reply_with_gemini("雨", "") != "古い"
+    assert fake_client.models.calls == 1
+    # 読めなかったエントリは消え、モデルの応答で置き換わっている
+    cached = llm_cache.get(agent.MODEL, agent.cache_text(prompt))
+    assert cached is not None and "古い" not in cached
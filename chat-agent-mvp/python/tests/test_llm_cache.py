@@ -0,0 +1,47 @@
+# python/tests/test_llm_cache.py
+# llm_cache（固定長の統計ファイルと、合計サイズのカウンタによる追い出し）
+
+from __future__ import annotations
+
+import llm_cache
+
+def test_hits_and_misses_use_fixed_size_stats(fake_env):
+    llm_cache.put("m", "p", "応答")
+    for _ in range(50):
+        assert llm_cache.get("m", "p") == "応答"
+        assert llm_cache.get("m", "other") is None
+    st = llm_cache.stats()
+    assert (st["hits"], st["misses"]) == (50, 50)
+    assert (llm_cache.cache_dir() / llm_cache.STATS_FILE).stat().st_size == llm_cache._STATS.size
+
+def test_put_scans_entries_only_when_over_limit(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_MAX_BYTES", "100000")
+    scans = []
+    entries = llm_cache._entries
+    monkeypatch.setattr(llm_cache, "_entries", lambda: scans.append(1) or entries())
+    for i in range(20):
+        llm_cache.put("m", f"p{i}", "x" * 100)
+    assert len(scans) == 1  # 最初の 1 回だけ合計サイズを数える
+
+def test_evicts_oldest_when_tracked_total_crosses_limit(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_MAX_BYTES", "1000")
+    for i in range(12):
+        llm_cache.put("m", f"p{i}", "x" * 100)
+    st = llm_cache.stats()
+    assert 0 < st["bytes"] <= 1000
+    assert llm_cache.get("m", "p11") == "x" * 100
+    assert llm_cache.get("m", "p0") is None
+
+def test_overwrite_does_not_double_count(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_MAX_BYTES", "100000")
+    for _ in range(5):
+        llm_cache.put("m", "p", "x" * 100)
+    counted = llm_cache._update_stats(lambda h, m, b: (h, m, b))[2]
+    assert counted == llm_cache.stats()["bytes"]
+
+def test_clear_resets_stats():
+    llm_cache.put("m", "p", "応答")
+    llm_cache.get("m", "p")
+    llm_cache.clear()
+    st = llm_cache.stats()
+    assert (st["hits"], st["misses"], st["entries"]) == (0, 0, 0)
@@ -0,0 +1,74 @@
+# python/tests/test_llm_policy.py
+# llm_policy（ストリーミングの期限はモデル側の遅れだけで判断する・ブレーカー）
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+import llm_policy
+
+@pytest.fixture(autouse=True)
+def policy_env(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE", "0")
+    monkeypatch.setenv("LLM_AGENT_DEADLINE_S", "0.3")
+
+def _chunks(n: int, gap: float = 0.0, stall_after: int | None = None, stall: float = 0.0):
+    def make():
+        for i in range(n):
+            if stall_after is not None and i == stall_after:
+                time.sleep(stall)
+            time.sleep(gap)
+            yield i
+    return make
+
+def test_slow_consumer_does_not_trip_stream_deadline():
+    got = []
+    for chunk in llm_policy.stream("agent", "m", _chunks(5)):
+        got.append(chunk)
+        time.sleep(0.1)  # 呼び出し側の処理（音声合成など）。合計で期限を超える
+    assert got == [0, 1, 2, 3, 4]
+    assert llm_policy.stats()["callers"]["agent"]["deadline"] == 0
+
+def test_slow_producer_trips_stream_deadline():
+    got = []
+    with pytest.raises(llm_policy.DeadlineExceeded):
+        for chunk in llm_policy.stream("agent", "m", _chunks(3, stall_after=1, stall=1.0)):
+            got.append(chunk)
+    assert got == [0]
+    assert llm_policy.stats()["callers"]["agent"]["deadline"] == 1
+
+def test_call_deadline():
+    with pytest.raises(llm_policy.DeadlineExceeded):
+        llm_policy.call("agent", "m", lambda: time.sleep(1.0))
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch):
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("LLM_BREAKER_COOLDOWN_S", "60")
+    calls = []
+
+    def boom():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            llm_policy.call("agent", "m", boom)
+    with pytest.raises(llm_policy.Unavailable):
+        llm_policy.call("agent", "m", boom)
+    assert len(calls) == 2
+    assert llm_policy.stats()["breakers"]["m"]["state"] == "open"
+
+def test_stream_start_failure_is_raised_at_once():
+    class Denied(Exception):
+        code = 403
+
+    def make():
+        raise Denied("permission denied")
+
+    t0 = time.monotonic()
+    with pytest.raises(Denied):
+        list(llm_policy.stream("agent", "m", make))
+    assert time.monotonic() - t0 < 0.2  # 期限（0.3 秒）まで待たない
+    assert llm_policy.stats()["callers"]["agent"]["deadline"] == 0
@@ -0,0 +1,99 @@
+# python/tests/test_prompt_cache.py
+# prompt_cache（キャッシュの作成・再利用・消えていたときのやり直し・ロックの外での作成）
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+import prompt_cache
+
+MODEL = "gemini-2.5-flash"
+SYSTEM = "あなたは日記を手伝うアシスタントです。"
+BASE = {"response_mime_type": "application/json"}
+
+@pytest.fixture
+def client(fake_client):
+    return fake_client
+
+def _creates(client) -> int:
+    return client.caches.stats["creates"]
+
+def test_handle_is_created_once_and_reused(client):
+    before = _creates(client)
+    name = prompt_cache.handle(client, MODEL, SYSTEM)
+    assert name and name.startswith("cachedContents/")
+    assert prompt_cache.handle(client, MODEL, SYSTEM) == name
+    assert _creates(client) - before == 1
+
+def test_handle_is_shared_through_state_file(client, monkeypatch):
+    name = prompt_cache.handle(client, MODEL, SYSTEM)
+    # 別プロセス相当：メモリ上の覚えを捨てても、ファイルから読み直して使う
+    monkeypatch.setattr(prompt_cache, "_handles", None)
+    before = _creates(client)
+    assert prompt_cache.handle(client, MODEL, SYSTEM) == name
+    assert _creates(client) == before
+
+def test_create_failure_falls_back_to_system_instruction(client, monkeypatch):
+    monkeypatch.setenv("BENCH_CACHE_MIN_TOKENS", "100000")
+    config, name = prompt_cache.generation_config(client, MODEL, SYSTEM, BASE)
+    assert name is None and config["system_instruction"] == SYSTEM
+    # 作れなかった後はしばらく作り直さない
+    monkeypatch.delenv("BENCH_CACHE_MIN_TOKENS")
+    assert prompt_cache.handle(client, MODEL, SYSTEM) is None
+
+def test_stale_cache_is_retried_with_instruction(client):
+    name = prompt_cache.handle(client, MODEL, SYSTEM)
+    client.caches.delete(name)
+    resp = prompt_cache.generate(client, MODEL, SYSTEM, "今日は晴れ", BASE, "test")
+    assert resp.text
+    assert prompt_cache.stats()["test"]["calls"] == 1
+    assert prompt_cache.handle(client, MODEL, SYSTEM) != name
+
+def test_create_runs_outside_the_shared_lock(client, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+    create = client.caches.create
+
+    def slow_create(**kw):
+        entered.set()
+        release.wait(5)
+        return create(**kw)
+
+    monkeypatch.setattr(client.caches, "create", slow_create)
+    names: list = []
+    t = threading.Thread(target=lambda: names.append(prompt_cache.handle(client, MODEL, SYSTEM)))
+    t.start()
+    try:
+        assert entered.wait(5)
+        # 作成中でも使用量の記録・集計や、同じ指示の別の呼び出しは待たされない
+        done = threading.Event()
+
+        def others():
+            prompt_cache.record_usage(None, "test")
+            prompt_cache.stats()
+            names.append(prompt_cache.handle(client, MODEL, SYSTEM))
+            done.set()
+
+        threading.Thread(target=others).start()
+        assert done.wait(2)
+        assert names == [None]  # 作成中の指示はその回だけ直接送る
+    finally:
+        release.set()
+        t.join(5)
+    assert names[1].startswith("cachedContents/")
+    assert prompt_cache.handle(client, MODEL, SYSTEM) == names[1]
+
+def test_agenerate_resolves_cache_off_the_event_loop(client, monkeypatch):
+    threads: list[str] = []
+    handle = prompt_cache.handle
+
+    def spy(*a):
+        threads.append(threading.current_thread().name)
+        return handle(*a)
+
+    monkeypatch.setattr(prompt_cache, "handle", spy)
+    resp = asyncio.run(prompt_cache.agenerate(client, MODEL, SYSTEM, "今日は晴れ", BASE, "test"))
+    assert resp.text
+    assert threads and threads[0] != threading.main_thread().name
@@ -0,0 +1,141 @@
+# python/tests/test_reply_stream.py
+# reply_stream（文への切り出し・reply の逐次デコード）と agent.stream_reply（偽クライアントのストリーム）
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from reply_stream import ReplyExtractor, SentenceSplitter
+
+REPLY = 'そうなんですね。\n「楽しかった」と？ "引用" と\\も\tタブ、ああ！最後'
+
+def _feed_all(pieces: list[str]) -> tuple[str, ReplyExtractor]:
+    ex = ReplyExtractor()
+    return "".join(ex.feed(p) for p in pieces), ex
+
+def _splits(text: str, sizes=(1, 2, 3, 5, 7)):
+    """text を一定の長さで区切ったもの（境目がキー・エスケープの途中に来る組み合わせを含む）"""
+    for n in sizes:
+        yield [text[i:i + n] for i in range(0, len(text), n)]
+
+# ---- SentenceSplitter ----
+def test_splitter_returns_only_completed_sentences():
+    sp = SentenceSplitter()
+    assert sp.feed("こんにちは。今日は") == ["こんにちは。"]
+    assert sp.feed("晴れ！明日") == ["今日は晴れ！"]
+    assert sp.flush() == ["明日"]
+    assert sp.flush() == []
+
+def test_splitter_holds_sentence_end_at_buffer_tail():
+    # 末尾の文末記号の後に閉じ括弧・記号が続くかもしれないので、次の断片まで保留する
+    sp = SentenceSplitter()
+    assert sp.feed("「本当？") == []
+    assert sp.feed("」そう") == ["「本当？」"]
+    assert sp.feed("なの!?") == []
+    assert sp.flush() == ["そうなの!?"]
+
+def test_splitter_chunking_does_not_change_sentences():
+    text = "一つ目。二つ目！三つ目？（四つ目。）最後"
+    expected = SentenceSplitter()
+    whole = expected.feed(text) + expected.flush()
+    for pieces in _splits(text):
+        sp = SentenceSplitter()
+        got = [s for p in pieces for s in sp.feed(p)] + sp.flush()
+        assert got == whole
+
+# ---- ReplyExtractor ----
+@pytest.mark.parametrize("raw", [
+    json.dumps({"reply": REPLY}, ensure_ascii=False),
+    json.dumps({"reply": REPLY}),  # \uXXXX エスケープ
+    "```json\n" + json.dumps({"reply": REPLY}, ensure_ascii=False) + "\n```",
+    '{"note": "x", "reply" : ' + json.dumps(REPLY) + "}",
+])
+def test_extractor_decodes_reply_across_any_chunk_boundary(raw):
+    for pieces in _splits(raw):
+        text, ex = _feed_all(pieces)
+        assert text == REPLY
+        assert ex.text == REPLY
+        assert ex.done and ex.found
+
+def test_extractor_boundary_inside_reply_key():
+    raw = json.dumps({"reply": "はい。"}, ensure_ascii=False)
+    cut = raw.index("reply") + 3  # "rep | ly"
+    text, ex = _feed_all([raw[:cut], raw[cut:]])
+    assert text == "はい。" and ex.done
+
+@pytest.mark.parametrize("escape, decoded", [
+    ("\\n", "\n"), ('\\"', '"'), ("\\\\", "\\"), ("\\u3042", "あ"),
+    ("\\ud83d\\ude00", "😀"),  # サロゲートペア（ensure_ascii の絵文字）
+])
+def test_extractor_boundary_inside_escape(escape, decoded):
+    raw = '{"reply":"前' + escape + '後"}'
+    start = raw.index(escape)
+    for cut in range(start + 1, start + len(escape)):
+        text, _ = _feed_all([raw[:cut], raw[cut:]])
+        assert text == f"前{decoded}後"
+        assert text.encode("utf-8")
+
+def test_extractor_stops_at_closing_quote():
+    ex = ReplyExtractor()
+    assert ex.feed('{"reply":"終わり。"') == "終わり。"
+    assert ex.done
+    assert ex.feed(', "extra": "無視"}') == ""
+
+def test_extractor_plain_text_passthrough():
+    text, ex = _feed_all(["  そのまま", "の本文。"])
+    assert text == "そのままの本文。"
+    assert ex.found
+
+def test_extractor_json_without_reply_is_not_found():
+    _, ex = _feed_all(['{"answer":', ' "x"}'])
+    assert not ex.found
+
+# ---- agent.stream_reply（偽クライアントのストリーム） ----
+def _stream(fake_client, chunks: list[str], text: str = "公園に行った") -> list[str]:
+    import agent
+
+    fake_client.models.stream_chunks = chunks
+    return list(agent.stream_reply(text, session="t", use_cache=False))
+
+def test_stream_reply_yields_sentences_and_logs_turn(fake_client):
+    import storage
+
+    raw = json.dumps({"reply": "そうなんですね。どこの公園ですか？"}, ensure_ascii=False)
+    cut_key = raw.index("reply") + 2
+    sentences = _stream(fake_client, [raw[:cut_key], raw[cut_key:20], raw[20:]])
+    assert sentences == ["そうなんですね。", "どこの公園ですか？"]
+    log = "".join(storage.get_storage().iter_conversation("t"))
+    assert "公園に行った" in log and "そうなんですね。どこの公園ですか？" in log
+
+def test_stream_reply_escape_split_between_chunks(fake_client):
+    raw = '{"reply":"「\\u3042」ですね。\\n次は？"}'
+    cut = raw.index("\\u3042") + 3
+    assert _stream(fake_client, [raw[:cut], raw[cut:]]) == ["「あ」ですね。\n", "次は？"]
+
+def test_stream_reply_without_reply_key_falls_back_to_parse(fake_client):
+    assert _stream(fake_client, ['{"other": ', '"x"}']) == ['{"other": "x"}']
+
+def test_stream_reply_falls_back_when_stream_fails(fake_client, monkeypatch):
+    monkeypatch.setenv("BENCH_LLM_FAIL_P", "1")
+    monkeypatch.setenv("LLM_HEDGE", "0")
+    assert _stream(fake_client, ["unused"], text="雨") == ["そうかそうか、雨なんだね。"]
+
+# ---- worker の reply_stream 操作 ----
+def test_worker_reply_stream_emits_text_events_in_order(fake_client):
+    import worker
+
+    raw = json.dumps({"reply": "はい。そうですね！"}, ensure_ascii=False)
+    fake_client.models.stream_chunks = [raw[:4], raw[4:13], raw[13:]]
+    events: list[dict] = []
+    resp = worker.handle(
+        {"id": 7, "op": "reply_stream", "args": {"text": "ねえ", "audio": False, "cache": False}},
+        events.append,
+    )
+    assert resp == {"id": 7, "ok": True, "result": {"reply": "はい。そうですね！"}}
+    assert [e["event"] for e in events] == [
+        {"type": "text", "index": 0, "text": "はい。"},
+        {"type": "text", "index": 1, "text": "そうですね！"},
+    ]
+    assert all(e["id"] == 7 for e in events)
@@ -0,0 +1,99 @@
+# python/tests/test_scheduler.py
+# scheduler（待ち行列が満杯なら Busy・同じセッションは届いた順・interactive を batch より先に）
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+import pytest
+
+import scheduler
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler(monkeypatch):
+    # 前のテストのワーカースレッドは古い _cond で眠ったままにしておく
+    monkeypatch.setattr(scheduler, "_cond", threading.Condition())
+    monkeypatch.setattr(scheduler, "_queues", {cls: deque() for cls in scheduler.PRIORITY})
+    monkeypatch.setattr(scheduler, "_running", {cls: 0 for cls in scheduler.PRIORITY})
+    monkeypatch.setattr(scheduler, "_session_queues", {})
+    monkeypatch.setattr(scheduler, "_avg_run", {cls: 0.0 for cls in scheduler.PRIORITY})
+    monkeypatch.setattr(scheduler, "_counters", {"submitted": 0, "rejected": 0, "done": 0})
+    monkeypatch.setattr(scheduler, "_threads", [])
+
+def _blocker():
+    """実行が始まったら started を立て、release されるまで戻らないジョブ"""
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+    return fn, started, release
+
+def test_rejects_when_queue_is_full(monkeypatch):
+    monkeypatch.setenv("SCHED_WORKERS", "1")
+    monkeypatch.setenv("SCHED_INTERACTIVE_QUEUE", "2")
+    fn, started, release = _blocker()
+    jobs = [scheduler.submit("reply", "interactive", fn)]
+    assert started.wait(5)
+    jobs += [scheduler.submit("reply", "interactive", lambda: None) for _ in range(2)]
+    with pytest.raises(scheduler.Busy) as e:
+        scheduler.submit("reply", "interactive", lambda: pytest.fail("rejected job must not run"))
+    assert e.value.cls == "interactive" and e.value.depth == 2 and e.value.retry_after >= 1
+    # 別クラスの待ち行列は別枠
+    jobs.append(scheduler.submit("dump", "batch", lambda: None))
+    release.set()
+    for job in jobs:
+        assert job["done"].wait(5)
+    st = scheduler.stats()
+    assert (st["submitted"], st["rejected"], st["done"]) == (4, 1, 4)
+
+def test_same_session_runs_in_arrival_order(monkeypatch):
+    monkeypatch.setenv("SCHED_WORKERS", "4")
+    monkeypatch.setenv("SCHED_BATCH_CONCURRENCY", "1")
+    order: list[str] = []
+    lock = threading.Lock()
+
+    def step(name: str, sleep: float):
+        def fn():
+            time.sleep(sleep)
+            with lock:
+                order.append(name)
+        return fn
+
+    jobs = [
+        scheduler.submit("dump", "batch", step("dump", 0.1), session="s"),
+        scheduler.submit("reply", "interactive", step("reply-1", 0.05), session="s"),
+        scheduler.submit("reply", "interactive", step("reply-2", 0), session="s"),
+        scheduler.submit("reply", "interactive", step("other", 0), session="t"),
+        scheduler.submit("voice", "interactive", step("voice", 0)),
+    ]
+    for job in jobs:
+        assert job["done"].wait(5)
+    mine = [n for n in order if n in ("dump", "reply-1", "reply-2")]
+    assert mine == ["dump", "reply-1", "reply-2"]
+    # 別セッションと順序の制約のないジョブは、s の前のジョブを待たない
+    assert order.index("other") < order.index("dump")
+    assert order.index("voice") < order.index("dump")
+
+def test_interactive_runs_before_batch(monkeypatch):
+    monkeypatch.setenv("SCHED_WORKERS", "1")
+    fn, started, release = _blocker()
+    order: list[str] = []
+    jobs = [scheduler.submit("voice", "interactive", fn)]
+    assert started.wait(5)
+    jobs.append(scheduler.submit("dump", "batch", lambda: order.append("batch")))
+    jobs.append(scheduler.submit("reply", "interactive", lambda: order.append("interactive")))
+    release.set()
+    for job in jobs:
+        assert job["done"].wait(5)
+    assert order == ["interactive", "batch"]
+
+def test_job_error_is_recorded_and_worker_keeps_running():
+    def boom():
+        raise RuntimeError("fail")
+
+    job = scheduler.run("reply", "interactive", boom, session="s")
+    assert isinstance(job["error"], RuntimeError)
+    assert scheduler.run("reply", "interactive", lambda: 42, session="s")["result"] == 42
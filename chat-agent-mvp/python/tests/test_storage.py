@@ -0,0 +1,39 @@
+# python/tests/test_storage.py
+# storage：ファイル形式から SQLite への取り込み（全セッション・やり直しても重複しない）
+
+from __future__ import annotations
+
+import storage
+
+def test_import_from_covers_all_sessions_and_is_idempotent(tmp_path):
+    src = storage.FileStorage(tmp_path / "logs", tmp_path / "logs" / "conversation.txt")
+    src.save_diary("2024-01-02", "二日目")
+    src.append_turn("既定", "はい", session="")
+    src.append_turn("A さん", "こんにちは", session="alice")
+    src.append_turn("A さん 2", "なるほど", session="alice")
+    src.append_turn("B さん", "どうも", session="bob")
+    assert src.sessions() == ["", "alice", "bob"]
+
+    db = storage.SQLiteStorage(tmp_path / "diary.db")
+    try:
+        first = db.import_from(src)
+        second = db.import_from(src)
+        assert first == second == {"diaries": 1, "turns": 4, "sessions": 3}
+        assert db.read_conversation("alice") == storage.format_turn("A さん", "こんにちは") + storage.format_turn(
+            "A さん 2", "なるほど"
+        )
+        assert db.read_conversation("bob") == storage.format_turn("B さん", "どうも")
+        assert db.read_conversation("") == storage.format_turn("既定", "はい")
+        assert db.get_diary("2024-01-02") == "二日目"
+    finally:
+        db.close()
+
+def test_file_storage_open_does_not_touch_journal(tmp_path, monkeypatch):
+    import write_journal
+
+    calls = []
+    monkeypatch.setattr(write_journal, "recover", lambda log_dir: calls.append(log_dir) or 0)
+    fs = storage.FileStorage(tmp_path / "logs", tmp_path / "logs" / "conversation.txt")
+    assert calls == []
+    fs.recover()
+    assert calls == [tmp_path / "logs"]
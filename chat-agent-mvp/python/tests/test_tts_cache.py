@@ -0,0 +1,59 @@
+# python/tests/test_tts_cache.py
+# tts_cache（LRU の追い出し・合計サイズの記録）と、voice が指定どおりに変換できた音声だけを入れること
+
+from __future__ import annotations
+
+import pytest
+
+import tts_cache
+import voice
+
+@pytest.fixture(autouse=True)
+def cache_on(monkeypatch):
+    monkeypatch.setenv("TTS_CACHE_MAX_BYTES", str(1024 * 1024))
+    monkeypatch.setenv("BENCH_TTS_BASE", "0")
+    monkeypatch.setenv("BENCH_TTS_LATENCY", "0")
+
+def test_unsped_audio_is_not_cached_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(voice.shutil, "which", lambda name: None)
+    assert voice.synthesize("テスト", speed_factor=1.25, engine="gtts")
+    assert tts_cache.stats()["entries"] == 0
+
+def test_native_audio_without_conversion_is_cached(monkeypatch):
+    monkeypatch.setattr(voice.shutil, "which", lambda name: None)
+    first = voice.synthesize("テスト", speed_factor=1.0, engine="gtts")
+    assert first and tts_cache.stats()["entries"] == 1
+    assert voice.synthesize("テスト", speed_factor=1.0, engine="gtts") == first
+
+def test_put_scans_entries_only_when_over_limit(monkeypatch):
+    scans = []
+    entries = tts_cache._entries
+    monkeypatch.setattr(tts_cache, "_entries", lambda: scans.append(1) or entries())
+    for i in range(20):
+        tts_cache.put(f"k{i}", b"x" * 100)
+    assert len(scans) == 1  # 最初の 1 回だけ合計サイズを数える
+
+def test_evicts_oldest_when_tracked_total_crosses_limit(monkeypatch):
+    monkeypatch.setenv("TTS_CACHE_MAX_BYTES", "1000")
+    for i in range(12):
+        tts_cache.put(f"k{i}", b"x" * 100)
+    st = tts_cache.stats()
+    assert 0 < st["bytes"] <= 1000
+    assert tts_cache.get("k11") == b"x" * 100
+    assert tts_cache.get("k0") is None
+    assert tts_cache._update_total(lambda b: b) == st["bytes"]
+
+def test_overwrite_does_not_double_count():
+    for _ in range(5):
+        tts_cache.put("k", b"x" * 100)
+    assert tts_cache._update_total(lambda b: b) == 100
+
+def test_key_always_includes_engine_codec_and_bitrate():
+    base = ("こんにちは", "ja", "co.jp", False, 1.25)
+    keys = {
+        tts_cache.cache_key(*base, "gtts", "mp3", ""),
+        tts_cache.cache_key(*base, "gtts", "opus", ""),
+        tts_cache.cache_key(*base, "gtts", "mp3", "32k"),
+        tts_cache.cache_key(*base, "pyttsx3", "mp3", ""),
+    }
+    assert len(keys) == 4
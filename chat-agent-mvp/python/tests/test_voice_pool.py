@@ -0,0 +1,103 @@
+# python/tests/test_voice_pool.py
+# voice の pyttsx3 エンジンプール（返却・破棄で待ち手が起きること、待ちの上限、eSpeak では 1 個）
+
+from __future__ import annotations
+
+import io
+import threading
+import time
+
+import pytest
+
+import voice
+
+class FakePyttsx3:
+    """Engine を作った数だけ数える pyttsx3 の代わり"""
+
+    def __init__(self) -> None:
+        self.created = 0
+
+    def Engine(self):
+        self.created += 1
+        return _Engine()
+
+class _Engine:
+    def getProperty(self, name):
+        return 200 if name == "rate" else []
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(voice, "_engine_idle", [])
+    monkeypatch.setattr(voice, "_engine_count", 0)
+    monkeypatch.setattr(voice, "_exclusive_driver", lambda: False)
+    monkeypatch.setenv("TTS_ENGINE_POOL", "1")
+    monkeypatch.setenv("TTS_ENGINE_WAIT", "5")
+
+def test_discarded_engine_wakes_waiter():
+    fake = FakePyttsx3()
+    holding = threading.Event()
+    got: list[float] = []
+
+    def failing():
+        with pytest.raises(RuntimeError):
+            with voice._pooled_engine(fake):
+                holding.set()
+                time.sleep(0.1)
+                raise RuntimeError("driver crashed")
+
+    def waiter():
+        holding.wait()
+        t0 = time.monotonic()
+        with voice._pooled_engine(fake):
+            got.append(time.monotonic() - t0)
+
+    threads = [threading.Thread(target=failing), threading.Thread(target=waiter)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=3)
+    assert got and got[0] < 2  # 捨てた枠で作り直して進む（以前は返却を待ち続けていた）
+    assert fake.created == 2
+    assert voice._engine_count == 1 and len(voice._engine_idle) == 1
+
+def test_returned_engine_is_reused():
+    fake = FakePyttsx3()
+    for _ in range(3):
+        with voice._pooled_engine(fake) as item:
+            assert item["rate"] == 200
+    assert fake.created == 1
+
+def test_wait_for_free_engine_times_out(monkeypatch):
+    monkeypatch.setenv("TTS_ENGINE_WAIT", "0.05")
+    fake = FakePyttsx3()
+    with voice._pooled_engine(fake):
+        with pytest.raises(TimeoutError):
+            with voice._pooled_engine(fake):
+                pass
+    with voice._pooled_engine(fake):
+        pass
+
+def test_espeak_driver_uses_single_engine(monkeypatch):
+    monkeypatch.setattr(voice, "_exclusive_driver", lambda: True)
+    monkeypatch.setenv("TTS_ENGINE_POOL", "4")
+    assert voice.engine_pool_size() == 1
+
+def test_concurrent_renders_with_fake_pyttsx3(monkeypatch):
+    monkeypatch.setenv("TTS_ENGINE_POOL", "2")
+    monkeypatch.setenv("BENCH_PYTTSX3_INIT", "0")
+    monkeypatch.setattr(voice, "_voice_ids", {})
+    outs = [io.BytesIO() for _ in range(6)]
+    ok: list[bool] = []
+    threads = [
+        threading.Thread(target=lambda o=o: ok.append(voice._render_pyttsx3(
+            "こんにちは", o, lang="ja", tld="", slow=False, speed_factor=1.0,
+        )))
+        for o in outs
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    assert ok == [True] * 6
+    assert all(o.getvalue().startswith(b"RIFF") for o in outs)
+    assert voice._engine_count <= 2
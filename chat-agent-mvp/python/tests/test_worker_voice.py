@@ -0,0 +1,38 @@
+# python/tests/test_worker_voice.py
+# worker の voice_stream 操作（音声を audio イベントの断片で返す・指定の形式で出せなければ何も送らず失敗）
+
+from __future__ import annotations
+
+import base64
+
+import pytest
+
+import voice
+import worker
+
+@pytest.fixture(autouse=True)
+def no_ffmpeg(monkeypatch):
+    monkeypatch.setenv("BENCH_TTS_BASE", "0")
+    monkeypatch.setenv("BENCH_TTS_LATENCY", "0")
+    monkeypatch.setattr(voice.shutil, "which", lambda name: None)
+
+def _run(args: dict) -> tuple[dict, list[dict]]:
+    events: list[dict] = []
+    resp = worker.handle({"id": 3, "op": "voice_stream", "args": args}, events.append)
+    return resp, [e["event"] for e in events]
+
+def test_voice_stream_emits_audio_chunks():
+    text = "こんにちは" * 20  # 偽の gTTS は 1 文字 400 バイト → 複数のイベントに分かれる
+    resp, events = _run({"text": text, "engine": "gtts", "codec": "mp3", "speed": 1.0})
+    assert resp["ok"] and resp["result"]["mime"] == "audio/mpeg"
+    assert len(events) > 1 and all(e["type"] == "audio" for e in events)
+    data = b"".join(base64.b64decode(e["data"]) for e in events)
+    assert len(data) == resp["result"]["bytes"]
+    assert data == voice.synthesize(text, engine="gtts", codec="mp3", speed_factor=1.0)
+
+def test_voice_stream_fails_without_output_when_codec_unavailable():
+    resp, events = _run({"text": "こんにちは", "engine": "gtts", "codec": "opus"})
+    assert not resp["ok"] and events == []
+
+def test_voice_stream_is_scheduled_as_interactive():
+    assert worker.SCHEDULED_OPS["voice_stream"]({}) == ("interactive", None)
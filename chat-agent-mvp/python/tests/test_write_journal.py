@@ -0,0 +1,100 @@
+# python/tests/test_write_journal.py
+# write_journal（グループコミット・書きかけのジャーナル・反映前に落ちたときの recover）
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+import pytest
+
+import write_journal
+
+@pytest.fixture
+def log_dir(tmp_path):
+    d = tmp_path / "logs"
+    d.mkdir()
+    return d
+
+def _diary(log_dir, date: str) -> str | None:
+    try:
+        return (log_dir / f"{date}.txt").read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+def _journal(log_dir, *lines: str) -> None:
+    jp = write_journal.journal_path(log_dir)
+    jp.parent.mkdir(parents=True, exist_ok=True)
+    jp.write_bytes("".join(lines).encode("utf-8"))
+
+def _rec(**kw) -> str:
+    return json.dumps(kw, ensure_ascii=False) + "\n"
+
+def test_write_and_delete(log_dir):
+    write_journal.write(log_dir, "2025-01-01", "一日目")
+    assert _diary(log_dir, "2025-01-01") == "一日目"
+    write_journal.delete(log_dir, "2025-01-01")
+    assert _diary(log_dir, "2025-01-01") is None
+
+def test_recover_ignores_truncated_last_line(log_dir):
+    full = _rec(date="2025-01-02", content="確定済み")
+    cut = _rec(date="2025-01-03", content="書きかけの保存")
+    _journal(log_dir, full, cut[: len(cut) // 2])
+    assert write_journal.recover(log_dir) == 1
+    assert _diary(log_dir, "2025-01-02") == "確定済み"
+    assert _diary(log_dir, "2025-01-03") is None
+    # チェックポイント済み：もう一度呼んでも何もしない
+    assert write_journal.journal_path(log_dir).stat().st_size == 0
+    assert write_journal.recover(log_dir) == 0
+
+def test_recover_keeps_last_record_per_date(log_dir):
+    (log_dir / "2025-01-04.txt").write_text("古い", encoding="utf-8")
+    (log_dir / "2025-01-05.txt").write_text("消す前", encoding="utf-8")
+    _journal(
+        log_dir,
+        _rec(date="2025-01-04", content="一回目"),
+        _rec(date="2025-01-05", deleted=True),
+        _rec(date="2025-01-04", content="二回目"),
+    )
+    assert write_journal.recover(log_dir) == 2
+    assert _diary(log_dir, "2025-01-04") == "二回目"
+    assert _diary(log_dir, "2025-01-05") is None
+
+def test_recover_after_failed_rename(log_dir, monkeypatch):
+    (log_dir / "2025-01-06.txt").write_text("前の内容", encoding="utf-8")
+    real = os.replace
+
+    def failing(src, dst, *a, **kw):
+        if str(dst).endswith("2025-01-06.txt"):
+            raise OSError("disk full")
+        return real(src, dst, *a, **kw)
+
+    monkeypatch.setattr(os, "replace", failing)
+    with pytest.raises(OSError):
+        write_journal.write(log_dir, "2025-01-06", "新しい内容")
+    monkeypatch.setattr(os, "replace", real)
+    # ジャーナルには確定済みなので、反映できなかった分は起動時に書き直される
+    assert _diary(log_dir, "2025-01-06") == "前の内容"
+    assert write_journal.recover(log_dir) == 1
+    assert _diary(log_dir, "2025-01-06") == "新しい内容"
+    assert not list(log_dir.glob(".*.tmp"))
+
+def test_concurrent_saves_share_one_commit(log_dir, monkeypatch):
+    monkeypatch.setenv("DIARY_GROUP_COMMIT_MS", "50")
+    appends = []
+    real = write_journal._append
+    monkeypatch.setattr(write_journal, "_append", lambda d, ops: appends.append(dict(ops)) or real(d, ops))
+    start = threading.Barrier(5)
+
+    def save(i: int) -> None:
+        start.wait()
+        write_journal.write(log_dir, f"2025-02-{i + 1:02d}", f"{i} 日目")
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(appends) == 1 and len(appends[0]) == 5
+    assert all(_diary(log_dir, f"2025-02-{i + 1:02d}") == f"{i} 日目" for i in range(5))
@@ -0,0 +1,249 @@
+# python/tts_cache.py
+# 役割：音声合成結果（MP3 / WAV / Ogg Opus）のディスクキャッシュ
+# - キーは (text, lang, tld, slow, speed_factor, engine, codec, bitrate) の SHA-256。同じ文は gTTS / FFmpeg / pyttsx3 を通さず再利用する
+#   （拡張子は出力形式に合わせる）
+# - 合計サイズが上限を超えたら、最後に使われた時刻（mtime）が古いものから消す（LRU）
+#   合計サイズは書き込みのたびに数え直さず、固定長の size.bin に足し引きして持つ（超えたときだけ全件を見て追い出す）
+#   （ファイルロックを取って読み書きするので、CLI とワーカーが同時に書いても失われない）
+# - 書き込みは一時ファイル → os.replace で行い、途中の壊れたファイルを見せない
+# - ヒット/ミス数はプロセス内で数える（stats() で取得）
+#
+# 設定（環境変数）:
+#   TTS_CACHE_DIR        … キャッシュの置き場所（既定 python/cache/tts）
+#   TTS_CACHE_MAX_BYTES  … 合計サイズの上限（既定 50MB、0 でキャッシュ無効）
+#
+# CLI:
+#   python tts_cache.py --prewarm   定型フレーズを先に合成しておく
+#   python tts_cache.py --stats     件数・合計サイズを表示
+#   python tts_cache.py --clear     全削除
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+from bootstrap import PY_DIR
+
+DEFAULT_DIR = PY_DIR / "cache" / "tts"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+SIZE_FILE = "size.bin"
+
+# size.bin の中身：合計サイズ（-1 はまだ数えていない）
+_SIZE = struct.Struct("<q")
+
+_lock = threading.Lock()
+_size_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+def cache_dir() -> Path:
+    return Path(os.getenv("TTS_CACHE_DIR") or DEFAULT_DIR)
+
+def max_bytes() -> int:
+    try:
+        return max(0, int(os.getenv("TTS_CACHE_MAX_BYTES", "")))
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+
+def enabled() -> bool:
+    return max_bytes() > 0
+
+AUDIO_SUFFIXES = (".mp3", ".wav", ".ogg")
+
+def cache_key(
+    text: str, lang: str, tld: str, slow: bool, speed_factor: float, engine: str, codec: str, bitrate: str,
+) -> str:
+    """codec は実際に出力する形式（省略時のエンジンそのままの形式も名前で渡す）。bitrate は無ければ空文字"""
+    parts = [text, lang, tld, bool(slow), round(float(speed_factor), 6), engine, codec, bitrate]
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _path_for(key: str, suffix: str = ".mp3") -> Path:
+    return cache_dir() / f"{key}{suffix}"
+
+def _update_total(fn) -> int | None:
+    """size.bin の合計サイズを fn で書き換え、新しい値を返す（失敗したら None）。読んで書くまでファイルロックを取る"""
+    try:
+        d = cache_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        with _size_lock:
+            fd = os.open(d / SIZE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, _SIZE.size)
+                cur = _SIZE.unpack(raw)[0] if len(raw) == _SIZE.size else -1
+                new = fn(cur)
+                if new != cur:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, _SIZE.pack(new))
+                return new
+            finally:
+                os.close(fd)  # ロックも一緒に外れる
+    except OSError:
+        return None
+
+def _add_bytes(delta: int) -> int | None:
+    """
+    ファイルを書いた後に呼び、合計サイズに delta を足して返す。
+    まだ数えていなければここで 1 回だけ数える（その時点の数は変更後なので delta は足さない）
+    """
+    return _update_total(lambda b: sum(size for _, size, _ in _entries()) if b < 0 else max(0, b + delta))
+
+def get(key: str, suffix: str = ".mp3") -> bytes | None:
+    """キャッシュにあればその音声を返し、最終使用時刻を更新する"""
+    p = _path_for(key, suffix)
+    try:
+        data = p.read_bytes()
+        os.utime(p)
+    except FileNotFoundError:
+        # 追い出しと競合した場合もミス扱い
+        with _lock:
+            _counters["misses"] += 1
+        return None
+    with _lock:
+        _counters["hits"] += 1
+    return data
+
+def put(key: str, data: bytes, suffix: str = ".mp3") -> None:
+    """data をキャッシュへ原子的に書き込み、上限を超えた分を追い出す"""
+    if not enabled():
+        return
+    d = cache_dir()
+    p = _path_for(key, suffix)
+    try:
+        d.mkdir(parents=True, exist_ok=True)
+        try:
+            old = p.stat().st_size
+        except FileNotFoundError:
+            old = 0
+        fd, tmp = tempfile.mkstemp(dir=d, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, p)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with _lock:
+            _counters["stores"] += 1
+        total = _add_bytes(len(data) - old)
+        if total is None or total > max_bytes():
+            evict()
+    except Exception as e:
+        print(f"[tts_cache] store error: {e}", file=sys.stderr)
+
+def _entries() -> list[tuple[float, int, Path]]:
+    out = []
+    for p in cache_dir().glob("*"):
+        if p.suffix not in AUDIO_SUFFIXES:
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        out.append((st.st_mtime, st.st_size, p))
+    return out
+
+def evict(limit: int | None = None) -> int:
+    """合計サイズが limit 以下になるまで古いものから消し、消した件数を返す（数え直した合計を size.bin へ戻す）"""
+    limit = max_bytes() if limit is None else limit
+    with _lock:
+        entries = sorted(_entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, p in entries:
+            if total <= limit:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        _counters["evictions"] += removed
+        _update_total(lambda b: total)
+    return removed
+
+def stats() -> dict:
+    entries = _entries()
+    with _lock:
+        counters = dict(_counters)
+    return {
+        **counters,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": max_bytes(),
+    }
+
+def clear() -> None:
+    evict(0)
+    (cache_dir() / SIZE_FILE).unlink(missing_ok=True)
+
+# ---- 事前合成 ----
+def fixed_phrases() -> list[str]:
+    """よく使う定型文（ストリーミングでは文ごとに合成するので文単位も含める）"""
+    from agent import FALLBACK_EMPTY
+    from reply_stream import SentenceSplitter
+
+    phrases = [FALLBACK_EMPTY]
+    splitter = SentenceSplitter()
+    parts = splitter.feed(FALLBACK_EMPTY) + splitter.flush()
+    if len(parts) > 1:
+        phrases += [s.strip() for s in parts if s.strip()]
+    return phrases
+
+def prewarm(phrases: list[str] | None = None, **voice_kwargs) -> int:
+    """定型文を合成してキャッシュへ入れる。新たに合成した件数を返す"""
+    from voice import ENGINES, default_engine, suffix_for, synthesize
+
+    engine = (voice_kwargs.get("engine") or default_engine()).lower()
+    codec = (voice_kwargs.get("codec") or ENGINES[engine]["codec"]).lower()
+    bitrate = voice_kwargs.get("bitrate") or ""
+    made = 0
+    for text in phrases or fixed_phrases():
+        key = cache_key(
+            text,
+            voice_kwargs.get("lang", "ja"),
+            voice_kwargs.get("tld", "co.jp"),
+            voice_kwargs.get("slow", False),
+            voice_kwargs.get("speed_factor", 1.25),
+            engine,
+            codec,
+            bitrate,
+        )
+        if _path_for(key, suffix_for(engine, codec)).exists():
+            continue
+        if synthesize(text, **voice_kwargs):
+            made += 1
+    return made
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prewarm", action="store_true", help="定型フレーズを事前に合成")
+    parser.add_argument("--stats", action="store_true", help="キャッシュの状態を表示")
+    parser.add_argument("--clear", action="store_true", help="キャッシュを全削除")
+    parser.add_argument("--speed", type=float, default=1.25)
+    parser.add_argument("--engine", default="", help="合成エンジン（省略時は TTS_ENGINE）")
+    parser.add_argument("--codec", default="", help="出力形式（mp3 / opus / wav。省略時はエンジンそのまま）")
+    parser.add_argument("--bitrate", default="", help="ビットレート（例: 24k）")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    if args.prewarm:
+        made = prewarm(speed_factor=args.speed, engine=args.engine or None,
+                       codec=args.codec or None, bitrate=args.bitrate or None)
+        print(f"[tts_cache] prewarmed {made} phrase(s)", file=sys.stderr)
+    print(json.dumps(stats(), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,517 @@
 # python/voice.py
-# 要件の make_voice をそのまま使用し、CLI/STDIN からテキストを受け取り MP3 を生成する。
+# 要件の make_voice をそのまま使用し、CLI/STDIN からテキストを受け取り音声を生成する。
 # - stdin: テキスト
-# - argv: --out 出力先パス（省略時は ./voice.mp3）
+# - argv: --out 出力先パス（省略時は ./voice.mp3 / ./voice.wav。"-" なら音声をそのまま stdout へ）
+#         --engine 合成エンジン（gtts / pyttsx3。省略時は環境変数 TTS_ENGINE、無ければ gtts）
+#         --codec / --bitrate 出力形式（mp3 / opus(Ogg) / wav）とビットレート（例: opus 24k、mp3 32k はモノラル）
+#         --stream "--out -" と一緒に使い、FFmpeg の出力をできた端から stdout へ流す（/api/voice は常駐ワーカーの voice_stream で同じことをする）
 # - 成功時: JSON {"ok": true, "path": "<out>"} をstdoutにprint
 # - 失敗時: JSON {"ok": false, "error": "..."} をstdoutにprint し、終了コード1
+# - 同じテキスト・設定の音声は tts_cache のディスクキャッシュから返す（--no-cache で無効）
+# - エンジンは ENGINES に登録した関数で切り替える
+#     gtts    … Google の TTS（要ネットワーク）。MP3。gTTS → FFmpeg の stdin/stdout パイプで速度変更（中間ファイルなし）
+#     pyttsx3 … OS の音声合成（Linux は eSpeak）。オフラインで WAV を返す。速度は rate で変える
+#               初期化済みのエンジンをプール（TTS_ENGINE_POOL 個、既定 2）で使い回し、日本語ボイスの検索結果も覚えておく
+#               Linux の eSpeak ドライバはコールバックがプロセスで 1 つなので、プールは常に 1 個（合成は 1 本ずつ）
+#               空きを待つのは TTS_ENGINE_WAIT 秒まで（既定 30。過ぎたら合成失敗として返す）
+# - gTTS / pyttsx3 はキャッシュに無かったときだけ import する
+# - metrics で段階ごとの時間を測る（voice.synthesize 全体・voice.render 合成・voice.ffmpeg 速度変更と変換・
+#   voice.first_byte 最初の出力までの時間）と、キャッシュのヒット/ミス・出力バイト数
 
 import sys
 import json
 import argparse
-import tempfile
+import contextlib
+import io
+import os
+import re
 import shutil
 import subprocess
+import threading
+import time
 from pathlib import Path
-from gtts import gTTS  # pip install gTTS
 
-def make_voice(
+import bootstrap
+import metrics
+import tts_cache
+
+DEFAULT_ENGINE = "gtts"
+
+def default_engine() -> str:
+    return (os.getenv("TTS_ENGINE") or DEFAULT_ENGINE).lower()
+
+# 出力形式 → MIME・キャッシュの拡張子・FFmpeg の出力指定（bitrate は "24k" などの文字列か None）
+CODECS = {
+    "mp3": {
+        "mime": "audio/mpeg", "suffix": ".mp3",
+        # bitrate 指定時はモノラルの低ビットレート MP3 にする
+        "args": lambda br: (["-ac", "1", "-b:a", br] if br else []) + ["-f", "mp3"],
+    },
+    "opus": {
+        "mime": "audio/ogg; codecs=opus", "suffix": ".ogg",
+        "args": lambda br: ["-ac", "1", "-c:a", "libopus", "-b:a", br or "24k", "-application", "voip", "-f", "ogg"],
+    },
+    "wav": {
+        "mime": "audio/wav", "suffix": ".wav",
+        "args": lambda br: ["-f", "wav"],
+    },
+}
+
+_BITRATE_RE = re.compile(r"\d{1,3}k")
+_CHUNK = 16 * 1024
+
+def _resolve(engine: str | None, codec: str | None, bitrate: str | None) -> tuple[str, dict, str, str | None]:
+    """(engine, エンジンの spec, 出力形式, bitrate) を決める。不正な値は ValueError"""
+    engine = (engine or default_engine()).lower()
+    spec = ENGINES.get(engine)
+    if spec is None:
+        raise ValueError(f"unknown tts engine: {engine}")
+    codec = (codec or spec["codec"]).lower()
+    if codec not in CODECS:
+        raise ValueError(f"unknown codec: {codec}")
+    if bitrate and not _BITRATE_RE.fullmatch(bitrate):
+        raise ValueError(f"invalid bitrate: {bitrate}")
+    return engine, spec, codec, bitrate or None
+
+def synthesize(
     text: str,
-    out_file: Path | str = "voice.mp3",
     *,
     lang: str = "ja",
     tld: str = "co.jp",
     slow: bool = False,
     speed_factor: float = 1.25,
-) -> bool:
+    use_cache: bool = True,
+    engine: str | None = None,
+    codec: str | None = None,
+    bitrate: str | None = None,
+) -> bytes | None:
     """
-    テキストから音声(MP3)を生成し、FFmpeg で速度変更して保存します。
+    テキストから音声を生成し、速度変更したバイト列を返します（失敗時は None）。
+    形式は codec（mp3 / opus / wav。省略時はエンジンそのままの形式）と bitrate（"24k" など）で選ぶ。
     speed_factor は 0.5〜2.0 の範囲で動作します。
-    戻り値: 成功なら True、失敗なら False
+    use_cache が True なら、同じ条件の音声をキャッシュから返し、新しく作った音声はキャッシュへ入れます。
+    エンジン名・形式が不正なら ValueError
+    """
+    r = synthesize_audio(text, lang=lang, tld=tld, slow=slow, speed_factor=speed_factor,
+                         use_cache=use_cache, engine=engine, codec=codec, bitrate=bitrate)
+    return r[0] if r else None
+
+def synthesize_audio(text: str, **kwargs) -> tuple[bytes, str] | None:
+    """synthesize と同じだが (音声, MIME) を返す（FFmpeg が無く変換できなかった場合は元の形式の MIME）"""
+    buf = io.BytesIO()
+    mime = stream_voice(text, buf, **kwargs)
+    return (buf.getvalue(), mime) if mime else None
+
+def stream_voice(
+    text: str,
+    out,
+    *,
+    lang: str = "ja",
+    tld: str = "co.jp",
+    slow: bool = False,
+    speed_factor: float = 1.25,
+    use_cache: bool = True,
+    engine: str | None = None,
+    codec: str | None = None,
+    bitrate: str | None = None,
+    strict: bool = False,
+) -> str | None:
+    """
+    音声を out（バイナリの書き込み先）へ、FFmpeg が出力した端から書いていく。書いた音声の MIME を返す（失敗時は None）。
+    strict=True なら、指定の形式で出せないとき（FFmpeg が無い等）は何も書かずに None を返す
+    （ストリーミングで返す側は、書き始める前に Content-Type を決める必要があるため）
     """
+    engine, spec, codec, bitrate = _resolve(engine, codec, bitrate)
     if not text:
         print("⚠ 空のテキストです。", file=sys.stderr)
-        return False
+        return None
 
-    out_path = Path(out_file)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with metrics.span("voice.synthesize", engine=engine, codec=codec):
+        cached = use_cache and tts_cache.enabled()
+        if cached:
+            key = tts_cache.cache_key(text, lang, tld, slow, speed_factor, engine, codec, bitrate or "")
+            data = tts_cache.get(key, CODECS[codec]["suffix"])
+            metrics.count("voice.tts_cache", result="miss" if data is None else "hit")
+            if data is not None:
+                out.write(data)
+                metrics.count("voice.bytes", len(data), codec=codec)
+                return CODECS[codec]["mime"]
+
+        sink = _Tee(out) if cached else out
+        got, exact = _produce(text, sink, spec, codec, bitrate, strict,
+                              lang=lang, tld=tld, slow=slow, speed_factor=speed_factor)
+        # 速度変更・変換を省いた音声（FFmpeg が無い・失敗した）はキーの設定と違うので入れない
+        if cached and exact:
+            tts_cache.put(key, sink.getvalue(), CODECS[codec]["suffix"])
+        return CODECS[got]["mime"] if got else None
+
+class _Tee:
+    """書いた内容を out に流しつつ手元にも残す（キャッシュ用）"""
+
+    def __init__(self, out) -> None:
+        self.out = out
+        self.buf = io.BytesIO()
+
+    def write(self, b: bytes) -> None:
+        self.out.write(b)
+        self.buf.write(b)
+
+    def flush(self) -> None:
+        if hasattr(self.out, "flush"):
+            self.out.flush()
+
+    def getvalue(self) -> bytes:
+        return self.buf.getvalue()
+
+def _produce(
+    text: str, out, spec: dict, codec: str, bitrate: str | None, strict: bool, **render_kwargs,
+) -> tuple[str | None, bool]:
+    """
+    エンジンで合成し、必要なら FFmpeg で速度変更・変換して out へ書く。
+    (実際に書いた形式（失敗時は None）, 指定どおりの速度・形式にできたか) を返す。
+    FFmpeg へはエンジンの出力を別スレッドで流し込み、FFmpeg の出力は届いた端から out へ書く
+    （gTTS は区切りごとに受信した分から書くので、合成の途中でも先頭の音声を返せる）
+    """
+    native = spec["codec"]
+    tempo = render_kwargs["speed_factor"] if spec["tempo"] else 1.0
+    need = codec != native or bitrate is not None or abs(tempo - 1.0) > 1e-6
+    ffmpeg = shutil.which("ffmpeg") if need else None
+    if need and not ffmpeg:
+        if strict and (codec != native or bitrate):
+            print(f"⚠ FFmpeg が見つからないため、{codec} に変換できません。", file=sys.stderr)
+            return None, False
+        print("⚠ FFmpeg が見つからないため、速度変更・変換をスキップします。", file=sys.stderr)
+
+    if not need or not ffmpeg:
+        buf = io.BytesIO()
+        with metrics.span("voice.render", engine=spec["name"]):
+            ok = spec["render"](text, buf, **render_kwargs)
+        if not ok:
+            return None, False
+        out.write(buf.getvalue())
+        metrics.count("voice.bytes", buf.tell(), codec=native)
+        return native, not need
+
+    cmd = [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", native, "-i", "pipe:0"]
+    if abs(tempo - 1.0) > 1e-6:
+        cmd += ["-filter:a", f"atempo={tempo:.6g}"]
+    cmd += ["-vn", *CODECS[codec]["args"](bitrate), "pipe:1"]
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        proc = None
+
+    raw = io.BytesIO()
+    rendered = {"ok": False}
+
+    class _Feed:
+        def write(self, b: bytes) -> None:
+            raw.write(b)
+            if proc is not None:
+                try:
+                    proc.stdin.write(b)
+                except (BrokenPipeError, OSError):
+                    pass
+
+    def feed() -> None:
+        try:
+            with metrics.span("voice.render", engine=spec["name"]):
+                rendered["ok"] = spec["render"](text, _Feed(), **render_kwargs)
+        finally:
+            if proc is not None:
+                with contextlib.suppress(OSError):
+                    proc.stdin.close()
+
+    if proc is None:
+        feed()
+        wrote = 0
+        ok = False
+    else:
+        # voice.ffmpeg は合成と重なった全体（合成が終わってからの差分が FFmpeg だけの時間）
+        with metrics.span("voice.ffmpeg", codec=codec, tempo=abs(tempo - 1.0) > 1e-6):
+            t0 = time.perf_counter()
+            t = threading.Thread(target=feed, name="tts-feed", daemon=True)
+            t.start()
+            wrote = 0
+            fd = proc.stdout.fileno()
+            while True:
+                chunk = os.read(fd, _CHUNK)  # 届いた分だけ返る（read(n) と違い n バイト揃うまで待たない）
+                if not chunk:
+                    break
+                if not wrote:
+                    metrics.observe("voice.first_byte", time.perf_counter() - t0, codec=codec)
+                out.write(chunk)
+                if hasattr(out, "flush"):
+                    out.flush()
+                wrote += len(chunk)
+            proc.stdout.close()
+            ok = proc.wait() == 0
+            t.join()
+    if not rendered["ok"]:
+        return None, False
+    if ok and wrote:
+        metrics.count("voice.bytes", wrote, codec=codec)
+        return codec, True
+    # 変換に失敗：まだ何も書いていなければ、元の形式のまま返す
+    if wrote or (strict and (codec != native or bitrate)):
+        print("⚠ FFmpeg 変換に失敗しました。", file=sys.stderr)
+        return None, False
+    print("⚠ FFmpeg 変換に失敗しました。変換せずに返します。", file=sys.stderr)
+    out.write(raw.getvalue())
+    metrics.count("voice.bytes", raw.tell(), codec=native)
+    return native, False
+
+def mime_for(engine: str | None = None, codec: str | None = None) -> str:
+    return CODECS[_resolve(engine, codec, None)[2]]["mime"]
+
+def suffix_for(engine: str | None = None, codec: str | None = None) -> str:
+    return CODECS[_resolve(engine, codec, None)[2]]["suffix"]
 
-    # 一時ファイルへ gTTS 音声を生成
+# ---- gTTS ----
+def _render_gtts(text: str, fp, *, lang: str, tld: str, slow: bool, speed_factor: float) -> bool:
+    """gTTS の MP3 を fp へ書く（区切りごとに受信した分から書かれる）。速度変更は _produce 側の FFmpeg で行う"""
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_in:
-            tmp_in_path = Path(tmp_in.name)
-        gTTS(text=text, lang=lang, tld=tld, slow=slow).save(str(tmp_in_path))
+        from gtts import gTTS  # pip install gTTS
+        gTTS(text=text, lang=lang, tld=tld, slow=slow).write_to_fp(fp)
     except Exception as e:
         print(f"⚠ gTTS 生成エラー: {e}", file=sys.stderr)
         return False
+    return True
 
-    ffmpeg = shutil.which("ffmpeg")
-    if not ffmpeg:
-        print("⚠ FFmpeg が見つからないため、速度変更をスキップします。", file=sys.stderr)
-        tmp_in_path.replace(out_path)
-        return True
+# ---- pyttsx3（オフライン） ----
+# 言語ごとのボイス検索キーワード（ID / 名前に含まれるもの）
+VOICE_KEYWORDS = {
+    "ja": ["japanese", "haruka", "ichiro", "kyoko", "otoya"],
+}
 
+_engine_idle: list[dict] = []  # 返却済みで空いているエンジン
+_engine_cond = threading.Condition()
+_engine_count = 0  # 作ったエンジンの数（貸し出し中を含む）
+_voice_ids: dict = {}  # lang → ボイス ID（見つからなければ None）
+
+def _exclusive_driver() -> bool:
+    """pyttsx3 の既定ドライバがプロセス全体で状態を共有する eSpeak か（Windows は sapi5、macOS は nsss）"""
+    return sys.platform not in ("win32", "darwin")
+
+def engine_pool_size() -> int:
+    if _exclusive_driver():
+        return 1
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_out:
-            tmp_out_path = Path(tmp_out.name)
-
-        cmd = [
-            ffmpeg, "-y",
-            "-i", str(tmp_in_path),
-            "-filter:a", f"atempo={speed_factor:.6g}",
-            "-vn",
-            str(tmp_out_path),
-        ]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        tmp_out_path.replace(out_path)
-        return True
-    except subprocess.CalledProcessError:
-        print("⚠ FFmpeg 変換に失敗しました。等速のまま保存します。", file=sys.stderr)
-        tmp_in_path.replace(out_path)
-        return True
-    finally:
-        try:
-            tmp_in_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+        return max(1, int(os.getenv("TTS_ENGINE_POOL", "")))
+    except ValueError:
+        return 2
+
+def engine_wait() -> float:
+    try:
+        return max(0.0, float(os.getenv("TTS_ENGINE_WAIT", "")))
+    except ValueError:
+        return 30.0
+
+def _new_engine(pyttsx3) -> dict:
+    # pyttsx3.init() はドライバごとに同じエンジンを返すので、プール用には Engine を直接作る
+    eng = pyttsx3.Engine()
+    return {"engine": eng, "rate": int(eng.getProperty("rate") or 200)}
+
+def _checkout() -> dict | None:
+    """空いているエンジンを取る。無ければ作る枠を確保して None（上限なら返却・破棄を待つ）"""
+    global _engine_count
+    deadline = time.monotonic() + engine_wait()
+    with _engine_cond:
+        while not _engine_idle and _engine_count >= engine_pool_size():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("no pyttsx3 engine became free")
+            _engine_cond.wait(left)
+        if _engine_idle:
+            return _engine_idle.pop()
+        _engine_count += 1
+        return None
+
+def _checkin(item: dict | None) -> None:
+    """エンジンを返す（None なら捨てて枠を空ける）。どちらでも待っている人を 1 人起こす"""
+    global _engine_count
+    with _engine_cond:
+        if item is None:
+            _engine_count -= 1
+        else:
+            _engine_idle.append(item)
+        _engine_cond.notify()
+
+@contextlib.contextmanager
+def _pooled_engine(pyttsx3):
+    """初期化済みのエンジンを 1 つ借りる（無ければ上限まで作り、上限なら返却を待つ）"""
+    item = _checkout()
+    if item is None:
         try:
-            tmp_out_path.unlink(missing_ok=True)
-        except Exception:
-            pass
+            item = _new_engine(pyttsx3)
+        except BaseException:
+            _checkin(None)
+            raise
+    try:
+        yield item
+    except BaseException:
+        # 失敗したエンジンは状態が分からないので捨てる（次回作り直す）
+        _checkin(None)
+        raise
+    _checkin(item)
+
+def _voice_for(engine, lang: str) -> str | None:
+    """lang に合うボイス ID（一覧の取得と検索は言語ごとに 1 回だけ）"""
+    if lang in _voice_ids:
+        return _voice_ids[lang]
+    keywords = VOICE_KEYWORDS.get(lang, [])
+    token = re.compile(rf"(^|[^a-z]){re.escape(lang.lower())}($|[^a-z])")
+    found = None
+    for v in engine.getProperty("voices") or []:
+        vid = (v.id or "").lower()
+        name = (getattr(v, "name", "") or "").lower()
+        langs = " ".join(
+            (l.decode("utf-8", "ignore") if isinstance(l, bytes) else str(l)).lower()
+            for l in (getattr(v, "languages", None) or [])
+        )
+        if any(k in vid or k in name for k in keywords) or token.search(vid) or token.search(langs):
+            found = v.id
+            break
+    if found is None:
+        print(f"⚠ {lang} のボイスが見つかりませんでした。既定のボイスで読み上げます。", file=sys.stderr)
+    _voice_ids[lang] = found
+    return found
+
+def _render_pyttsx3(text: str, fp, *, lang: str, tld: str, slow: bool, speed_factor: float) -> bool:
+    """
+    pyttsx3 で WAV を作って fp へ書く。pyttsx3 はファイルにしか書き出せないので、
+    /dev/shm（あれば。メモリ上）に一時ファイルを作ってすぐ読み込み、消す
+    """
+    import tempfile
+
+    pyttsx3 = bootstrap.optional_import("pyttsx3")
+    if pyttsx3 is None:
+        print("⚠ pyttsx3 がインストールされていません。", file=sys.stderr)
+        return False
+    shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, tmp = tempfile.mkstemp(suffix=".wav", dir=shm)
+    os.close(fd)
+    try:
+        with _pooled_engine(pyttsx3) as item:
+            eng = item["engine"]
+            voice_id = _voice_for(eng, lang)
+            if voice_id:
+                eng.setProperty("voice", voice_id)
+            eng.setProperty("rate", int(item["rate"] * speed_factor * (0.7 if slow else 1.0)))
+            eng.save_to_file(text, tmp)
+            eng.runAndWait()
+        data = Path(tmp).read_bytes()
+    except Exception as e:
+        print(f"⚠ pyttsx3 生成エラー: {e}", file=sys.stderr)
+        return False
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+    if not data:
+        return False
+    fp.write(data)
+    return True
+
+# エンジン名 → 合成関数（fp へ書いて成否を返す）・そのままの出力形式・速度を FFmpeg で変えるか
+ENGINES = {
+    "gtts": {"name": "gtts", "render": _render_gtts, "codec": "mp3", "tempo": True},
+    "pyttsx3": {"name": "pyttsx3", "render": _render_pyttsx3, "codec": "wav", "tempo": False},
+}
+
+def preload(engine: str | None = None) -> None:
+    """常駐プロセス向け：pyttsx3 なら、エンジンをプールの数だけ先に初期化しておく"""
+    if (engine or default_engine()).lower() != "pyttsx3":
+        return
+    pyttsx3 = bootstrap.optional_import("pyttsx3")
+    if pyttsx3 is None:
+        return
+    global _engine_count
+    try:
+        while True:
+            with _engine_cond:
+                if _engine_count >= engine_pool_size():
+                    break
+                _engine_count += 1
+            try:
+                item = _new_engine(pyttsx3)
+            except BaseException:
+                _checkin(None)
+                raise
+            _voice_for(item["engine"], "ja")
+            _checkin(item)
+    except Exception as e:
+        print(f"[voice] pyttsx3 preload error: {e}", file=sys.stderr)
+
+def make_voice(
+    text: str,
+    out_file: Path | str = "voice.mp3",
+    **kwargs,
+) -> bool:
+    """
+    synthesize の結果を out_file に保存します（引数は synthesize と同じ）。
+    戻り値: 成功なら True、失敗なら False
+    """
+    data = synthesize(text, **kwargs)
+    if data is None:
+        return False
+    out_path = Path(out_file)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(data)
+    return True
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--out", default="voice.mp3")
+    parser.add_argument("--out", default="")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=default_engine() if default_engine() in ENGINES else DEFAULT_ENGINE)
     parser.add_argument("--lang", default="ja")
     parser.add_argument("--tld", default="co.jp")
     parser.add_argument("--slow", action="store_true")
     parser.add_argument("--speed", type=float, default=1.25)
+    parser.add_argument("--codec", choices=sorted(CODECS), default=None, help="出力形式（省略時はエンジンそのまま）")
+    parser.add_argument("--bitrate", default=None, help="ビットレート（例: 24k。mp3 はモノラルになる）")
+    parser.add_argument("--stream", action="store_true", help="--out - と一緒に：できた端から stdout へ書く")
+    parser.add_argument("--no-cache", action="store_true")
     args = parser.parse_args()
 
     text = sys.stdin.read().strip()
-    ok = make_voice(
+    if args.stream:
+        # 音声のバイト列を、変換しながらそのまま stdout へ（指定の形式で出せなければ何も書かずに失敗）
+        try:
+            mime = stream_voice(
+                text, sys.stdout.buffer,
+                lang=args.lang, tld=args.tld, slow=args.slow, speed_factor=args.speed,
+                use_cache=not args.no_cache, engine=args.engine, codec=args.codec, bitrate=args.bitrate,
+                strict=True,
+            )
+        except (ValueError, BrokenPipeError) as e:
+            print(f"[voice] {e}", file=sys.stderr)
+            mime = None
+        sys.exit(0 if mime else 1)
+    data = synthesize(
         text=text,
-        out_file=args.out,
         lang=args.lang,
         tld=args.tld,
         slow=args.slow,
         speed_factor=args.speed,
+        use_cache=not args.no_cache,
+        engine=args.engine,
+        codec=args.codec,
+        bitrate=args.bitrate,
     )
-    if ok:
-        print(json.dumps({"ok": True, "path": str(Path(args.out).resolve())}, ensure_ascii=False))
-        sys.exit(0)
-    else:
+    if data is None:
         print(json.dumps({"ok": False, "error": "make_voice failed"}, ensure_ascii=False))
         sys.exit(1)
+    if not args.out:
+        args.out = "voice" + suffix_for(args.engine, args.codec)
+    if args.out == "-":
+        # 音声のバイト列をそのまま stdout へ
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        sys.exit(0)
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(data)
+    print(json.dumps({"ok": True, "path": str(out_path.resolve())}, ensure_ascii=False))
+    sys.exit(0)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,477 @@
+# python/worker.py
+# 役割：常駐 Python ワーカー
+# - API ごとに python3 を起動し直すと、google.genai / dotenv / gtts の import と
+#   genai.Client の生成が毎回発生する。ここで一度だけ読み込み、使い回す。
+# - プロトコルは JSON Lines（1 行 1 リクエスト / 1 行 1 レスポンス）
+#     要求: {"id": 1, "op": "reply", "args": {"text": "..."}}
+#     応答: {"id": 1, "ok": true, "result": ...} / {"id": 1, "ok": false, "error": "..."}
+#   ストリーミング操作は、最終応答の前に同じ id のイベント行を何行か返す
+#     イベント: {"id": 1, "event": {"type": "text", ...}}
+# - 既定は stdin/stdout。--socket PATH を付けると Unix ソケットで待ち受ける。
+# - 各スクリプト（agent.py / voice.py / dump_logs.py / diary_*.py）は従来どおり CLI としても動く。
+# - voice_stream は音声を FFmpeg の出力ができた端から audio イベント（base64 の断片）で返す。/api/voice はそれを
+#   バイナリのまま流す（リクエストごとに voice.py を起動せず、スケジューラの受け付け制御も通る）
+# - モデル呼び出し・音声合成の操作（SCHEDULED_OPS）は scheduler に通し、チャット（interactive）を日記生成（batch）より
+#   先に、同時実行数を絞って並行に動かす。待ち行列が満杯なら {"ok": false, "busy": true, "retryAfter": 秒} をすぐ返す
+#   応答には待ち時間・実行時間 {"sched": {"class", "waitMs", "runMs"}} を付ける
+# - METRICS を設定すると、操作ごとの時間（worker.op）とロック待ち（worker.wait）も metrics で測る
+
+from __future__ import annotations
+
+import argparse
+import base64
+import contextlib
+import json
+import os
+import socketserver
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import agent
+import bootstrap
+import diary_delete
+import diary_get
+import diary_list_month
+import diary_save
+import diary_search
+import dump_logs
+import llm_cache
+import llm_policy
+import metrics
+import prompt_cache
+import scheduler
+import storage
+import tts_cache
+import voice
+
+# ---- 操作 ----
+def _op_reply(args: dict) -> dict:
+    return {"reply": agent.reply(
+        str(args.get("text", "")),
+        str(args.get("session") or ""),
+        use_cache=bool(args.get("cache", True)),
+    )}
+
+def _op_voice(args: dict) -> dict:
+    """out があればファイルへ保存してパスを、無ければ音声を base64 で直接返す（形式は codec / bitrate で選ぶ）"""
+    r = voice.synthesize_audio(
+        str(args.get("text", "")).strip(),
+        lang=args.get("lang", "ja"),
+        tld=args.get("tld", "co.jp"),
+        slow=bool(args.get("slow", False)),
+        speed_factor=float(args.get("speed", 1.25)),
+        engine=args.get("engine") or None,
+        codec=args.get("codec") or None,
+        bitrate=args.get("bitrate") or None,
+    )
+    if r is None:
+        raise RuntimeError("make_voice failed")
+    data, mime = r
+    out = args.get("out")
+    if not out:
+        return {"audio": base64.b64encode(data).decode("ascii"), "mime": mime}
+    out_path = Path(out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(data)
+    return {"path": str(out_path.resolve())}
+
+_AUDIO_EVENT_BYTES = 16 * 1024  # audio イベント 1 つに載せる音声の大きさ（base64 にする前）
+
+class _AudioEvents:
+    """stream_voice の書き込み先：書かれた音声を断片ごとに audio イベントとして送る"""
+
+    def __init__(self, emit: Callable[[dict], None]) -> None:
+        self.emit = emit
+        self.bytes = 0
+
+    def write(self, b: bytes) -> None:
+        # キャッシュから返すときは全体が 1 回で書かれるので、イベント 1 行が大きくなりすぎないよう分ける
+        for i in range(0, len(b), _AUDIO_EVENT_BYTES):
+            part = b[i:i + _AUDIO_EVENT_BYTES]
+            self.emit({"type": "audio", "data": base64.b64encode(part).decode("ascii")})
+            self.bytes += len(part)
+
+    def flush(self) -> None:
+        pass
+
+def _op_voice_stream(args: dict, emit: Callable[[dict], None]) -> dict:
+    """
+    音声をできた端から audio イベントで返す（最終応答は MIME と合計バイト数）。
+    形式は codec / bitrate のとおり。その形式で出せない（FFmpeg が無い等）ときは、何も送らずに失敗させる
+    """
+    sink = _AudioEvents(emit)
+    mime = voice.stream_voice(
+        str(args.get("text", "")).strip(),
+        sink,
+        lang=args.get("lang", "ja"),
+        tld=args.get("tld", "co.jp"),
+        slow=bool(args.get("slow", False)),
+        speed_factor=float(args.get("speed", 1.25)),
+        engine=args.get("engine") or None,
+        codec=args.get("codec") or None,
+        bitrate=args.get("bitrate") or None,
+        strict=True,
+    )
+    if mime is None:
+        raise RuntimeError("make_voice failed")
+    return {"mime": mime, "bytes": sink.bytes}
+
+# 文ごとの音声合成は別スレッドで回し、モデルの生成と重ねる
+_tts_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tts")
+
+def _op_reply_stream(args: dict, emit: Callable[[dict], None]) -> dict:
+    """
+    応答を文ごとに text イベントで返し、各文の音声も audio イベントで順に返す。
+    音声は文が揃い次第合成を始め、出来上がったものから（文の順序を保って）送る。
+    """
+    tts_args = {
+        "lang": args.get("lang", "ja"),
+        "tld": args.get("tld", "co.jp"),
+        "slow": bool(args.get("slow", False)),
+        "speed_factor": float(args.get("speed", 1.25)),
+        "engine": args.get("engine") or None,
+        "codec": args.get("codec") or None,
+        "bitrate": args.get("bitrate") or None,
+    }
+    want_audio = bool(args.get("audio", True))
+    pending: deque = deque()
+
+    def flush_audio(wait: bool) -> None:
+        while pending and (wait or pending[0][1].done()):
+            index, fut = pending.popleft()
+            try:
+                r = fut.result()
+            except Exception as e:
+                print(f"[worker] tts error: {e}", file=sys.stderr)
+                r = None
+            if r:
+                emit({"type": "audio", "index": index, "audio": base64.b64encode(r[0]).decode("ascii"), "mime": r[1]})
+
+    parts: list[str] = []
+    session = str(args.get("session") or "")
+    for index, sentence in enumerate(agent.stream_reply(str(args.get("text", "")), session, bool(args.get("cache", True)))):
+        parts.append(sentence)
+        emit({"type": "text", "index": index, "text": sentence})
+        if want_audio and sentence.strip():
+            pending.append((index, _tts_pool.submit(voice.synthesize_audio, sentence.strip(), **tts_args)))
+        flush_audio(wait=False)
+    flush_audio(wait=True)
+    return {"reply": "".join(parts).strip()}
+
+def _op_tts_prewarm(args: dict) -> dict:
+    made = tts_cache.prewarm(
+        args.get("phrases") or None,
+        speed_factor=float(args.get("speed", 1.25)),
+        engine=args.get("engine") or None,
+        codec=args.get("codec") or None,
+        bitrate=args.get("bitrate") or None,
+    )
+    return {"prewarmed": made, **tts_cache.stats()}
+
+def _op_tts_cache_stats(args: dict) -> dict:
+    return tts_cache.stats()
+
+def _op_dump(args: dict) -> dict:
+    return {"content": dump_logs.generate_diary(
+        str(args["date"]),
+        str(args.get("session") or ""),
+        use_cache=bool(args.get("cache", True)),
+        incremental=not bool(args.get("full", False)),
+    )}
+
+def _op_llm_cache_stats(args: dict) -> dict:
+    # usage … 呼び出し元ごとのトークン数（prompt_cache が数える。このワーカーが起動してから）
+    # policy … 呼び出し元ごとのヘッジ・期限切れの回数と所要時間、ブレーカーの状態（llm_policy）
+    return {**llm_cache.stats(), "usage": prompt_cache.stats(), "policy": llm_policy.stats()}
+
+def _op_sched_stats(args: dict) -> dict:
+    # クラスごとの待ち行列の長さ・実行中の数・平均実行時間と、受け付け／拒否の件数
+    return scheduler.stats()
+
+def _op_session_reset(args: dict) -> dict:
+    """セッションの会話ログを初期化する（開始時・破棄時）"""
+    storage.get_storage().reset_conversation(str(args.get("session") or ""))
+    return {"ok": True}
+
+def _op_diary_get(args: dict) -> dict:
+    return {"content": diary_get.get_diary(str(args.get("date", "")))}
+
+def _op_diary_save(args: dict) -> dict:
+    p = diary_save.save_diary(str(args.get("date", "")), str(args.get("content", "")))
+    return {"path": str(p)}
+
+def _op_diary_delete(args: dict) -> dict:
+    return {"path": str(diary_delete.delete_diary(str(args.get("date", ""))))}
+
+def _op_diary_list_month(args: dict) -> dict:
+    try:
+        y = int(args.get("year"))
+        m = int(args.get("month"))
+    except (TypeError, ValueError):
+        raise ValueError("invalid year/month")
+    return diary_list_month.list_month(y, m)
+
+def _op_diary_range(args: dict, emit: Callable[[dict], None]) -> dict:
+    """期間の日ごとのセルを day イベントで順に返し、集計を最終応答で返す"""
+    summary: dict = {}
+    for row in diary_list_month.iter_range(str(args.get("from") or ""), str(args.get("to") or "")):
+        if row["type"] == "day":
+            emit(row)
+        else:
+            summary = row
+    return summary
+
+def _op_diary_search(args: dict) -> dict:
+    try:
+        limit = int(args.get("limit") or 20)
+    except (TypeError, ValueError):
+        raise ValueError("invalid limit")
+    return diary_search.search(
+        str(args.get("q", "")),
+        str(args.get("from") or ""),
+        str(args.get("to") or ""),
+        limit,
+    )
+
+OPS = {
+    "reply": _op_reply,
+    "voice": _op_voice,
+    "tts_prewarm": _op_tts_prewarm,
+    "tts_cache_stats": _op_tts_cache_stats,
+    "dump": _op_dump,
+    "llm_cache_stats": _op_llm_cache_stats,
+    "sched_stats": _op_sched_stats,
+    "session_reset": _op_session_reset,
+    "diary_get": _op_diary_get,
+    "diary_save": _op_diary_save,
+    "diary_delete": _op_diary_delete,
+    "diary_list_month": _op_diary_list_month,
+    "diary_search": _op_diary_search,
+}
+
+# イベントを逐次返す操作（fn(args, emit)）
+STREAM_OPS = {
+    "reply_stream": _op_reply_stream,
+    "voice_stream": _op_voice_stream,
+    "diary_range": _op_diary_range,
+}
+
+# ログファイル等を共有するため、操作は 1 つずつ実行する
+_lock = threading.Lock()
+
+# 自分で排他を取る操作（全体のロックを取らず、並行に受け付ける）と、順序を保つ単位のキー
+# diary_save は write_journal が同時に来た保存をまとめて 1 回で確定するので、並べて流すほど速い
+# （同じ日付への保存は届いた順に確定させる）
+CONCURRENT_OPS: dict[str, Callable[[dict], str]] = {
+    "diary_save": lambda args: str(args.get("date", "")),
+}
+
+def _session_of(args: dict) -> str:
+    return str(args.get("session") or "")
+
+# スケジューラに通す操作 → (優先度クラス, 順序を保つセッション。None なら順序の制約なし)
+# 同じセッションの応答・日記生成・リセットは、届いた順に 1 つずつ実行する
+SCHEDULED_OPS: dict[str, Callable[[dict], tuple[str, str | None]]] = {
+    "reply": lambda args: ("interactive", _session_of(args)),
+    "reply_stream": lambda args: ("interactive", _session_of(args)),
+    "session_reset": lambda args: ("interactive", _session_of(args)),
+    "voice": lambda args: ("interactive", None),
+    "voice_stream": lambda args: ("interactive", None),
+    "dump": lambda args: ("batch", _session_of(args)),
+    "tts_prewarm": lambda args: ("batch", None),
+}
+
+def handle(req: dict, emit: Callable[[dict], None] | None = None) -> dict:
+    """
+    1 リクエストを処理してレスポンス dict を返す（例外は error として包む）
+    emit を渡すと、ストリーミング操作のイベントを {"id", "event"} として渡す。
+    """
+    rid = req.get("id")
+    op = req.get("op")
+    fn = OPS.get(op)
+    stream_fn = STREAM_OPS.get(op)
+    if fn is None and stream_fn is None:
+        return {"id": rid, "ok": False, "error": f"unknown op: {op}"}
+    try:
+        args = req.get("args") or {}
+        if op in CONCURRENT_OPS or op in SCHEDULED_OPS:
+            # 並行に動く操作は stdout を付け替えない（redirect_stdout はスレッドをまたいで安全でない）。
+            # 常駐時の stdout は main() で stderr へ向けてある
+            with metrics.span("worker.op", op=op):
+                if stream_fn is not None:
+                    send = emit or (lambda event: None)
+                    return {"id": rid, "ok": True, "result": stream_fn(args, lambda event: send({"id": rid, "event": event}))}
+                return {"id": rid, "ok": True, "result": fn(args)}
+        # 各モジュールが stdout に print しても応答行が壊れないよう stderr へ逃がす
+        with metrics.span("worker.wait", op=op):
+            _lock.acquire()
+        try:
+            with contextlib.redirect_stdout(sys.stderr), metrics.span("worker.op", op=op):
+                if stream_fn is not None:
+                    send = emit or (lambda event: None)
+                    result = stream_fn(args, lambda event: send({"id": rid, "event": event}))
+                else:
+                    result = fn(args)
+        finally:
+            _lock.release()
+        return {"id": rid, "ok": True, "result": result}
+    except Exception as e:
+        print(f"[worker] {op} error: {e}", file=sys.stderr)
+        return {"id": rid, "ok": False, "error": str(e)}
+
+def _parse(line: str) -> tuple[dict | None, dict | None]:
+    """(要求, 読めなかったときの応答)"""
+    try:
+        req = json.loads(line)
+        if not isinstance(req, dict):
+            raise ValueError("request must be an object")
+    except Exception as e:
+        return None, {"id": None, "ok": False, "error": f"bad request: {e}"}
+    return req, None
+
+def _emitter(write_line: Callable[[str], None] | None) -> Callable[[dict], None] | None:
+    if write_line is None:
+        return None
+    return lambda event: write_line(json.dumps(event, ensure_ascii=False))
+
+def handle_line(line: str, write_line: Callable[[str], None] | None = None) -> str:
+    """1 行の要求を処理して応答行を返す。write_line にはイベント行が逐次渡される"""
+    req, resp = _parse(line)
+    if req is not None:
+        resp = handle(req, _emitter(write_line))
+    return json.dumps(resp, ensure_ascii=False)
+
+def _sched_resp(job: dict) -> str:
+    resp = job["result"] if isinstance(job["result"], dict) else {
+        "id": None, "ok": False, "error": str(job["error"] or "scheduler error"),
+    }
+    resp["sched"] = {"class": job["cls"], "waitMs": round(job["wait"] * 1000, 1), "runMs": round(job["run"] * 1000, 1)}
+    return json.dumps(resp, ensure_ascii=False)
+
+def _busy_resp(req: dict, e: scheduler.Busy) -> str:
+    return json.dumps({
+        "id": req.get("id"), "ok": False, "error": "busy", "busy": True, "retryAfter": e.retry_after,
+        "sched": {"class": e.cls, "waiting": e.depth},
+    }, ensure_ascii=False)
+
+def schedule_line(line: str, write_line: Callable[[str], None], wait: bool = False) -> bool:
+    """
+    SCHEDULED_OPS の要求ならスケジューラへ入れて True を返す（応答行は終わったときに write_line へ。wait なら書くまで待つ）。
+    受け付けられなければ busy の応答行をすぐ書く。それ以外の要求なら何もせず False
+    """
+    req, _ = _parse(line)
+    cls_fn = SCHEDULED_OPS.get(req.get("op")) if req is not None else None
+    if cls_fn is None:
+        return False
+    cls, session = cls_fn(req.get("args") or {})
+    emit = _emitter(write_line)
+    try:
+        job = scheduler.submit(
+            str(req.get("op")), cls, lambda: handle(req, emit),
+            session=session, on_done=lambda job: write_line(_sched_resp(job)),
+        )
+    except scheduler.Busy as e:
+        print(f"[worker] {req.get('op')} rejected: {e}", file=sys.stderr)
+        write_line(_busy_resp(req, e))
+        return True
+    if wait:
+        job["done"].wait()
+    return True
+
+# ---- stdin/stdout モード ----
+def _concurrent_key(line: str) -> str | None:
+    """並行に流せる要求なら順序のキーを、そうでなければ None を返す"""
+    try:
+        req = json.loads(line)
+        key_fn = CONCURRENT_OPS.get(req.get("op"))
+        return None if key_fn is None else key_fn(req.get("args") or {})
+    except Exception:
+        return None
+
+def serve_stdio(out=None) -> None:
+    out = out or sys.stdout
+    out_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="op")
+    inflight: dict = {}  # 順序キー → 実行中の Future
+
+    def write_line(s: str) -> None:
+        with out_lock:
+            out.write(s + "\n")
+            out.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        key = _concurrent_key(line)
+        if key is not None:
+            # 同じキーの前の要求が終わってから流す。応答は id で対応付けるので、終わった順に返してよい
+            prev = inflight.get(key)
+            if prev is not None:
+                prev.result()
+            inflight[key] = pool.submit(lambda l=line: write_line(handle_line(l, write_line)))
+            continue
+        # それ以外の操作は、先に届いた保存をすべて反映してから実行する（読んだら古かった、を防ぐ）
+        for fut in inflight.values():
+            fut.result()
+        inflight.clear()
+        # モデル呼び出し等はスケジューラへ渡してすぐ次の行を読む（終わった順に応答する）
+        if schedule_line(line, write_line):
+            continue
+        write_line(handle_line(line, write_line))
+    pool.shutdown(wait=True)
+    scheduler.join()
+
+# ---- Unix ソケットモード ----
+class _Handler(socketserver.StreamRequestHandler):
+    def write_line(self, s: str) -> None:
+        self.wfile.write((s + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8")
+            if not line.strip():
+                continue
+            # 接続ごとに 1 要求ずつ：スケジューラに入れた操作も、応答を書くまで待つ
+            if schedule_line(line, self.write_line, wait=True):
+                continue
+            self.write_line(handle_line(line, self.write_line))
+
+def serve_socket(path: str) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, _Handler) as server:
+        print(f"[worker] listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default="", help="Unix ソケットのパス（省略時は stdin/stdout）")
+    args = parser.parse_args()
+
+    # CLI では遅延 import している依存を、常駐プロセスでは起動時に読み込んでおく
+    bootstrap.preload()
+    voice.preload()
+    # 前回途中で止まった日記の保存を反映しておく（ファイル形式のみ。CLI は開くたびには行わない）
+    recover = getattr(storage.get_storage(), "recover", None)
+    if recover is not None:
+        recover()
+    # スケジューラで並行に動く操作が print しても応答行を壊さないよう、stdout は stderr へ向けておく
+    # （応答は serve_stdio が元の stdout に書く）
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        serve_stdio(out)
+
+if __name__ == "__main__":
+    main()
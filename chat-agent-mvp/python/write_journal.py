@@ -0,0 +1,233 @@
+# python/write_journal.py
+# 役割：ファイル形式の日記保存をまとめて確定させる書き込みジャーナル（グループコミット）
+# - 保存要求はキューに積み、コミット用スレッドが数ミリ秒ぶんまとめて取り出して 1 回で確定させる
+#     1) logs/.journal/journal.jsonl に {"date","content"}（削除は {"date","deleted":true}）を 1 回の write で追記し、fsync を 1 回だけ
+#        → ここが確定点。同時に来た保存が何件あっても fsync は 1 回
+#     2) 各日記を一時ファイル → os.replace で置き換える（読み手は書きかけのファイルを見ない）。
+#        月インデックスの更新は月ごとに 1 回（month_index.write_diaries）。ここでは fsync しない
+#     同じ日付への保存が同じバッチに何件もあれば（自動保存の連打など）、最後の 1 件だけを書く
+# - ジャーナルが CHECKPOINT_BYTES を超えたら、書いた日記ファイルとディレクトリを fsync してからジャーナルを空にする
+# - 途中で落ちた場合は、常駐ワーカーの起動時（または storage.py --recover）に recover() がジャーナルを読み直し、
+#   反映されていない分を書き直す
+#   （末尾の書きかけの行は確定前なので捨てる）
+# - 確定・反映・チェックポイントは logs/.journal/.lock の排他ロックの下で行うので、別プロセス（CLI）と同時でもよい
+#
+# 設定（環境変数）:
+#   DIARY_FSYNC                … "0" で fsync しない（ベンチマーク・一時ディレクトリ用。既定 "1"）
+#   DIARY_GROUP_COMMIT_MS      … 最初の要求が来てから、まとめるために待つ時間（既定 2ms）
+#   DIARY_JOURNAL_CHECKPOINT   … チェックポイントするジャーナルの大きさ（既定 1MB）
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import month_index
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+JOURNAL_DIRNAME = ".journal"
+DEFAULT_GROUP_COMMIT_MS = 2.0
+DEFAULT_CHECKPOINT_BYTES = 1024 * 1024
+
+def fsync_enabled() -> bool:
+    return os.getenv("DIARY_FSYNC", "1") != "0"
+
+def group_commit_s() -> float:
+    try:
+        return max(0.0, float(os.getenv("DIARY_GROUP_COMMIT_MS", ""))) / 1000
+    except ValueError:
+        return DEFAULT_GROUP_COMMIT_MS / 1000
+
+def checkpoint_bytes() -> int:
+    try:
+        return max(0, int(os.getenv("DIARY_JOURNAL_CHECKPOINT", "")))
+    except ValueError:
+        return DEFAULT_CHECKPOINT_BYTES
+
+def journal_path(log_dir: Path) -> Path:
+    return log_dir / JOURNAL_DIRNAME / "journal.jsonl"
+
+@contextlib.contextmanager
+def _locked(log_dir: Path):
+    d = log_dir / JOURNAL_DIRNAME
+    d.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(d / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def _fsync_path(p: Path, directory: bool = False) -> None:
+    try:
+        fd = os.open(p, os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if directory else 0))
+    except (FileNotFoundError, PermissionError):
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # ディレクトリの fsync ができない環境（Windows 等）
+    finally:
+        os.close(fd)
+
+# ---- 確定・反映（ロック中に呼ぶ） ----
+def _coalesce(ops: list[tuple[str, str | None]]) -> dict[str, str | None]:
+    """同じ日付は最後の操作だけ残す（None は削除）。順序は最初に現れた順"""
+    out: dict[str, str | None] = {}
+    for date, content in ops:
+        out[date] = content
+    return out
+
+def _append(log_dir: Path, ops: dict[str, str | None]) -> None:
+    lines = []
+    for date, content in ops.items():
+        rec = {"date": date, "deleted": True} if content is None else {"date": date, "content": content}
+        lines.append(json.dumps(rec, ensure_ascii=False) + "\n")
+    fd = os.open(journal_path(log_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview("".join(lines).encode("utf-8"))
+        while view:
+            view = view[os.write(fd, view):]
+        if fsync_enabled():
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _apply(log_dir: Path, ops: dict[str, str | None]) -> None:
+    writes = [(d, c) for d, c in ops.items() if c is not None]
+    if writes:
+        month_index.write_diaries(log_dir, writes)
+    for d, c in ops.items():
+        if c is None:
+            month_index.delete_diary(log_dir, d)
+
+def _read_journal(log_dir: Path) -> dict[str, str | None]:
+    try:
+        raw = journal_path(log_dir).read_bytes()
+    except FileNotFoundError:
+        return {}
+    ops: list[tuple[str, str | None]] = []
+    for line in raw.splitlines():
+        try:
+            rec = json.loads(line)
+            ops.append((str(rec["date"]), None if rec.get("deleted") else str(rec["content"])))
+        except (ValueError, KeyError, TypeError):
+            continue  # 書きかけ（確定前）の行
+    return _coalesce(ops)
+
+def _checkpoint(log_dir: Path, force: bool = False) -> None:
+    """ジャーナルに載っている日記を fsync してからジャーナルを空にする"""
+    jp = journal_path(log_dir)
+    try:
+        size = jp.stat().st_size
+    except FileNotFoundError:
+        return
+    if not size or (not force and size < checkpoint_bytes()):
+        return
+    if fsync_enabled():
+        for d in _read_journal(log_dir):
+            _fsync_path(log_dir / f"{d}.txt")
+        _fsync_path(log_dir, directory=True)
+    with jp.open("r+b") as f:
+        f.truncate(0)
+        if fsync_enabled():
+            os.fsync(f.fileno())
+
+def _commit(log_dir: Path, ops: dict[str, str | None]) -> None:
+    with _locked(log_dir):
+        _append(log_dir, ops)
+        _apply(log_dir, ops)
+        _checkpoint(log_dir)
+
+def recover(log_dir: Path) -> int:
+    """ジャーナルのうち日記ファイルに反映されていない分を書き直し、チェックポイントする。書き直した件数を返す"""
+    jp = journal_path(log_dir)
+    try:
+        if not jp.stat().st_size:
+            return 0
+    except FileNotFoundError:
+        return 0
+    with _locked(log_dir):
+        todo: dict[str, str | None] = {}
+        for d, content in _read_journal(log_dir).items():
+            p = log_dir / f"{d}.txt"
+            try:
+                current = p.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                current = None
+            if current != content:
+                todo[d] = content
+        if todo:
+            _apply(log_dir, todo)
+        _checkpoint(log_dir, force=True)
+    if todo:
+        print(f"[write_journal] recovered {len(todo)} diaries in {log_dir}", file=sys.stderr)
+    return len(todo)
+
+# ---- グループコミット ----
+_cond = threading.Condition()
+_queue: list[dict] = []
+_committer: threading.Thread | None = None
+
+def _run_committer() -> None:
+    while True:
+        with _cond:
+            while not _queue:
+                _cond.wait()
+        # 最初の要求が来たら少しだけ待って、同時に来た保存をまとめる
+        wait = group_commit_s()
+        if wait:
+            time.sleep(wait)
+        with _cond:
+            batch = _queue[:]
+            _queue.clear()
+        by_dir: dict[Path, list[dict]] = {}
+        for req in batch:
+            by_dir.setdefault(req["log_dir"], []).append(req)
+        for log_dir, reqs in by_dir.items():
+            try:
+                _commit(log_dir, _coalesce([op for r in reqs for op in r["ops"]]))
+            except Exception as e:
+                for r in reqs:
+                    r["error"] = e
+            for r in reqs:
+                r["done"].set()
+
+def submit(log_dir: Path, ops: list[tuple[str, str | None]]) -> None:
+    """
+    保存（content=None は削除）を確定するまで待つ。同時に呼ばれた分は 1 回の fsync にまとめて確定する。
+    確定に失敗したら例外を送出する
+    """
+    global _committer
+    if not ops:
+        return
+    req = {"log_dir": Path(log_dir), "ops": ops, "done": threading.Event(), "error": None}
+    with _cond:
+        if _committer is None or not _committer.is_alive():
+            _committer = threading.Thread(target=_run_committer, name="write-journal", daemon=True)
+            _committer.start()
+        _queue.append(req)
+        _cond.notify()
+    req["done"].wait()
+    if req["error"] is not None:
+        raise req["error"]
+
+def write(log_dir: Path, date: str, content: str) -> Path:
+    submit(log_dir, [(date, content)])
+    return log_dir / f"{date}.txt"
+
+def delete(log_dir: Path, date: str) -> Path:
+    submit(log_dir, [(date, None)])
+    return log_dir / f"{date}.txt"